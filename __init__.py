@@ -1,4 +1,7 @@
 from .alpaca_trade import AlpacaTrade
 from .alpaca_backtest import AlpacaBacktest
 from .alpaca_screen import AlpacaScreen
-from .alpaca_modules.alpaca_api import Alpaca, AlpacaStreaming
\ No newline at end of file
+from .alpaca_modules.alpaca_api import Alpaca, AlpacaStreaming
+from .alpaca_modules.panel import Panel
+from .alpaca_backtest.sweep import Sweep
+from .alpaca_modules.alpaca_async import AsyncAlpaca, AsyncAlpacaStreaming
\ No newline at end of file
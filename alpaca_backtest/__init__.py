@@ -1,4 +1,9 @@
 from ..alpaca_modules.alpaca_api import Alpaca, get_symbols
+from ..alpaca_modules.profiling import Profiler
+from .parallel import RESULTS, share_data, init_worker, run_shard
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_right
+import tempfile
 import json
 import pandas as pd
 import matplotlib
@@ -10,9 +15,24 @@ import numpy as np
 class AlpacaBacktest(object):
 
   def __init__(self, api_key, secret_key, data_limit=1000,
-               periods='5Min', take_profit=1.10, stop_loss=0.97):
-
-    self.apc = Alpaca(api_key, secret_key)
+               periods='5Min', take_profit=1.10, stop_loss=0.97,
+               cache_dir=None, panel=False, engine='loop', workers=1,
+               symbols_ttl=60*60, profile=None):
+
+    """
+      engine  : 'loop' walks every bar through `analyzer`, 'vector'
+                takes entries from `signals` and resolves exits with arrays
+      workers : processes to shard symbols across (1 runs in process)
+      symbols_ttl : seconds to reuse the fetched symbol universe
+      profile : None (stage timers only), 'cprofile' or 'sample'
+    """
+
+    self.apc = Alpaca(api_key, secret_key, cache_dir=cache_dir)
+    self.panel = panel
+    self.cache_dir = cache_dir
+    self.symbols_ttl = symbols_ttl
+    self.engine = engine
+    self.workers = workers
     self.stop_loss = stop_loss
     self.take_profit = take_profit
     self.periods = periods
@@ -24,98 +44,284 @@ class AlpacaBacktest(object):
     self.trade_return = {}
     self.trade_data = {}
 
+    # Stage and indicator timings, one record per `run`
+    self.profiler = Profiler(profile=profile)
+
+    # Shared by parameter sweeps, see `indicator`
+    self.indicator_cache = None
+    self.indicator_key = ()
+
 
   # Backtesting
 
   def run(self):
-    self.symbols = [tick['symbol'] for tick in get_symbols(
-      # exchanges=['nyse', 'nasdaq', 'amex'],
-      screener=self.screener
-    )]
-    self.data = self.apc.historical_data(self.symbols, tf=self.periods, limit=self.data_limit)
-    self.indicators()
+    with self.profiler.iteration('backtest'):
+      self.load_data()
+
+      print('Data since ', self.data_since)
+      print('Running backtest...')
+
+      with self.profiler.stage('backtest'):
+        self.backtest()
+
+      with self.profiler.stage('results'):
+        self.print_results()
+
+    self.plot_daily_returns()
+
+  def load_data(self):
+    self.fetch_data()
+
+    with self.profiler.stage('indicators'):
+      self.indicators()
+
+  def fetch_data(self):
+    with self.profiler.stage('universe'):
+      self.symbols = [tick['symbol'] for tick in get_symbols(
+        # exchanges=['nyse', 'nasdaq', 'amex'],
+        screener=self.screener,
+        ttl=self.symbols_ttl, cache_dir=self.cache_dir
+      )]
+
+    with self.profiler.stage('data'):
+      self.data = self.apc.historical_data(
+        self.symbols, tf=self.periods, limit=self.data_limit, as_panel=self.panel
+      )
+
     self.idxs = len(self.data[self.symbols[0]].index)
     self.data_since = self.data[self.symbols[0]].index[0]
 
-    print('Data since ', self.data_since)
-    print('Running backtest...')
+  def backtest(self):
+    if self.workers > 1:
+      return self.backtest_parallel()
 
-    for symbol in self.symbols:
+    engine = self.backtest_vector if self.engine == 'vector' else self.backtest_loop
+
+    # `check_data` drops symbols from `self.symbols`, so walk a copy
+    for symbol in list(self.symbols):
       if not self.check_data(symbol):
         continue
 
       self.symbol = symbol
       self.initialize_vars()
+      engine(symbol)
+
+  def backtest_parallel(self):
+    """
+      Shards the symbols across `workers` processes. Market data is
+      handed over through memory-mapped files and each shard's trade
+      logs are merged back in symbol order.
+    """
+    symbols = [symbol for symbol in self.symbols if symbol in self.data]
+    shards = [
+      [(i, symbols[i]) for i in range(start, len(symbols), self.workers * 4)]
+      for start in range(min(len(symbols), self.workers * 4))
+    ]
+    state = {k: v for k, v in self.__dict__.items() if k not in ['apc', 'data'] + RESULTS}
+
+    with tempfile.TemporaryDirectory() as folder:
+      layout = share_data(self.data, symbols, folder)
+
+      with ProcessPoolExecutor(
+        max_workers=self.workers,
+        initializer=init_worker,
+        initargs=(type(self), state, layout)
+      ) as pool:
+        results = list(pool.map(run_shard, shards))
+
+    kept = set()
+    for result in results:
+      kept.update(result['symbols'])
+
+      for name in RESULTS:
+        getattr(self, name).update(result[name])
+
+    self.symbols = [symbol for symbol in self.symbols if symbol in kept]
+
+  def backtest_loop(self, symbol):
+    opens, closes, highs, lows = (
+      self.data[symbol][col].to_numpy() for col in ['open', 'close', 'high', 'low']
+    )
 
-      for idx in range(1, len(self.data[symbol])-1):
-        self.idx = idx
-        self.same_period = False
-
-        price_open = self.data[symbol]['open'][idx]
-        price_close = self.data[symbol]['close'][idx]
-        price_high = self.data[symbol]['high'][idx]
-        price_low = self.data[symbol]['low'][idx]
-        price_last = self.data[symbol]['close'][idx-1]
-
-        if price_open == 0:
-          self.add_return()
-          continue
+    for idx in range(1, len(self.data[symbol])-1):
+      self.idx = idx
+      self.same_period = False
 
-        # if price_open < 1 or price_open > 5:
-        #   self.add_return()
-        #   continue
+      price_open = opens[idx]
+      price_close = closes[idx]
+      price_high = highs[idx]
+      price_low = lows[idx]
+      price_last = closes[idx-1]
 
-        if not self.position[symbol]:
-          if self.analyzer(symbol, price_open):
-            self.buy()
-            self.same_period = True
+      if price_open == 0:
+        self.add_return()
+        continue
 
-        if self.position[symbol]:
-          self.increment_trade_periods()
+      # if price_open < 1 or price_open > 5:
+      #   self.add_return()
+      #   continue
 
-          price_bought = self.price_bought()
-          price_last = price_open if self.same_period else price_last
+      if not self.position[symbol]:
+        if self.analyzer(symbol, price_open):
+          self.buy()
+          self.same_period = True
 
-          tp_price = price_bought * self.take_profit
-          sl_price = price_bought * self.stop_loss
-          at_take_profit = tp_price <= price_high or tp_price <= price_close
-          at_stop_loss = sl_price >= price_low or sl_price >= price_close
+      if self.position[symbol]:
+        self.increment_trade_periods()
 
-          if at_take_profit and at_stop_loss:
+        price_bought = self.price_bought()
+        price_last = price_open if self.same_period else price_last
 
-            # TODO: We are currently removing the trade
-            # - rather, we should get 5 minute period
-            # data for this specific day and determine
-            # which one came first. Only applies if
-            # our current periods are '1D' or '15Min'
+        tp_price = price_bought * self.take_profit
+        sl_price = price_bought * self.stop_loss
+        at_take_profit = tp_price <= price_high or tp_price <= price_close
+        at_stop_loss = sl_price >= price_low or sl_price >= price_close
 
-            self.remove_trade_data()
-            self.add_return()
-            continue
+        if at_take_profit and at_stop_loss:
 
-          if at_stop_loss:
-            self.sell('stop_loss', price_last)
-            continue
+          # TODO: We are currently removing the trade
+          # - rather, we should get 5 minute period
+          # data for this specific day and determine
+          # which one came first. Only applies if
+          # our current periods are '1D' or '15Min'
 
-          if at_take_profit:
-            self.sell('take_profit', price_last)
-            continue
+          self.remove_trade_data()
+          self.add_return()
+          continue
 
-          self.add_return((price_close / self.data[symbol]['close'][idx-1]) - 1)
+        if at_stop_loss:
+          self.sell('stop_loss', price_last)
           continue
 
-        self.add_return()
+        if at_take_profit:
+          self.sell('take_profit', price_last)
+          continue
 
+        self.add_return((price_close / closes[idx-1]) - 1)
+        continue
 
-      # Clean up
       self.add_return()
 
-      if self.trade_count[symbol] != 0:
-        if len(self.trade_data[symbol][self.trade_count[symbol]]) < 2:
-          self.remove_trade_data()
 
-    self.print_results()
-    self.plot_daily_returns()
+    # Clean up
+    self.add_return()
+
+    if self.trade_count[symbol] != 0:
+      if len(self.trade_data[symbol][self.trade_count[symbol]]) < 2:
+        self.remove_trade_data()
+
+  def backtest_vector(self, symbol):
+    """
+      Same bookkeeping as `backtest_loop`, but entries come from
+      `signals` as one boolean array and the exit of every candidate
+      entry (the first bar crossing its take profit or stop loss) is
+      found with array operations. Python only walks the chain of
+      trades that actually happen, never the bars.
+    """
+    opens, closes, highs, lows = (
+      self.data[symbol][col].to_numpy(dtype=float) for col in ['open', 'close', 'high', 'low']
+    )
+    bars = len(opens)
+
+    # Bars the loop engine evaluates: 1..bars-2 with a non-zero open
+    active = np.zeros(bars, dtype=bool)
+    active[1:bars-1] = opens[1:bars-1] != 0
+
+    entries = np.flatnonzero(np.asarray(self.signals(symbol), dtype=bool) & active)
+    bought = np.round(opens[entries] * 1.005, 2)
+    exits, take_profit, stop_loss = self.first_exits(
+      entries, bought, highs, lows, closes, active
+    )
+
+    returns = np.zeros(bars)
+    held = np.zeros(bars + 1, dtype=np.int64)
+    periods = np.concatenate([[0], np.cumsum(active)])
+    entries, bought, exits = entries.tolist(), bought.tolist(), exits.tolist()
+    k = 0
+
+    while k < len(entries):
+      entry, exit = entries[k], exits[k]
+
+      self.position[symbol] = True
+      self.trade_count[symbol] += 1
+      self.trade_data[symbol][self.trade_count[symbol]] = [bought[k]]
+
+      # One period for the buy plus one per evaluated bar up to the exit
+      self.trade_periods[symbol] += 1 + int(periods[exit+1] - periods[entry])
+
+      # Bars held without exiting return close over previous close
+      held[entry] += 1
+      held[exit] -= 1
+
+      # No crossing: the trade is still open after the last bar
+      if exit == bars-1:
+        break
+
+      if take_profit[k] and stop_loss[k]:
+        self.remove_trade_data()
+      else:
+        typ = 'stop_loss' if stop_loss[k] else 'take_profit'
+        price = bought[k] * getattr(self, typ)
+        price_last = opens[exit] if exit == entry else closes[exit-1]
+
+        self.trade_data[symbol][self.trade_count[symbol]] += [price * 0.995, self.trade_periods[symbol]]
+        self.position[symbol] = False
+        returns[exit] = (price * 0.995 / price_last) - 1
+
+      k = bisect_right(entries, exit, k)
+
+    held = (np.cumsum(held[:bars]) > 0) & active
+    returns[held] = (closes[held] / closes[np.flatnonzero(held)-1]) - 1
+
+    self.trade_return[symbol] = [0] + returns[1:bars-1].tolist() + [0]
+
+    if self.trade_count[symbol] != 0:
+      if len(self.trade_data[symbol][self.trade_count[symbol]]) < 2:
+        self.remove_trade_data()
+
+  def first_exits(self, entries, bought, highs, lows, closes, active):
+    """
+      For every candidate entry, the first evaluated bar (from the entry
+      on) crossing its take profit or stop loss, or `len(closes)-1` when
+      none does. Entries are resolved together in windows that double
+      in size, so short trades never scan the rest of the series.
+      Returns: --> (exit index, hit take profit, hit stop loss) arrays
+    """
+    last = len(closes) - 1
+    exits = np.full(len(entries), last)
+    take_profit = np.zeros(len(entries), dtype=bool)
+    stop_loss = np.zeros(len(entries), dtype=bool)
+
+    tp_price = (bought * self.take_profit)[:, None]
+    sl_price = (bought * self.stop_loss)[:, None]
+    pending = np.arange(len(entries))
+    start = entries.copy()
+    size = 32
+
+    while len(pending):
+      idxs = start[pending, None] + np.arange(size)
+      inside = idxs < last
+      idxs = np.minimum(idxs, last)
+
+      tp = tp_price[pending]
+      sl = sl_price[pending]
+      at_take_profit = ((tp <= highs[idxs]) | (tp <= closes[idxs])) & active[idxs] & inside
+      at_stop_loss = ((sl >= lows[idxs]) | (sl >= closes[idxs])) & active[idxs] & inside
+
+      hits = at_take_profit | at_stop_loss
+      found = hits.any(axis=1)
+      first = hits.argmax(axis=1)[found]
+      rows = np.flatnonzero(found)
+
+      exits[pending[found]] = idxs[rows, first]
+      take_profit[pending[found]] = at_take_profit[rows, first]
+      stop_loss[pending[found]] = at_stop_loss[rows, first]
+
+      start[pending] += size
+      pending = pending[~found & (start[pending] < last)]
+      size *= 2
+
+    return exits, take_profit, stop_loss
 
 
   # Utilities
@@ -147,7 +353,7 @@ class AlpacaBacktest(object):
   def increment_trade_periods(self):
     self.trade_periods[self.symbol] += 1
 
-  def remove_trade_data():
+  def remove_trade_data(self):
     print('Removing trade data.')
     self.position[self.symbol] = False
     self.trade_periods[self.symbol] = 0
@@ -161,7 +367,7 @@ class AlpacaBacktest(object):
     self.trade_data[self.symbol] = {1: []}
 
   def buy(self):
-    price = self.data[self.symbol]['open'][self.idx]
+    price = self.data[self.symbol]['open'].iloc[self.idx]
 
     self.position[self.symbol] = True
     self.trade_count[self.symbol] += 1
@@ -179,7 +385,47 @@ class AlpacaBacktest(object):
     self.position[self.symbol] = False
 
   def indicator(self, func, *args, **kwargs):
-    self.data = func(self.data, *args, **kwargs)
+    if self.indicator_cache is None:
+      with self.profiler.indicator(func.__name__):
+        self.data = func(self.data, *args, **kwargs)
+      return
+
+    # A column only depends on the calls made before it, so the whole
+    # sequence of calls so far is the cache key
+    self.indicator_key += ((func, args, tuple(sorted(kwargs.items()))),)
+    columns = self.indicator_cache.get(self.indicator_key)
+
+    if columns is None:
+      before = {symbol: set(frame.columns) for symbol, frame in self.data.items()}
+
+      with self.profiler.indicator(func.__name__):
+        self.data = func(self.data, *args, **kwargs)
+
+      columns = {
+        symbol: frame[[col for col in frame.columns if col not in before[symbol]]]
+        for symbol, frame in self.data.items()
+      }
+      self.indicator_cache.put(self.indicator_key, columns)
+      return
+
+    for symbol, frame in columns.items():
+      if len(frame.columns):
+        self.data[symbol][list(frame.columns)] = frame
+
+  def signals(self, symbol):
+    """
+      Entry signal for every bar of `symbol`, used by the vector engine.
+      Override with array logic over `self.data[symbol]`; the default
+      asks `analyzer` bar by bar, which only speeds up the exits.
+    """
+    opens = self.data[symbol]['open'].to_numpy()
+    entries = np.zeros(len(opens), dtype=bool)
+
+    for idx in range(1, len(opens)-1):
+      self.idx = idx
+      entries[idx] = bool(self.analyzer(symbol, opens[idx]))
+
+    return entries
 
 
   # Logging
@@ -219,6 +465,14 @@ class AlpacaBacktest(object):
     plt.show()
 
   def print_results(self):
+    final = self.results()
+
+    # Print results
+    print(json.dumps(final, indent=4))
+
+    return final
+
+  def results(self):
     success = 0
     failed = 0
     all_succ = []
@@ -287,5 +541,17 @@ class AlpacaBacktest(object):
       'data_since': str(self.data_since),
     })
 
-    # Print results
-    print(json.dumps(final, indent=4))
+    return final
+
+
+  # Custom
+
+  def indicators(self):
+    pass
+
+  def screener(self, ticker):
+    return True
+
+  def analyzer(self, symbol, price):
+    return False
+
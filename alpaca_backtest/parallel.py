@@ -0,0 +1,93 @@
+from numpy.lib.format import open_memmap
+
+import pandas as pd
+import numpy as np
+import os
+
+"""
+
+  Helpers for `AlpacaBacktest(workers=N)`. The market data of every
+  symbol is written once into memory-mapped arrays that the worker
+  processes open read-only; tasks only carry row ranges, so no frame
+  is pickled per task.
+
+"""
+
+
+RESULTS = ['position', 'trade_periods', 'trade_count', 'trade_return', 'trade_data']
+
+# Per-process state, set by `init_worker`
+worker = {}
+
+
+def share_data(data, symbols, folder):
+  """
+    Writes the frames of `symbols` into `values.npy` (rows of every
+    symbol stacked, one column per frame column) and `times.npy`.
+    Returns: --> layout needed to rebuild the frames: columns, dtypes,
+                 timezone and per-symbol row offsets
+  """
+  columns = list(dict.fromkeys(col for symbol in symbols for col in data[symbol].columns))
+  lengths = [len(data[symbol]) for symbol in symbols]
+  offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+  values = open_memmap(os.path.join(folder, 'values.npy'), 'w+', np.float64, (int(offsets[-1]), len(columns)))
+  times = open_memmap(os.path.join(folder, 'times.npy'), 'w+', np.int64, (int(offsets[-1]),))
+  dtypes = {}
+
+  for i, symbol in enumerate(symbols):
+    frame = data[symbol].reindex(columns=columns)
+    values[offsets[i]:offsets[i+1]] = frame.to_numpy(dtype=np.float64)
+    times[offsets[i]:offsets[i+1]] = frame.index.tz_localize(None).asi8 if frame.index.tz else frame.index.asi8
+    dtypes.update({col: dtype for col, dtype in frame.dtypes.items() if col not in dtypes})
+
+  values.flush()
+  times.flush()
+
+  return {
+    'folder': folder,
+    'columns': columns,
+    'dtypes': {col: str(dtype) for col, dtype in dtypes.items()},
+    'tz': str(data[symbols[0]].index.tz) if symbols and data[symbols[0]].index.tz else None,
+    'offsets': offsets.tolist(),
+  }
+
+def init_worker(cls, state, layout):
+  strategy = cls.__new__(cls)
+  strategy.__dict__.update(state)
+  strategy.workers = 1
+
+  worker['strategy'] = strategy
+  worker['layout'] = layout
+  worker['values'] = np.load(os.path.join(layout['folder'], 'values.npy'), mmap_mode='r')
+  worker['times'] = np.load(os.path.join(layout['folder'], 'times.npy'), mmap_mode='r')
+
+def frame(i):
+  layout = worker['layout']
+  start, end = layout['offsets'][i], layout['offsets'][i+1]
+  index = pd.DatetimeIndex(np.asarray(worker['times'][start:end]).astype('datetime64[ns]'), name='time')
+
+  if layout['tz']:
+    index = index.tz_localize(layout['tz'])
+
+  result = pd.DataFrame(np.array(worker['values'][start:end]), index=index, columns=layout['columns'])
+  return result.astype(layout['dtypes'])
+
+def run_shard(shard):
+  """
+    Args: list of (position in the shared arrays, symbol)
+    Returns: --> symbols that passed `check_data` and their trade logs
+  """
+  strategy = worker['strategy']
+  strategy.symbols = [symbol for _, symbol in shard]
+  strategy.data = {symbol: frame(i) for i, symbol in shard}
+
+  for name in RESULTS:
+    setattr(strategy, name, {})
+
+  strategy.backtest()
+
+  result = {name: getattr(strategy, name) for name in RESULTS}
+  result['symbols'] = strategy.symbols
+
+  return result
@@ -0,0 +1,147 @@
+from ..alpaca_modules.indicator_cache import IndicatorCache
+from .parallel import share_data, init_worker, frame, worker
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import product
+
+import pandas as pd
+import tempfile
+import random
+
+"""
+
+  Parameter sweeps over an `AlpacaBacktest` strategy: data is
+  downloaded once, indicator columns shared between parameter sets are
+  computed once per worker (kept in an `IndicatorCache` up to
+  `cache_bytes`), and the `print_results` metrics of every combination
+  come back as one ranked table.
+
+"""
+
+
+class Sweep(object):
+
+  def __init__(self, strategy, api_key, secret_key, grid=None, space=None,
+               samples=20, seed=0, workers=1, rank_by='overall_return',
+               cache_bytes=256 * 2**20, **kwargs):
+
+    """
+      strategy : `AlpacaBacktest` subclass
+      grid     : {attribute: [values]}, every combination is run
+      space    : {attribute: [values] or (low, high)}, `samples` random
+                 combinations are drawn (floats between low and high);
+                 give one of `grid` and `space`, else ValueError
+      workers  : processes evaluating combinations
+      cache_bytes: memory cap of each worker's shared indicator columns
+      kwargs   : passed to the strategy (data_limit, periods, engine...)
+    """
+
+    if (grid is None) == (space is None):
+      raise ValueError('Sweep takes one of grid or space, got {}'.format('both' if grid is not None else 'neither'))
+
+    self.strategy = strategy
+    self.api_key = api_key
+    self.secret_key = secret_key
+    self.grid = grid
+    self.space = space
+    self.samples = samples
+    self.seed = seed
+    self.workers = workers
+    self.rank_by = rank_by
+    self.cache_bytes = cache_bytes
+    self.kwargs = kwargs
+
+  def combinations(self):
+    if self.grid is not None:
+      keys = list(self.grid)
+      return [dict(zip(keys, values)) for values in product(*self.grid.values())]
+
+    rng = random.Random(self.seed)
+
+    def draw(values):
+      if isinstance(values, tuple):
+        return rng.uniform(*values)
+      return rng.choice(list(values))
+
+    return [{k: draw(v) for k, v in self.space.items()} for _ in range(self.samples)]
+
+  def run(self):
+    base = self.strategy(self.api_key, self.secret_key, **self.kwargs)
+    base.fetch_data()
+
+    return self.evaluate(base)
+
+  def evaluate(self, base):
+    """
+      Args: a strategy whose `symbols` and `data` (without indicators) are loaded
+      Returns: --> DataFrame of parameters and metrics, best first
+    """
+    combos = self.combinations()
+    symbols = [symbol for symbol in base.symbols if symbol in base.data]
+    state = {k: v for k, v in base.__dict__.items() if k not in ['apc', 'data']}
+
+    # Neighbouring combinations share the most indicator calls, so each
+    # worker gets a contiguous run of them
+    size = -(-len(combos) // max(1, self.workers))
+    batches = [combos[i:i + size] for i in range(0, len(combos), size)]
+
+    if self.workers > 1:
+      with tempfile.TemporaryDirectory() as folder:
+        layout = share_data(base.data, symbols, folder)
+
+        with ProcessPoolExecutor(
+          max_workers=self.workers,
+          initializer=init_sweep_worker,
+          initargs=(type(base), state, layout, symbols)
+        ) as pool:
+          rows = [
+            row for batch in pool.map(partial(run_combos, max_bytes=self.cache_bytes), batches)
+            for row in batch
+          ]
+    else:
+      # In process: no per-process `worker` state to set up (or leave behind)
+      raw = {symbol: base.data[symbol] for symbol in symbols}
+      rows = [row for batch in batches for row in run_combos(batch, self.cache_bytes, base, raw)]
+
+    table = pd.DataFrame(rows)
+
+    if self.rank_by in table:
+      table = table.sort_values(self.rank_by, ascending=False, kind='stable')
+
+    return table.reset_index(drop=True)
+
+
+def init_sweep_worker(cls, state, layout, symbols):
+  init_worker(cls, state, layout)
+  worker['raw'] = {symbol: frame(i) for i, symbol in enumerate(symbols)}
+
+def run_combos(combos, max_bytes=256 * 2**20, base=None, raw=None):
+  """
+    Args: the combinations to run, over `base` and its `raw` frames
+          (those of the worker process if None)
+  """
+  base = base if base is not None else worker['strategy']
+  raw = raw if raw is not None else worker['raw']
+  cache = IndicatorCache(max_bytes)
+  rows = []
+
+  for params in combos:
+    strategy = type(base).__new__(type(base))
+    strategy.__dict__.update(base.__dict__)
+    strategy.__dict__.update(params)
+
+    strategy.workers = 1
+    strategy.symbols = list(raw)
+    strategy.data = {symbol: bars.copy() for symbol, bars in raw.items()}
+    strategy.indicator_cache = cache
+    strategy.indicator_key = ()
+
+    for name in ['position', 'trade_periods', 'trade_count', 'trade_return', 'trade_data']:
+      setattr(strategy, name, {})
+
+    strategy.indicators()
+    strategy.backtest()
+
+    rows.append(dict(params, **strategy.results()))
+
+  return rows
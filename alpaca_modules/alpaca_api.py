@@ -1,10 +1,21 @@
 from datetime import datetime, timedelta
 from dateutil import tz
 from .utils import pprint, chunk
-
+from .bar_cache import BarCache, BAR_DTYPE, to_iso, decode_bars, time_index, in_regular_hours
+from .panel import Panel, FIELDS
+from .rate_limit import shared_limiter, retry_after, backoff
+from .metrics import Metrics
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
 import websocket
 import requests
+import threading
+import random
+import os
 import json
 import time
 
@@ -20,13 +31,29 @@ import time
 APC_DATA_ENDPOINT = 'https://data.alpaca.markets'
 APC_ENDPOINT = 'https://api.alpaca.markets'
 APC_PAPER_ENDPOINT = 'https://paper-api.alpaca.markets'
+APC_STREAM_ENDPOINT = 'wss://data.alpaca.markets/stream'
 
 
 class Alpaca(object):
 
-  def __init__(self, api_key, secret_key, paper=False, log=False):
-    self.params = {}
-    self.data = {}
+  def __init__(self, api_key, secret_key, paper=False, log=False,
+               pool_size=10, retries=3, backoff_factor=0.3, workers=4,
+               cache_dir=None, rate_limits=None, metrics=None):
+
+    """
+      pool_size      : keep-alive connections kept open per host
+      retries        : int or `urllib3.util.retry.Retry` for idempotent calls
+      backoff_factor : seconds multiplier between retries
+      workers        : concurrent chunk requests in `historical_data`
+      cache_dir      : folder of the on-disk bar cache (disabled if None)
+      rate_limits    : overrides of `rate_limit.DEFAULT_LIMITS`, the
+                       account budget shared per api key (every client
+                       of a key must pass the same); False disables
+                       client-side pacing
+      metrics        : `Metrics` to record calls into (shared between
+                       clients if given), see `self.metrics`
+    """
+
     self.data_url = f'{APC_DATA_ENDPOINT}/v1'
     self.sandbox_url = f'{APC_PAPER_ENDPOINT}/v2'
     self.headers = {
@@ -37,15 +64,96 @@ class Alpaca(object):
       APC_PAPER_ENDPOINT if paper else APC_ENDPOINT
     )
     self.log = log
+    self.workers = workers
+    self.cache = BarCache(cache_dir) if cache_dir else None
+    # How often `req` re-sends after a 429: as often as the adapter retries,
+    # which with `Retry(total=None)` is the status count (False: never)
+    total = retries if isinstance(retries, int) else retries.total
+    self.retries = int(total if total is not None else retries.status or 0)
+    self.backoff_factor = backoff_factor
+    self.limiter = None if rate_limits is False else shared_limiter(api_key, rate_limits)
+    self.metrics = metrics if metrics is not None else Metrics()
+    self.session = self.create_session(pool_size, retries, backoff_factor)
+
+  def create_session(self, pool_size, retries, backoff_factor):
+    """
+      One pooled session is shared by every call (and thread) so
+      connections are reused instead of re-opened per request.
+      Only idempotent methods are retried; orders (POST) never are.
+    """
+    if not isinstance(retries, Retry):
+      retries = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=['GET', 'DELETE'],
+        raise_on_status=False,
+        # 429s are handled in `req`, together with the rate limiter
+        respect_retry_after_header=False,
+      )
+
+    adapter = HTTPAdapter(
+      pool_connections=pool_size,
+      pool_maxsize=pool_size,
+      max_retries=retries,
+    )
+
+    session = requests.Session()
+    session.headers.update(self.headers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+  def close(self):
+    self.session.close()
+
+  def bucket(self):
+    if self.limiter is None:
+      return None
+
+    # Data and trading calls spend the same account budget
+    return self.limiter.bucket()
+
+  def req(self, typ, endpoint, url='base_url', params=None, data=None):
+    bucket = self.bucket()
+
+    # Orders and cancels go ahead of data pulls. A 429 is refused before
+    # it is processed, so any method can be re-sent after one
+    priority = typ.lower() != 'get'
+    attempts = 1 + self.retries
+    res, latency, waited, retries = None, 0.0, 0.0, 0
 
-  def req(self, typ, endpoint, url='base_url'):
     try:
-      res = getattr(requests, typ)(
-        getattr(self, url) + endpoint,
-        params=self.params,
-        data=self.data,
-        headers=self.headers
-      )
+      for attempt in range(attempts):
+        start = time.perf_counter()
+
+        if bucket:
+          bucket.acquire(priority)
+
+        sent = time.perf_counter()
+        res = self.session.request(
+          typ.upper(),
+          getattr(self, url) + endpoint,
+          params=params,
+          data=data,
+        )
+        latency += time.perf_counter() - sent
+        waited += sent - start
+
+        # Retries urllib3 made on its own (5xx, connection errors)
+        retries += len(res.raw.retries.history) if getattr(res.raw, 'retries', None) else 0
+        wait = bucket.observe(res.status_code, res.headers) if bucket else retry_after(res.headers)
+
+        if res.status_code == 429 and attempt < attempts - 1:
+          # A bucket holds every caller for `wait` itself; jitter spreads the retries
+          pause = backoff(self.backoff_factor, attempt) + (0 if bucket else wait or 0)
+          time.sleep(pause)
+          waited += pause
+          retries += 1
+          continue
+
+        break
 
       date = time.strftime('%Y-%m-%d %H:%M:%S')
       info = res.text[:90] + ('...' if len(str(res.text)) > 90 else ' ')
@@ -53,17 +161,25 @@ class Alpaca(object):
       if self.log:
         print('=> {} {} to {}: {}'.format(date, typ.upper(), endpoint, info))
 
-      if res.status_code != 200:
+      if res.status_code >= 400:
         print('    Error code: ', res.status_code)
         print('    Error message: ', res.text)
 
-      return res.json()
+      # A 204 (e.g. a cancelled order) has no body
+      return res.json() if res.content else None
     except (Exception, ConnectionError) as err:
       print('Error making request: ', err)
+    finally:
+      self.metrics.record(
+        typ, endpoint, res.status_code if res is not None else 'error', latency,
+        bytes_sent=len(data.encode()) if data else 0,
+        bytes_received=len(res.content) if res is not None else 0,
+        retries=retries, waited=waited,
+      )
 
   def close_positions(self, cancel_orders=None, symbol=None, qty=None):
-    self.params = {'qty': qty} if symbol and qty else {'cancel_orders': cancel_orders}
-    return self.req('delete', f'/positions/{symbol}' if symbol and qty else '/positions')
+    params = {'qty': qty} if symbol and qty else {'cancel_orders': cancel_orders}
+    return self.req('delete', f'/positions/{symbol}' if symbol and qty else '/positions', params=params)
 
   def get_positions(self, symbol=None):
     return self.req('get', (f'/positions/{symbol}' if symbol else '/positions'))
@@ -72,45 +188,51 @@ class Alpaca(object):
     return self.req('get', '/account')
 
   def get_orders(self, status="all"):
-    self.params = {'status': status}
-    return self.req('get', f'/orders')
+    return self.req('get', f'/orders', params={'status': status})
+
+  def get_order_by_client_id(self, client_order_id):
+    return self.req('get', '/orders:by_client_order_id', params={'client_order_id': client_order_id})
 
   def cancel_orders(self, order_id=None):
     return self.req('delete', f'/orders/{order_id}' if order_id else '/orders')
 
   def update_order(self, qty, params):
-    self.params = params
-    return self.req('patch', '/orders')
+    return self.req('patch', '/orders', params=params)
 
   def order(self, side, symbol, quantity,
             typ='market', tif='day', limit_price=None,
-            stop_price=None, trail_price=None, trail_percent=None):
-    self.data = json.dumps({
+            stop_price=None, trail_price=None, trail_percent=None,
+            client_order_id=None):
+    data = {
       'symbol': symbol,
       'side': side,
       'qty': quantity,
       'type': typ,
       'time_in_force': tif
-    })
+    }
+
+    # Lets a resend be matched to an order that already went through
+    if client_order_id:
+      data['client_order_id'] = client_order_id
 
     if typ == 'limit':
-      self.data['limit_price'] = limit_price
+      data['limit_price'] = limit_price
 
     if typ == 'stop':
-      self.data['stop_price'] = stop_price
+      data['stop_price'] = stop_price
 
     if typ == 'stop_limit':
-      self.data['limit_price'] = limit_price
-      self.data['stop_price'] = stop_price
+      data['limit_price'] = limit_price
+      data['stop_price'] = stop_price
 
     if typ == 'trailing_stop':
-      self.data['trail_price'] = trail_price
-      self.data['trail_percent'] = trail_percent
+      data['trail_price'] = trail_price
+      data['trail_percent'] = trail_percent
 
-    return self.req('post', '/orders')
+    return self.req('post', '/orders', data=json.dumps(data))
 
-  def bracket_order(self, symbol, quantity, tplp, slsp, tif='day'):
-    self.data = json.dumps({
+  def bracket_order(self, symbol, quantity, tplp, slsp, tif='day', client_order_id=None):
+    data = {
       'symbol': symbol,
       'qty': quantity,
       'time_in_force': tif,
@@ -119,15 +241,18 @@ class Alpaca(object):
       'order_class': 'bracket',
       'take_profit': {'limit_price': tplp},
       'stop_loss': {'limit_price': slsp, 'stop_price': slsp}
-    })
+    }
 
-    return self.req('post', '/orders')
+    if client_order_id:
+      data['client_order_id'] = client_order_id
 
-  def buy(self, symbol, qty, tif="day"):
-    return self.order('buy', symbol, qty, tif=tif)
+    return self.req('post', '/orders', data=json.dumps(data))
 
-  def sell(self, symbol, qty, tif="day"):
-    return self.order('sell', symbol, qty, tif=tif)
+  def buy(self, symbol, qty, tif="day", client_order_id=None):
+    return self.order('buy', symbol, qty, tif=tif, client_order_id=client_order_id)
+
+  def sell(self, symbol, qty, tif="day", client_order_id=None):
+    return self.order('sell', symbol, qty, tif=tif, client_order_id=client_order_id)
 
   def stop_buy(self, symbol, qty, stop_price):
     return self.order('buy', symbol, qty, stop_price=stop_price, typ='stop')
@@ -142,74 +267,207 @@ class Alpaca(object):
       return self.order(side, symbol, qty, typ='trailing_stop', trail_percent=stop_perc)
 
   def get_bar_data(self, timeframe, params):
-    self.params = params
-    return self.req('get', f'/bars/{timeframe}', url='data_url')
+    return self.req('get', f'/bars/{timeframe}', url='data_url', params=params)
 
   def get_last_trade(self, symbol):
     return self.req('get', f'/last/stocks/{symbol}', url='data_url')
 
+  def last_prices(self, symbols, workers=None):
+    """
+      Latest price of many symbols: the close of each one's last minute
+      bar, fetched in concurrent 200-symbol requests instead of one
+      `get_last_trade` call per symbol.
+      Returns: --> python object of key (symbol) and value (price)
+    """
+    def latest(raw):
+      return {symbol: bars[-1]['c'] for symbol, bars in (raw or {}).items() if bars}
+
+    return self.fetch_chunks(symbols, '1Min', {'limit': 1}, latest, workers)
+
   def get_clock(self):
     return self.req('get', '/clock')
 
   def historical_data(self, symbols, tf='1D',
                       limit=200, start='',
-                      end='', after='', until=''):
+                      end='', after='', until='', workers=None, as_panel=False,
+                      regular_hours=False, tz=None, compact=False):
     """
-      Args: symbols (DataFrame column/list of symbols), tf, limit, start, end, after, until
+      Args: symbols (DataFrame column/list of symbols), tf, limit, start, end, after, until,
+            workers (concurrent chunk requests, defaults to `self.workers`),
+            as_panel (return a `Panel` instead of a dict),
+            regular_hours (drop intraday bars outside 9:30-16:00 New York),
+            tz (timezone of the index, naive UTC if None),
+            compact (with `as_panel`: float32 prices and uint32 volumes)
       Returns: --> python object of key (symbol) and value (DataFrame of data)
     """
-    data_headers = {
-      't': 'time',
-      'o': 'open',
-      'h': 'high',
-      'l': 'low',
-      'c': 'close',
-      'v': 'volume',
-    }
-    chunks = chunk(symbols, 200)
-    symbol_chunks = []
-    result = {}
-
-    for section in chunks:
-      symbol_chunks.append(','.join(section[i] for i in range(0, len(section))))
-
-    for bite in symbol_chunks:
+    if self.cache and not (start or end or after or until):
+      records = self.cached_historical_data(symbols, tf, limit, workers)
+    else:
       params = {
-        "symbols": bite,
         "limit": limit,
         "start": start,
         "end": end,
         "after": after,
         "until": until,
       }
-      raw = self.get_bar_data(tf, params)
+      records = self.fetch_chunks(symbols, tf, params, decode_bars, workers)
 
-      for symbol, data in raw.items():
-        if not data:
-          continue
+    return self.bars_result(records, tf, as_panel, regular_hours, tz, compact)
+
+  def cached_historical_data(self, symbols, tf, limit, workers=None):
+    """
+      Serves the latest `limit` bars from the bar cache, fetching only
+      each symbol's last cached bar (which may have been still forming)
+      and the bars after it.
+    """
+    for group, params, store in self.cache_requests(symbols, tf, limit):
+      self.fetch_chunks(group, tf, params, store, workers)
+
+    return self.cache_result(symbols, tf, limit)
+
+  def cache_requests(self, symbols, tf, limit):
+    """
+      Groups symbols by their last cached bar.
+      Returns: --> list of (symbols, `/bars` params, response handler)
+    """
+    groups = {}
+
+    for symbol in symbols:
+      last = self.cache.last_time(symbol, tf)
+
+      # Not enough history on disk yet: fetch it in full
+      if last is not None and self.cache.size(symbol, tf) < limit:
+        last = None
+
+      groups.setdefault(last, []).append(symbol)
+
+    pending = []
+    for last, group in groups.items():
+      # From the last cached bar on, inclusive: it is fetched again
+      params = {"limit": limit, "start": to_iso(last) if last else ''}
+
+      def store(raw, replace=last is None):
+        for symbol, data in (raw or {}).items():
+          # A full page after a delta means bars were skipped
+          if data:
+            self.cache.write(symbol, tf, data, replace=replace or len(data) >= limit)
+
+        return {}
 
-        result[symbol] = pd.DataFrame(data)
-        result[symbol].rename(data_headers, axis=1, inplace=True)
-        result[symbol]['time'] = pd.to_datetime(result[symbol]['time'], unit='s')
-        result[symbol].set_index('time', inplace=True)
+      pending.append((group, params, store))
 
-        # New York time
-        index = result[symbol].index
-        index = index.tz_localize('UTC').tz_convert('America/Indiana/Petersburg')
+    return pending
 
-        # Non pre/post market data included
-        result[symbol].between_time('09:31', '16:00')
+  def cache_result(self, symbols, tf, limit):
+    """
+      Returns: --> python object of key (symbol) and value (cached record array)
+    """
+    result = {}
+
+    for symbol in symbols:
+      bars = self.cache.read(symbol, tf, limit)
+
+      if len(bars):
+        result[symbol] = bars
 
     return result
 
+  def fetch_chunks(self, symbols, tf, params, handle, workers=None):
+    """
+      Requests `/bars` for 200-symbol chunks concurrently and calls
+      `handle` on each response as soon as it lands. The handled chunks
+      are merged in request order so the result never depends on timing.
+    """
+    chunks = chunk(symbols, 200)
+    workers = max(1, min(workers or self.workers, len(chunks) or 1))
+    parsed = {}
+
+    def fetch(section):
+      return self.get_bar_data(tf, dict(params, symbols=','.join(section)))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+      futures = {pool.submit(fetch, section): i for i, section in enumerate(chunks)}
+
+      for future in as_completed(futures):
+        parsed[futures[future]] = handle(future.result())
+
+    result = {}
+    for i in range(len(chunks)):
+      result.update(parsed[i])
+
+    return result
+
+  def bars_result(self, records, tf, as_panel=False, regular_hours=False, tz=None, compact=False):
+    """
+      Turns decoded bars into frames (or a `Panel`) in one go: the
+      session filter and the time index run once over every symbol's
+      bars, and each frame is a slice of the shared columns.
+
+      Args: python object of key (symbol) and value (record array)
+      Returns: --> python object of key (symbol) and value (DataFrame of data)
+    """
+    symbols = [symbol for symbol, bars in records.items() if len(bars)]
+    bars = np.concatenate([records[symbol] for symbol in symbols]) if symbols else np.empty(0, BAR_DTYPE)
+    owner = np.repeat(np.arange(len(symbols)), [len(records[symbol]) for symbol in symbols])
+
+    # Daily bars are stamped at midnight: only intraday bars have a session
+    if regular_hours and tf != '1D':
+      keep = in_regular_hours(bars['t'])
+      bars, owner = bars[keep], owner[keep]
+
+    if as_panel:
+      return Panel.from_records(symbols, owner, bars, tz, compact)
+
+    index = time_index(bars['t'], tz)
+    columns = {name: np.ascontiguousarray(bars[key]) for key, name in zip('ohlcv', FIELDS)}
+    bounds = np.searchsorted(owner, np.arange(len(symbols) + 1))
+    result = {}
+
+    for i, symbol in enumerate(symbols):
+      lo, hi = bounds[i], bounds[i + 1]
+
+      if hi > lo:
+        result[symbol] = pd.DataFrame(
+          {name: values[lo:hi] for name, values in columns.items()}, index=index[lo:hi]
+        )
+
+    return result
+
+  def parse_bars(self, raw, tf=None, regular_hours=False, tz=None):
+    """
+      Args: raw `/bars` response, tf (for `regular_hours`), regular_hours, tz
+            as in `historical_data`
+      Returns: --> python object of key (symbol) and value (DataFrame of data)
+    """
+    return self.bars_result(decode_bars(raw), tf, regular_hours=regular_hours, tz=tz)
+
 
 
 
 class AlpacaStreaming(object):
+  """
+    One long-lived websocket. Streams are added and removed on the open
+    socket with `subscribe`/`unsubscribe`; if the connection drops it is
+    re-opened with exponential backoff and every current stream is
+    subscribed again. Only the first `connect`/`start` opens it; later
+    calls subscribe their streams on it.
+  """
 
-  def __init__(self, api_key, secret_key):
+  def __init__(self, api_key, secret_key, url=APC_STREAM_ENDPOINT,
+               backoff=1, max_backoff=60):
     self.api_key = api_key
     self.secret_key = secret_key
+    self.url = url
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+
+    self.ws = None
+    self.streams = []
+    self.running = False
+    self.connected = threading.Event()
+    self.reconnects = 0
+    self.thread = None
+    self.lock = threading.Lock()
 
   def authenticate(self, ws, streams):
     ws.send(json.dumps({
@@ -225,22 +483,116 @@ class AlpacaStreaming(object):
       'data': {'streams': streams}
     }))
 
+  def send(self, action, streams):
+    if not self.connected.is_set():
+      return False
+
+    try:
+      self.ws.send(json.dumps({'action': action, 'data': {'streams': streams}}))
+      return True
+    except websocket.WebSocketException:
+      # The reconnect will send the current streams
+      return False
+
+  def subscribe(self, streams):
+    streams = [stream for stream in streams if stream not in self.streams]
+    self.streams.extend(streams)
+
+    if streams:
+      self.send('listen', streams)
+
+  def unsubscribe(self, streams):
+    streams = [stream for stream in streams if stream in self.streams]
+    self.streams = [stream for stream in self.streams if stream not in streams]
+
+    if streams:
+      self.send('unlisten', streams)
+
+  def claim(self, streams):
+    """
+      Marks the connection as running, unless it already is: then
+      `streams` are only subscribed on it.
+        Returns: --> True for the one caller that opens the connection
+    """
+    with self.lock:
+      opening = not self.running
+
+      if opening:
+        self.running = True
+        self.streams = list(streams)
+
+    if not opening:
+      self.subscribe(streams)
+
+    return opening
+
   def connect(self, streams, on_message=None):
-    ws = websocket.WebSocketApp(
-      "wss://data.alpaca.markets/stream"
-    )
+    """
+      Blocks, keeping the connection open until `close` is called. If
+      it is open already, subscribes `streams` and returns.
+    """
+    if self.claim(streams):
+      self.thread = threading.current_thread()
+      self.run(on_message)
+
+    return self.ws
 
-    if on_message:
-      ws.on_message = on_message
+  def run(self, on_message=None):
+    attempt = 0
 
     def on_open(ws):
-      return self.authenticate(ws, streams)
+      nonlocal attempt
+      attempt = 0
+      self.connected.set()
+      return self.authenticate(ws, self.streams)
+
+    def on_close(ws, *args):
+      self.connected.clear()
+
+    while self.running:
+      self.ws = websocket.WebSocketApp(
+        self.url,
+        on_open=on_open,
+        on_message=on_message if on_message else self.on_message,
+        on_close=on_close,
+        on_error=self.on_error,
+      )
+      self.ws.run_forever()
+      self.connected.clear()
+
+      if not self.running:
+        break
+
+      # Jittered exponential backoff before reconnecting
+      delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+      time.sleep(delay * random.uniform(0.5, 1))
+      attempt += 1
+      self.reconnects += 1
+
+    return self.ws
 
-    ws.on_message = on_message if on_message else self.on_message
-    ws.on_open = on_open
-    ws.run_forever()
+  def start(self, streams, on_message=None):
+    """
+      Runs the connection on a daemon thread and returns the thread. If
+      it is open already, subscribes `streams` instead.
+    """
+    if self.claim(streams):
+      self.thread = threading.Thread(target=self.run, args=(on_message,), daemon=True)
+      self.thread.start()
+
+    return self.thread
+
+  def close(self):
+    self.running = False
 
-    return ws
+    if self.ws:
+      self.ws.close()
+
+  def on_message(self, ws, message):
+    pass
+
+  def on_error(self, ws, error):
+    print('Streaming error: ', error)
 
 
 
@@ -249,53 +601,111 @@ class AlpacaStreaming(object):
 
 
 
+SCREENER_ENDPOINT = 'https://api.nasdaq.com/api/screener/stocks'
+SCREENER_HEADERS = {
+  'authority': 'api.nasdaq.com',
+  'sec-ch-ua': '"Google Chrome";v="89", "Chromium";v="89", ";Not A Brand";v="99"',
+  'accept': 'application/json, text/plain, */*',
+  'sec-ch-ua-mobile': '?0',
+  'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_2) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36',
+  'origin': 'https://www.nasdaq.com',
+  'sec-fetch-site': 'same-site',
+  'sec-fetch-mode': 'cors',
+  'sec-fetch-dest': 'empty',
+  'referer': 'https://www.nasdaq.com/',
+  'accept-language': 'en-US,en;q=0.9',
+}
+
+# (limit, exchanges, marketcap) --> (fetched at, ticker records)
+symbols_cache = {}
+
+
 def get_symbols(limit=10000, exchanges=['nyse'],
-                marketcap='small', screener=lambda x: True):
+                marketcap='small', screener=lambda x: True,
+                ttl=60*60, cache_dir=None, refresh=False):
 
   """
     A simple request to the nasdaq site for all the stocks
     in the united states (region 'north_america').
+
+    The parsed table is kept in memory, and in `cache_dir` when given,
+    for `ttl` seconds, so only the screener runs on repeat calls.
+    `refresh=True` skips the cache.
   """
 
-  params = []
-  result = []
+  key = (limit, tuple(exchanges), marketcap)
+  tickers = None if refresh else cached_symbols(key, ttl, cache_dir)
+
+  if tickers is None:
+    try:
+      tickers = fetch_symbols(limit, exchanges, marketcap)
+    except (requests.RequestException, ValueError, KeyError):
+      # Any snapshot beats no universe
+      tickers = cached_symbols(key, float('inf'), cache_dir)
+
+      if tickers is None:
+        raise
+
+    store_symbols(key, tickers, cache_dir)
+
+  return [ticker for ticker in map(dict, tickers) if screener(ticker)]
+
 
-  headers = {
-    'authority': 'api.nasdaq.com',
-    'sec-ch-ua': '"Google Chrome";v="89", "Chromium";v="89", ";Not A Brand";v="99"',
-    'accept': 'application/json, text/plain, */*',
-    'sec-ch-ua-mobile': '?0',
-    'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_2) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36',
-    'origin': 'https://www.nasdaq.com',
-    'sec-fetch-site': 'same-site',
-    'sec-fetch-mode': 'cors',
-    'sec-fetch-dest': 'empty',
-    'referer': 'https://www.nasdaq.com/',
-    'accept-language': 'en-US,en;q=0.9',
-  }
+def symbols_file(key, cache_dir):
+  limit, exchanges, marketcap = key
+  return os.path.join(cache_dir, 'symbols-{}-{}-{}.pkl'.format('_'.join(exchanges), marketcap, limit))
 
-  for exchange in exchanges:
-    params.append({'tableonly': False, 'limit': limit, 'exchange': exchange, 'marketcap': marketcap})
+def cached_symbols(key, ttl, cache_dir):
+  if key in symbols_cache and time.time() - symbols_cache[key][0] < ttl:
+    return symbols_cache[key][1]
 
-  for param in params:
-    res = requests.get(
-      'https://api.nasdaq.com/api/screener/stocks', headers=headers, params=param
-    ).json()
+  if not cache_dir or not os.path.exists(symbols_file(key, cache_dir)):
+    return None
+
+  fetched, tickers = pd.read_pickle(symbols_file(key, cache_dir))
+
+  if time.time() - fetched >= ttl:
+    return None
+
+  symbols_cache[key] = (fetched, tickers)
+  return tickers
+
+def store_symbols(key, tickers, cache_dir):
+  symbols_cache[key] = (time.time(), tickers)
+
+  if cache_dir:
+    os.makedirs(cache_dir, exist_ok=True)
+    path = symbols_file(key, cache_dir)
+    pd.to_pickle(symbols_cache[key], path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def fetch_symbols(limit, exchanges, marketcap):
+  """
+    Fetches every exchange concurrently and parses the rows in bulk.
+    Returns: --> list of ticker dicts, `lastsale`/`pctchange` as floats
+  """
+  def fetch(exchange):
+    params = {'tableonly': False, 'limit': limit, 'exchange': exchange, 'marketcap': marketcap}
+    res = requests.get(SCREENER_ENDPOINT, headers=SCREENER_HEADERS, params=params)
+    return exchange, res.json()['data']['table']['rows']
 
-    for ticker in res['data']['table']['rows']:
-      # Fix small bug
-      if ticker['pctchange'][-1] != '%':
-        ticker['pctchange'] = '0.0%'
+  with ThreadPoolExecutor(max_workers=max(1, len(exchanges))) as pool:
+    tables = list(pool.map(fetch, exchanges))
 
-      ticker['symbol'] = ticker['symbol'].split(' ')[0]
-      ticker['exchange'] = param['exchange']
-      ticker['lastsale'] = float(ticker['lastsale'][1:])
-      ticker['pctchange'] = float(ticker['pctchange'][:-2])/100
+  frames = [pd.DataFrame(rows).assign(exchange=exchange) for exchange, rows in tables if rows]
 
-      passed = screener(ticker)
+  if not frames:
+    return []
 
-      if passed:
-        result.append(ticker)
+  table = pd.concat(frames, ignore_index=True)
+  table['symbol'] = table['symbol'].str.split(' ').str[0]
+  table['lastsale'] = pd.to_numeric(
+    table['lastsale'].str.lstrip('$').str.replace(',', ''), errors='coerce'
+  ).fillna(0.0)
 
+  # Rows without a percentage (e.g. 'UNCH') count as no change. The
+  # last two characters are cut, as `get_symbols` always has
+  pctchange = table['pctchange'].where(table['pctchange'].str.endswith('%', na=False), '0.0%')
+  table['pctchange'] = pd.to_numeric(pctchange.str[:-2], errors='coerce').fillna(0.0) / 100
 
-  return result
\ No newline at end of file
+  return table.to_dict('records')
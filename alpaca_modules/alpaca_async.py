@@ -0,0 +1,269 @@
+from .alpaca_api import Alpaca, APC_STREAM_ENDPOINT
+from .bar_cache import decode_bars
+from .utils import chunk
+from .rate_limit import retry_after, backoff
+
+import asyncio
+import random
+import json
+import time
+
+try:
+  import aiohttp
+except ImportError:
+  aiohttp = None
+
+"""
+
+  Asyncio counterparts of `Alpaca` and `AlpacaStreaming`, built on
+  aiohttp (an optional dependency: `pip install aiohttp`). Every
+  endpoint of `Alpaca` is available as a coroutine.
+
+"""
+
+
+def require_aiohttp():
+  if aiohttp is None:
+    raise ImportError('The asyncio client needs aiohttp: pip install aiohttp')
+
+def clean_params(params):
+  """
+    aiohttp rejects None and bool query values, requests drops/strs them.
+  """
+  return {
+    k: (str(v).lower() if isinstance(v, bool) else v)
+    for k, v in (params or {}).items() if v is not None
+  }
+
+
+class AsyncAlpaca(Alpaca):
+  """
+    `Alpaca` whose `req` is a coroutine, so every endpoint method
+    (`get_clock`, `buy`, `bracket_order`...) returns an awaitable.
+    Use it inside a running event loop and `await close()` when done.
+  """
+
+  def __init__(self, *args, **kwargs):
+    require_aiohttp()
+    super(AsyncAlpaca, self).__init__(*args, **kwargs)
+
+  def create_session(self, pool_size, retries, backoff_factor):
+    # aiohttp sessions must be created inside the running loop
+    self.pool_size = pool_size
+
+  def open(self):
+    if self.session is None or self.session.closed:
+      self.session = aiohttp.ClientSession(
+        headers=self.headers,
+        connector=aiohttp.TCPConnector(limit_per_host=self.pool_size),
+      )
+
+    return self.session
+
+  async def close(self):
+    if self.session is not None and not self.session.closed:
+      await self.session.close()
+
+  async def __aenter__(self):
+    self.open()
+    return self
+
+  async def __aexit__(self, *args):
+    await self.close()
+
+  async def req(self, typ, endpoint, url='base_url', params=None, data=None):
+    # Same policy as the sync client: 5xx only retried for idempotent
+    # calls, a 429 for any, and orders go ahead of data pulls
+    bucket = self.bucket()
+    priority = typ != 'get'
+    attempts = 1 + self.retries
+    status, size, latency, waited, retries = 'error', 0, 0.0, 0.0, 0
+
+    try:
+      for attempt in range(attempts):
+        start = time.perf_counter()
+
+        if bucket:
+          await bucket.acquire_async(priority)
+
+        sent = time.perf_counter()
+        async with self.open().request(
+          typ.upper(),
+          getattr(self, url) + endpoint,
+          params=clean_params(params),
+          data=data,
+        ) as res:
+          body = await res.read()
+          status, size, text = res.status, len(body), body.decode('utf-8', 'replace')
+          wait = bucket.observe(status, res.headers) if bucket else retry_after(res.headers)
+
+        latency += time.perf_counter() - sent
+        waited += sent - start
+
+        date = time.strftime('%Y-%m-%d %H:%M:%S')
+        info = text[:90] + ('...' if len(text) > 90 else ' ')
+
+        if self.log:
+          print('=> {} {} to {}: {}'.format(date, typ.upper(), endpoint, info))
+
+        pause = None
+
+        if status in [500, 502, 503, 504] and typ in ['get', 'delete'] and attempt < attempts - 1:
+          pause = backoff(self.backoff_factor, attempt)
+
+        if status == 429 and attempt < attempts - 1:
+          pause = backoff(self.backoff_factor, attempt) + (0 if bucket else wait or 0)
+
+        if pause is not None:
+          await asyncio.sleep(pause)
+          waited += pause
+          retries += 1
+          continue
+
+        if status >= 400:
+          print('    Error code: ', status)
+          print('    Error message: ', text)
+
+        return json.loads(text) if text else None
+    except asyncio.CancelledError:
+      raise
+    except Exception as err:
+      print('Error making request: ', err)
+    finally:
+      self.metrics.record(
+        typ, endpoint, status, latency, bytes_sent=len(data.encode()) if data else 0,
+        bytes_received=size, retries=retries, waited=waited,
+      )
+
+  async def historical_data(self, symbols, tf='1D',
+                            limit=200, start='',
+                            end='', after='', until='', workers=None, as_panel=False,
+                            regular_hours=False, tz=None, compact=False):
+    if self.cache and not (start or end or after or until):
+      for group, params, store in self.cache_requests(symbols, tf, limit):
+        await self.fetch_chunks(group, tf, params, store, workers)
+
+      records = self.cache_result(symbols, tf, limit)
+    else:
+      params = {
+        "limit": limit,
+        "start": start,
+        "end": end,
+        "after": after,
+        "until": until,
+      }
+      records = await self.fetch_chunks(symbols, tf, params, decode_bars, workers)
+
+    return self.bars_result(records, tf, as_panel, regular_hours, tz, compact)
+
+  async def fetch_chunks(self, symbols, tf, params, handle, workers=None):
+    """
+      Same contract as `Alpaca.fetch_chunks`: at most `workers` chunk
+      requests in flight, each handled (off the loop) as it lands, and
+      merged in request order.
+    """
+    limit = asyncio.Semaphore(max(1, workers or self.workers))
+
+    async def fetch(section):
+      async with limit:
+        raw = await self.get_bar_data(tf, dict(params, symbols=','.join(section)))
+
+      return await asyncio.to_thread(handle, raw)
+
+    result = {}
+    for parsed in await asyncio.gather(*(fetch(section) for section in chunk(symbols, 200))):
+      result.update(parsed)
+
+    return result
+
+
+class AsyncAlpacaStreaming(object):
+  """
+    One websocket on the shared aiohttp session. `listen()` yields
+    parsed messages; `subscribe`/`unsubscribe` change the streams on
+    the open socket without reconnecting. Like `AlpacaStreaming`, a
+    dropped connection is re-opened with jittered exponential backoff
+    and every current stream is subscribed again.
+  """
+
+  def __init__(self, apc, url=APC_STREAM_ENDPOINT, backoff=1, max_backoff=60):
+    self.apc = apc
+    self.url = url
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+
+    self.ws = None
+    self.streams = []
+    self.running = False
+    self.reconnects = 0
+
+  async def send(self, action, data):
+    if self.ws is None or self.ws.closed:
+      return False
+
+    try:
+      await self.ws.send_str(json.dumps({'action': action, 'data': data}))
+      return True
+    except (aiohttp.ClientError, ConnectionError):
+      # The reconnect will send the current streams
+      return False
+
+  async def subscribe(self, streams):
+    streams = [stream for stream in streams if stream not in self.streams]
+    self.streams.extend(streams)
+
+    if streams:
+      await self.send('listen', {'streams': streams})
+
+  async def unsubscribe(self, streams):
+    streams = [stream for stream in streams if stream in self.streams]
+    self.streams = [stream for stream in self.streams if stream not in streams]
+
+    if streams:
+      await self.send('unlisten', {'streams': streams})
+
+  async def listen(self, streams):
+    """
+      Yields every text message until `close` is called, reconnecting
+      when the connection drops. Streams subscribed before are kept.
+    """
+    self.streams.extend(stream for stream in streams if stream not in self.streams)
+    self.running = True
+    attempt = 0
+
+    while self.running:
+      try:
+        async with self.apc.open().ws_connect(self.url) as ws:
+          self.ws = ws
+          attempt = 0
+
+          await self.send('authenticate', {
+            'key_id': self.apc.headers['APCA-API-KEY-ID'],
+            'secret_key': self.apc.headers['APCA-API-SECRET-KEY'],
+          })
+          await self.send('listen', {'streams': list(self.streams)})
+
+          async for message in ws:
+            if message.type == aiohttp.WSMsgType.TEXT:
+              yield message.data
+            elif message.type in [aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR]:
+              break
+      except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError) as error:
+        print('Streaming error: ', error)
+      finally:
+        self.ws = None
+
+      if not self.running:
+        break
+
+      # Jittered exponential backoff before reconnecting
+      delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+      await asyncio.sleep(delay * random.uniform(0.5, 1))
+      attempt += 1
+      self.reconnects += 1
+
+  async def close(self):
+    self.running = False
+
+    if self.ws is not None:
+      await self.ws.close()
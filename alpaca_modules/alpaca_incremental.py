@@ -0,0 +1,376 @@
+from collections import deque
+from . import alpaca_indicators as batch
+
+import math
+
+"""
+
+  Streaming counterparts of the indicators in `alpaca_indicators.py`.
+  Each one is seeded once from a symbol's history and then updated one
+  bar at a time in O(1), producing the same columns (and the same
+  numbers) as the batch function. The last bar can be revised while it
+  is still forming: every state keeps what its last update changed
+  (the previous scalars and the values its windows dropped), so the
+  update is taken back and the bar applied again.
+
+"""
+
+
+NAN = float('nan')
+
+
+def is_nan(x):
+  return x is None or x != x
+
+def divide(a, b):
+  if b:
+    return a / b
+
+  return NAN if a == 0 or is_nan(a) else math.copysign(math.inf, a)
+
+
+# Building blocks
+
+
+class EMA(object):
+  """
+    `Series.ewm(span=span, min_periods=min_periods).mean()`, one value at a time.
+  """
+
+  def __init__(self, span, min_periods=0):
+    self.decay = 1 - 2 / (span + 1)
+    self.min_periods = max(min_periods, 1)
+    self.weighted = NAN
+    self.old_wt = 1
+    self.nobs = 0
+    self.last = None
+
+  def update(self, x):
+    self.last = (self.weighted, self.old_wt, self.nobs)
+    observed = not is_nan(x)
+    self.nobs += observed
+
+    if not is_nan(self.weighted):
+      self.old_wt *= self.decay
+
+      if observed:
+        self.weighted = (self.old_wt * self.weighted + x) / (self.old_wt + 1)
+        self.old_wt += 1
+    elif observed:
+      self.weighted = x
+      self.old_wt = 1
+
+    return self.weighted if self.nobs >= self.min_periods else NAN
+
+  def undo(self):
+    self.weighted, self.old_wt, self.nobs = self.last
+
+
+class RollingMean(object):
+  """
+    `Series.rolling(periods).mean()` with a running sum.
+  """
+
+  def __init__(self, periods):
+    self.periods = periods
+    self.window = deque()
+    self.total = 0.0
+    self.missing = 0
+    self.last = None
+
+  def push(self, x):
+    self.last = (self.total, self.missing, ())
+    self.window.append(x)
+
+    if is_nan(x):
+      self.missing += 1
+    else:
+      self.total += x
+
+    if len(self.window) > self.periods:
+      old = self.window.popleft()
+      self.last = self.last[:2] + ((old,),)
+
+      if is_nan(old):
+        self.missing -= 1
+      else:
+        self.total -= old
+
+  def undo(self):
+    self.total, self.missing, dropped = self.last
+    self.window.pop()
+    self.window.extendleft(dropped)
+
+  def full(self):
+    return len(self.window) == self.periods and not self.missing
+
+  def update(self, x):
+    self.push(x)
+    return self.total / self.periods if self.full() else NAN
+
+
+class RollingStd(object):
+  """
+    `Series.rolling(periods).std(ddof=0)` with running sums of values
+    centred on the first one seen, which keeps the squares small.
+  """
+
+  def __init__(self, periods):
+    self.mean = RollingMean(periods)
+    self.square = RollingMean(periods)
+    self.centre = None
+    self.last_centre = None
+
+  def update(self, x):
+    self.last_centre = self.centre
+
+    if self.centre is None and not is_nan(x):
+      self.centre = x
+
+    x = x - self.centre if self.centre is not None else x
+    mean = self.mean.update(x)
+    square = self.square.update(x * x)
+
+    return NAN if is_nan(mean) else math.sqrt(max(square - mean * mean, 0))
+
+  def undo(self):
+    self.mean.undo()
+    self.square.undo()
+    self.centre = self.last_centre
+
+
+class RollingExtreme(object):
+  """
+    `Series.rolling(periods).max()` (or `.min()`) with a monotonic deque.
+  """
+
+  def __init__(self, periods, highest=True):
+    self.periods = periods
+    self.highest = highest
+    self.window = deque()  # (position, value), best value first
+    self.last_nan = -periods
+    self.position = -1
+    self.last = None
+
+  def update(self, x):
+    self.position += 1
+    self.last = (self.last_nan, not is_nan(x), [], [])  # Values dropped from the back, the front
+
+    if is_nan(x):
+      self.last_nan = self.position
+    else:
+      while self.window and (
+        self.window[-1][1] <= x if self.highest else self.window[-1][1] >= x
+      ):
+        self.last[2].append(self.window.pop())
+
+      self.window.append((self.position, x))
+
+    while self.window and self.window[0][0] <= self.position - self.periods:
+      self.last[3].append(self.window.popleft())
+
+    if self.position < self.periods - 1 or self.last_nan > self.position - self.periods:
+      return NAN
+
+    return self.window[0][1]
+
+  def undo(self):
+    self.last_nan, pushed, back, front = self.last
+    self.window.extendleft(reversed(front))
+
+    if pushed:
+      self.window.pop()
+
+    self.window.extend(reversed(back))
+    self.position -= 1
+
+
+# Indicators: same arguments as the batch functions, minus `data`
+
+
+class MACD(object):
+  columns = ['macd', 'signal']
+
+  def __init__(self, fast=12, slow=26, ema=9):
+    self.fast = EMA(fast, fast)
+    self.slow = EMA(slow, slow)
+    self.signal = EMA(ema, ema)
+
+  def update(self, bar):
+    macd = self.fast.update(bar['close']) - self.slow.update(bar['close'])
+    return {'macd': macd, 'signal': self.signal.update(macd)}
+
+  def undo(self):
+    self.fast.undo()
+    self.slow.undo()
+    self.signal.undo()
+
+
+class Stochastic(object):
+  columns = ['HH', 'LL', '%K', '%D']
+
+  def __init__(self, lookback=14, k=3, d=3):
+    self.highest = RollingExtreme(lookback, highest=True)
+    self.lowest = RollingExtreme(lookback, highest=False)
+    self.k = RollingMean(k)
+    self.d = RollingMean(d)
+
+  def update(self, bar):
+    hh = self.highest.update(bar['high'])
+    ll = self.lowest.update(bar['low'])
+    pct_k = self.k.update(100 * divide(bar['close'] - ll, hh - ll))
+
+    return {'HH': hh, 'LL': ll, '%K': pct_k, '%D': self.d.update(pct_k)}
+
+  def undo(self):
+    for part in (self.highest, self.lowest, self.k, self.d):
+      part.undo()
+
+
+class ATR(object):
+  columns = ['ATR']
+
+  def __init__(self, periods=14):
+    self.ema = EMA(periods, periods)
+    self.prev_close = NAN
+    self.last_close = NAN
+
+  def update(self, bar):
+    high, low, prev = bar['high'], bar['low'], self.prev_close
+    self.last_close = prev
+    self.prev_close = bar['close']
+
+    # Any missing input makes the true range missing (skipna=False)
+    parts = [high - low, abs(high - prev), abs(low - prev)]
+    tr = NAN if any(is_nan(p) for p in parts) else max(parts)
+
+    return {'ATR': self.ema.update(tr)}
+
+  def undo(self):
+    self.ema.undo()
+    self.prev_close = self.last_close
+
+
+class SMA(object):
+
+  def __init__(self, col, periods=14):
+    self.col = col
+    self.name = '{}_{}'.format(periods, col.lower())
+    self.columns = [self.name]
+    self.mean = RollingMean(periods)
+
+  def update(self, bar):
+    return {self.name: self.mean.update(bar[self.col])}
+
+  def undo(self):
+    self.mean.undo()
+
+
+class IsAbove(object):
+  columns = ['is_above']
+
+  def __init__(self, sma1, sma2):
+    self.first = f'{sma1}_close'
+    self.second = f'{sma2}_close'
+
+  def update(self, bar):
+    return {'is_above': bool(bar[self.first] > bar[self.second])}
+
+  def undo(self):
+    pass
+
+
+class HighLow(object):
+  columns = ['high_low']
+
+  def update(self, bar):
+    return {'high_low': (bar['high'] / bar['low']) - 1}
+
+  def undo(self):
+    pass
+
+
+class BollingerBands(object):
+  columns = ['BB_width']
+
+  def __init__(self, period=20):
+    self.std = RollingStd(period)
+
+  def update(self, bar):
+    return {'BB_width': 4 * self.std.update(bar['close'])}
+
+  def undo(self):
+    self.std.undo()
+
+
+STREAMING = {
+  batch.MACD: MACD,
+  batch.stochastic: Stochastic,
+  batch.ATR: ATR,
+  batch.sma: SMA,
+  batch.is_above: IsAbove,
+  batch.high_low: HighLow,
+  batch.bollinger_bands: BollingerBands,
+}
+
+
+class IndicatorSet(object):
+  """
+    The streaming state of a list of `indicator(func, ...)` declarations
+    for every symbol. Declarations are applied in order, so later ones
+    can read the columns of earlier ones (e.g. `sma('ATR')`).
+  """
+
+  def __init__(self):
+    self.declarations = []
+    self.states = {}
+
+  def declare(self, func, *args, **kwargs):
+    if func not in STREAMING:
+      raise ValueError(f'{func.__name__} has no streaming counterpart')
+
+    if (func, args, kwargs) not in self.declarations:
+      self.declarations.append((func, args, kwargs))
+
+  def __contains__(self, symbol):
+    return symbol in self.states
+
+  def forget(self, symbol):
+    self.states.pop(symbol, None)
+
+  def seed(self, symbol, frame):
+    """
+      Runs a symbol's history (OHLCV columns of a DataFrame) through
+      fresh state. Returns the indicator columns for that history.
+    """
+    self.states[symbol] = [
+      STREAMING[func](*args, **kwargs) for func, args, kwargs in self.declarations
+    ]
+
+    source = {col: frame[col].tolist() for col in frame.columns}
+    rows = [self.update(symbol, dict(zip(source, values))) for values in zip(*source.values())]
+
+    return {col: [row[col] for row in rows] for col in (rows[0] if rows else {})}
+
+  def update(self, symbol, bar):
+    """
+      Args: symbol, dict of one new bar's OHLCV
+      Returns: --> the bar with every indicator column filled in
+    """
+    bar = dict(bar)
+
+    for state in self.states[symbol]:
+      bar.update(state.update(bar))
+
+    return bar
+
+  def revise(self, symbol, bar):
+    """
+      Replaces the last bar passed to `seed` or `update` with new
+      values of the same bar (one still forming).
+        Returns: --> the bar with every indicator column filled in
+    """
+    for state in self.states[symbol]:
+      state.undo()
+
+    return self.update(symbol, bar)
@@ -1,9 +1,21 @@
+from .panel import Panel
+from . import alpaca_kernels as kernels
+
+# Every indicator takes either the `{symbol: DataFrame}` dict or a
+# `Panel`; panels are computed for all symbols at once by the kernels,
+# over each symbol's own bars (see `Panel.per_bar`).
 
 
 def MACD(data, fast=12, slow=26, ema=9):
   """
   Advanced moving average indicator.
   """
+  if isinstance(data, Panel):
+    macd, signal = data.per_bar(kernels.macd, ['close'], fast, slow, ema)
+    data.set_field('macd', macd)
+    data.set_field('signal', signal)
+    return data
+
   for df in data:
     data[df]['ma_fast'] = data[df]['close'].ewm(span=fast, min_periods=fast).mean()
     data[df]['ma_slow'] = data[df]['close'].ewm(span=slow, min_periods=slow).mean()
@@ -21,6 +33,13 @@ def stochastic(data, lookback=14, k=3, d=3):
   Range from 0 - 100: closer to 100 shows it
   is reaching the end of it's trend
   """
+  if isinstance(data, Panel):
+    columns = data.per_bar(kernels.stochastic, ['high', 'low', 'close'], lookback, k, d)
+
+    for name, values in zip(['HH', 'LL', '%K', '%D'], columns):
+      data.set_field(name, values)
+
+    return data
 
   for df in data:
     data[df]['HH'] = data[df]['high'].rolling(lookback).max()
@@ -41,6 +60,10 @@ def stochastic(data, lookback=14, k=3, d=3):
 
 
 def ATR(data, periods=14):
+  if isinstance(data, Panel):
+    data.set_field('ATR', data.per_bar(kernels.atr, ['high', 'low', 'close'], periods))
+    return data
+
   for df in data:
     data[df]['H-L'] = data[df]['high'] - data[df]['low']
     data[df]['H-PC'] = abs(data[df]['high'] - data[df]['close'].shift(1))
@@ -54,18 +77,32 @@ def ATR(data, periods=14):
 
 
 def sma(data, col, periods=14):
+  if isinstance(data, Panel):
+    data.set_field('{}_{}'.format(periods, col.lower()), data.per_bar(kernels.sma, [col], periods))
+    return data
+
   for df in data:
     data[df]['{}_{}'.format(periods, col.lower())] = data[df][col].rolling(periods).mean()
 
   return data
 
 def is_above(data, sma1, sma2):
+  if isinstance(data, Panel):
+    data.set_field('is_above', kernels.is_above(
+      data.field(f'{sma1}_close'), data.field(f'{sma2}_close')
+    ))
+    return data
+
   for df in data:
     data[df]['is_above'] = data[df][f'{sma1}_close'] > data[df][f'{sma2}_close']
 
   return data
 
 def high_low(data):
+  if isinstance(data, Panel):
+    data.set_field('high_low', kernels.high_low(data.field('high'), data.field('low')))
+    return data
+
   for df in data:
     data[df]['high_low'] = (data[df]['high'] / data[df]['low']) - 1
 
@@ -73,10 +110,16 @@ def high_low(data):
 
 
 def bollinger_bands(data, period=20):
+  if isinstance(data, Panel):
+    data.set_field('BB_width', data.per_bar(kernels.bollinger_width, ['close'], period))
+    return data
+
   for df in data:
+    std = data[df]['close'].rolling(period).std(ddof=0)
+
     data[df]['MB'] = data[df]['close'].rolling(period).mean()
-    data[df]['UB'] = data[df]['MB'] + 2 * data[df]['close'].rolling(period).std(ddof=0)
-    data[df]['LB'] = data[df]['MB'] - 2 * data[df]['close'].rolling(period).std(ddof=0)
+    data[df]['UB'] = data[df]['MB'] + 2 * std
+    data[df]['LB'] = data[df]['MB'] - 2 * std
     data[df]['BB_width'] = data[df]['UB'] - data[df]['LB']
 
     data[df].drop(['MB', 'UB', 'LB'], axis=1, inplace=True)
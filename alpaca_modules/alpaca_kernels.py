@@ -0,0 +1,139 @@
+from numpy.lib.stride_tricks import sliding_window_view
+
+import numpy as np
+
+"""
+
+  Whole-universe indicator kernels. Every function takes and returns
+  2-D (time × symbol) arrays, computing all symbols at once with
+  NumPy and matching the pandas maths in `alpaca_indicators.py`.
+  Consecutive rows are consecutive bars: a panel's rows without a bar
+  are packed out by `Panel.per_bar` first. A NaN value inside a column
+  propagates like it does in pandas.
+
+"""
+
+
+def ewm_mean(x, span, min_periods=0):
+  """
+    Same as `Series.ewm(span=span, min_periods=min_periods).mean()`
+    (adjust=True, ignore_na=False) applied to every column.
+  """
+  decay = 1 - 2 / (span + 1)
+  out = np.full(x.shape, np.nan, dtype=x.dtype)
+  weighted = np.full(x.shape[1:], np.nan, dtype=x.dtype)
+  old_wt = np.ones(x.shape[1:], dtype=x.dtype)
+  nobs = np.zeros(x.shape[1:], dtype=np.int64)
+
+  for i in range(len(x)):
+    cur = x[i]
+    is_obs = ~np.isnan(cur)
+    started = ~np.isnan(weighted)
+    nobs += is_obs
+
+    old_wt = np.where(started, old_wt * decay, old_wt)
+    update = started & is_obs
+    weighted = np.where(update, (old_wt * weighted + cur) / (old_wt + 1), weighted)
+    old_wt = np.where(update, old_wt + 1, old_wt)
+
+    # First observation of a column starts its average
+    first = ~started & is_obs
+    weighted = np.where(first, cur, weighted)
+    old_wt = np.where(first, 1, old_wt)
+
+    out[i] = np.where(nobs >= max(min_periods, 1), weighted, np.nan)
+
+  return out
+
+def rolling_sum(x, periods):
+  """
+    Rolling sum over `periods` rows, NaN unless the whole window is valid.
+  """
+  valid = ~np.isnan(x)
+  sums = np.cumsum(np.where(valid, x, 0), axis=0, dtype=np.float64)
+  counts = np.cumsum(valid, axis=0)
+
+  sums[periods:] = sums[periods:] - sums[:-periods]
+  counts[periods:] = counts[periods:] - counts[:-periods]
+
+  return np.where(counts == periods, sums, np.nan).astype(x.dtype, copy=False)
+
+def rolling_mean(x, periods):
+  return rolling_sum(x, periods) / periods
+
+def rolling_std(x, periods):
+  """
+    Population (ddof=0) rolling standard deviation. Each column is
+    centred first so the running sums of squares stay well conditioned.
+  """
+  with np.errstate(all='ignore'):
+    centred = x - np.nanmean(x, axis=0)
+    mean = rolling_mean(centred, periods)
+    var = rolling_mean(centred * centred, periods) - mean * mean
+
+  return np.sqrt(np.maximum(var, 0))
+
+def rolling_extreme(x, periods, func):
+  out = np.full(x.shape, np.nan, dtype=x.dtype)
+
+  if len(x) >= periods:
+    out[periods - 1:] = func(sliding_window_view(x, periods, axis=0), axis=-1)
+
+  return out
+
+def rolling_max(x, periods):
+  return rolling_extreme(x, periods, np.max)
+
+def rolling_min(x, periods):
+  return rolling_extreme(x, periods, np.min)
+
+def shift(x, periods=1):
+  out = np.full(x.shape, np.nan, dtype=x.dtype)
+  out[periods:] = x[:-periods]
+  return out
+
+
+# Indicators
+
+
+def macd(close, fast=12, slow=26, ema=9):
+  """
+    Returns: --> (macd, signal)
+  """
+  line = ewm_mean(close, fast, fast) - ewm_mean(close, slow, slow)
+  return line, ewm_mean(line, ema, ema)
+
+def stochastic(high, low, close, lookback=14, k=3, d=3):
+  """
+    Returns: --> (HH, LL, %K, %D)
+  """
+  hh = rolling_max(high, lookback)
+  ll = rolling_min(low, lookback)
+
+  with np.errstate(all='ignore'):
+    pct_k = rolling_mean(100 * ((close - ll) / (hh - ll)), k)
+
+  return hh, ll, pct_k, rolling_mean(pct_k, d)
+
+def true_range(high, low, close):
+  prev = shift(close)
+
+  # np.maximum propagates NaN, like `max(axis=1, skipna=False)`
+  return np.maximum(np.maximum(high - low, np.abs(high - prev)), np.abs(low - prev))
+
+def atr(high, low, close, periods=14):
+  return ewm_mean(true_range(high, low, close), periods, periods)
+
+def sma(x, periods=14):
+  return rolling_mean(x, periods)
+
+def is_above(a, b):
+  with np.errstate(invalid='ignore'):
+    return a > b
+
+def high_low(high, low):
+  return (high / low) - 1
+
+def bollinger_width(close, period=20):
+  # (MB + 2σ) - (MB - 2σ)
+  return 4 * rolling_std(close, period)
@@ -0,0 +1,195 @@
+from datetime import datetime
+from dateutil import tz
+
+import pandas as pd
+import threading
+
+"""
+
+  Builds OHLCV bars at a strategy's `bar_period` from the data stream:
+  trades (`T.<symbol>`) or minute bars (`AM.<symbol>`). A bar is closed
+  once a later message for the symbol arrives or its period has passed
+  on the clock (`flush`). Closed bars wait per symbol until `pop`,
+  which also returns the bar still forming, so the current bar of a
+  long period (a day) moves with the stream instead of waiting to close.
+  `seed` starts that bar from the partial one fetched over REST; trades
+  from before the fetch that also arrive on the stream count twice in
+  its volume.
+
+  Bars are stamped like `parse_bars` output: the naive UTC start of the
+  period; daily bars start at midnight New York time.
+
+"""
+
+
+PERIODS = {
+  '1Min': 60,
+  '5Min': 60*5,
+  '15Min': 60*15,
+  '1D': 60*60*24,
+}
+
+NEW_YORK = tz.gettz('America/New_York')
+
+
+def period_start(seconds, tf):
+  if tf == '1D':
+    day = datetime.fromtimestamp(seconds, NEW_YORK).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(day.timestamp())
+
+  return int(seconds) - int(seconds) % PERIODS[tf]
+
+
+class BarBuilder(object):
+
+  def __init__(self, tf='1Min', grace=5):
+    """
+      Args:
+        tf:     bar period, one of `PERIODS`
+        grace:  seconds after a period ends before `flush` closes its bar,
+                for messages still in flight
+    """
+    if tf not in PERIODS:
+      raise ValueError(f'Unsupported bar period {tf}, use one of {list(PERIODS)}')
+
+    self.tf = tf
+    self.grace = grace
+    self.open = {}
+    self.closed = {}
+    self.last = {}
+    self.prices = {}
+    self.lock = threading.Lock()
+
+  def add(self, symbol, start, o, h, l, c, v):
+    """
+      Folds a trade or a smaller bar starting at `start` (epoch seconds)
+      into the symbol's current bar.
+    """
+    t = period_start(start, self.tf)
+
+    with self.lock:
+      bar = self.open.get(symbol)
+
+      # Late data for a bar that is already closed
+      if (bar and t < bar['t']) or t <= self.last.get(symbol, -1):
+        return
+
+      self.prices[symbol] = c
+
+      if bar and t > bar['t']:
+        self.close(symbol)
+        bar = None
+
+      if bar is None:
+        self.open[symbol] = {'t': t, 'o': o, 'h': h, 'l': l, 'c': c, 'v': v}
+        return
+
+      bar['h'] = max(bar['h'], h)
+      bar['l'] = min(bar['l'], l)
+      bar['c'] = c
+      bar['v'] += v
+
+  def seed(self, symbol, frame):
+    """
+      Starts the symbol's current bar from the last bar of its history
+      (a `parse_bars` frame), merging what was streamed into that
+      period already. An older bar is ignored.
+    """
+    if not len(frame):
+      return
+
+    row = frame.iloc[-1]
+    seeded = {
+      't': int(frame.index[-1].timestamp()), 'o': row['open'], 'h': row['high'],
+      'l': row['low'], 'c': row['close'], 'v': int(row['volume']),
+    }
+
+    with self.lock:
+      bar = self.open.get(symbol)
+
+      if seeded['t'] <= self.last.get(symbol, -1) or (bar and seeded['t'] < bar['t']):
+        return
+
+      if bar and seeded['t'] == bar['t']:
+        seeded.update(h=max(seeded['h'], bar['h']), l=min(seeded['l'], bar['l']), c=bar['c'], v=seeded['v'] + bar['v'])
+
+      self.open[symbol] = seeded
+
+  def add_trade(self, symbol, price, size, timestamp):
+    """
+      Args: timestamp in epoch seconds, milli, micro or nanoseconds
+    """
+    while timestamp > 1e11:
+      timestamp /= 1000
+
+    self.add(symbol, timestamp, price, price, price, price, int(size))
+
+  def add_message(self, data):
+    """
+      Args: `data` of a `T.` or `AM.` stream message
+      Returns: --> True when the message was used
+    """
+    if 'T' not in data:
+      return False
+
+    if data.get('ev') == 'AM':
+      self.add(data['T'], data['s'] / 1000, data['o'], data['h'], data['l'], data['c'], int(data['v']))
+      return True
+
+    if 'p' in data and 't' in data:
+      self.add_trade(data['T'], data['p'], data.get('s', 0), data['t'])
+      return True
+
+    return False
+
+  def flush(self, now=None):
+    """
+      Closes every open bar whose period (plus `grace`) has ended.
+    """
+    now = now if now is not None else datetime.now().timestamp()
+    cutoff = period_start(now - self.grace, self.tf)
+
+    with self.lock:
+      for symbol, bar in list(self.open.items()):
+        if bar['t'] < cutoff:
+          self.close(symbol)
+
+  def close(self, symbol):
+    bar = self.open.pop(symbol)
+    self.last[symbol] = bar['t']
+    self.closed.setdefault(symbol, []).append(bar)
+
+  def pop(self, symbol):
+    """
+      Returns: --> DataFrame of the symbol's closed bars since the last
+                   call then its current bar, laid out like `parse_bars`
+                   output (None if empty). The current bar comes again
+                   on every call until it closes.
+    """
+    with self.lock:
+      bars = self.closed.pop(symbol, [])
+
+      if symbol in self.open:
+        bars = bars + [dict(self.open[symbol])]
+
+    if not bars:
+      return None
+
+    return pd.DataFrame({
+      'open': [bar['o'] for bar in bars],
+      'high': [bar['h'] for bar in bars],
+      'low': [bar['l'] for bar in bars],
+      'close': [bar['c'] for bar in bars],
+      'volume': [bar['v'] for bar in bars],
+    }, index=pd.Index(pd.to_datetime([bar['t'] for bar in bars], unit='s'), name='time'))
+
+  def price(self, symbol):
+    """
+      Returns: --> the latest streamed price of the symbol, or None
+    """
+    return self.prices.get(symbol)
+
+  def forget(self, symbol):
+    with self.lock:
+      for state in (self.open, self.closed, self.last, self.prices):
+        state.pop(symbol, None)
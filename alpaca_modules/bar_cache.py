@@ -0,0 +1,140 @@
+from datetime import datetime, timezone
+from operator import itemgetter
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+import os
+
+"""
+
+  A local store of bars keyed by (symbol, timeframe). Every series is
+  one flat file of fixed-size records that is only appended to (the
+  last record aside, rewritten when a bar still forming is fetched
+  again), and read back as a memory-mapped NumPy array.
+
+"""
+
+
+BAR_DTYPE = np.dtype([
+  ('t', '<i8'),
+  ('o', '<f8'),
+  ('h', '<f8'),
+  ('l', '<f8'),
+  ('c', '<f8'),
+  ('v', '<i8'),
+])
+
+# `/bars` keys in record order
+BAR_FIELDS = itemgetter('t', 'o', 'h', 'l', 'c', 'v')
+
+# Regular session of bars stamped at their start, seconds into the New York day
+REGULAR_HOURS = (9*60*60 + 30*60, 16*60*60)
+
+
+class BarCache(object):
+
+  def __init__(self, path):
+    self.path = path
+
+  def file(self, symbol, tf):
+    folder = os.path.join(self.path, tf)
+    os.makedirs(folder, exist_ok=True)
+
+    return os.path.join(folder, symbol.replace('/', '_') + '.bars')
+
+  def size(self, symbol, tf):
+    path = self.file(symbol, tf)
+    return os.path.getsize(path) // BAR_DTYPE.itemsize if os.path.exists(path) else 0
+
+  def read(self, symbol, tf, limit=None):
+    """
+      Returns: --> the last `limit` bars as a read-only memory-mapped record array
+    """
+    size = self.size(symbol, tf)
+
+    if size == 0:
+      return np.empty(0, dtype=BAR_DTYPE)
+
+    bars = np.memmap(self.file(symbol, tf), dtype=BAR_DTYPE, mode='r', shape=(size,))
+    return bars[-limit:] if limit else bars
+
+  def last_time(self, symbol, tf):
+    """
+      Returns: --> epoch seconds of the newest cached bar, or None
+    """
+    bars = self.read(symbol, tf, limit=1)
+    return int(bars['t'][0]) if len(bars) else None
+
+  def write(self, symbol, tf, records, replace=False):
+    """
+      Appends the bars newer than the last cached one, overwriting the
+      last one itself when it comes again (it may have been still
+      forming when cached). With `replace` the series is rewritten
+      instead (used when a delta left a gap).
+    """
+    bars = to_records(records)
+    last = None if replace else self.last_time(symbol, tf)
+
+    if last is None:
+      if len(bars) or replace:
+        with open(self.file(symbol, tf), 'wb' if replace else 'ab') as f:
+          f.write(bars.tobytes())
+
+      return len(bars)
+
+    bars = bars[bars['t'] >= last]
+
+    if len(bars):
+      # The last cached bar comes again: write over it
+      again = int(bars['t'][0] == last)
+
+      with open(self.file(symbol, tf), 'r+b') as f:
+        f.seek((self.size(symbol, tf) - again) * BAR_DTYPE.itemsize)
+        f.write(bars.tobytes())
+
+    return len(bars)
+
+
+def to_records(data):
+  """
+    Args: list of `/bars` dicts ({'t', 'o', 'h', 'l', 'c', 'v'})
+    Returns: --> numpy record array sorted by time
+  """
+  bars = np.fromiter(map(BAR_FIELDS, data), dtype=BAR_DTYPE, count=len(data))
+
+  return np.sort(bars, order='t')
+
+def decode_bars(raw):
+  """
+    Decodes a whole `/bars` response in one pass: every bar lands in a
+    single record array, split per symbol into views.
+    Returns: --> python object of key (symbol) and value (record array)
+  """
+  symbols = [symbol for symbol, data in (raw or {}).items() if data]
+  sizes = [len(raw[symbol]) for symbol in symbols]
+  bars = np.fromiter(
+    map(BAR_FIELDS, chain.from_iterable(raw[symbol] for symbol in symbols)),
+    dtype=BAR_DTYPE, count=sum(sizes),
+  )
+
+  return dict(zip(symbols, np.split(bars, np.cumsum(sizes)[:-1])))
+
+def time_index(times, tz=None):
+  """
+    Args: epoch seconds; tz: timezone to convert to (naive UTC if None)
+  """
+  index = pd.DatetimeIndex(np.asarray(times, dtype='i8').astype('datetime64[s]'), name='time')
+  return index.tz_localize('UTC').tz_convert(tz) if tz else index
+
+def in_regular_hours(times):
+  """
+    Returns: --> mask of the bars starting between 9:30 and 16:00 New York time
+  """
+  wall = time_index(times, 'America/New_York').tz_localize(None).as_unit('s')
+  seconds = wall.asi8 % (24*60*60)
+
+  return (seconds >= REGULAR_HOURS[0]) & (seconds < REGULAR_HOURS[1])
+
+def to_iso(epoch):
+  return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+
+import numpy as np
+import threading
+
+"""
+
+  Indicator columns kept between iterations, per symbol. An entry is
+  keyed by (symbol, indicator declaration, fingerprint of the bars it
+  was computed from), so a symbol whose bars have not changed since the
+  last iteration (halted, illiquid, or a daily bar still forming
+  elsewhere in the universe) reuses its columns, and only symbols with
+  new or updated bars are recomputed. Least recently used entries are
+  evicted past a memory cap.
+
+  A fingerprint is the number of bars, the first and last timestamps
+  and the last bar's values, all of the symbol's own bars (the rows of
+  a `Panel` it has no bar on are left out): a correction to an older
+  bar that keeps those is not seen. On a `Panel` the columns are kept
+  over those rows too, so they still fit when the shared index grows
+  for other symbols.
+
+"""
+
+
+class IndicatorCache(object):
+
+  def __init__(self, max_bytes=256 * 2**20, max_entries=None):
+    """
+      Args:
+        max_bytes:   memory cap of the cached columns
+        max_entries: optional cap on the number of entries
+    """
+    self.max_bytes = max_bytes
+    self.max_entries = max_entries
+
+    self.entries = OrderedDict()  # key -> ({column: values}, bytes)
+    self.bytes = 0
+    self.lock = threading.Lock()
+
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key):
+    """
+      Returns: --> {column: values} cached for `key`, or None
+    """
+    with self.lock:
+      entry = self.entries.get(key)
+
+      if entry is None:
+        self.misses += 1
+        return None
+
+      self.hits += 1
+      self.entries.move_to_end(key)
+
+      return entry[0]
+
+  def put(self, key, columns):
+    size = sum(nbytes(values) for values in columns.values())
+
+    with self.lock:
+      if key in self.entries:
+        self.bytes -= self.entries.pop(key)[1]
+
+      if size > self.max_bytes:
+        return
+
+      while self.entries and (
+        self.bytes + size > self.max_bytes or
+        self.max_entries is not None and len(self.entries) >= self.max_entries
+      ):
+        self.bytes -= self.entries.popitem(last=False)[1][1]
+        self.evictions += 1
+
+      self.entries[key] = (columns, size)
+      self.bytes += size
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.bytes = 0
+
+  def stats(self):
+    with self.lock:
+      lookups = self.hits + self.misses
+
+      return {
+        'hits': self.hits,
+        'misses': self.misses,
+        'hit_rate': self.hits / lookups if lookups else None,
+        'evictions': self.evictions,
+        'entries': len(self.entries),
+        'bytes': self.bytes,
+        'max_bytes': self.max_bytes,
+      }
+
+
+def nbytes(values):
+  """
+    Bytes of an array, or of a DataFrame's columns (see `Sweep`).
+  """
+  if isinstance(values, np.ndarray):
+    return values.nbytes
+
+  return int(values.memory_usage(index=False).sum())
+
+
+# Fingerprints
+
+
+def fingerprint(frame, fields=('open', 'high', 'low', 'close', 'volume')):
+  """
+    Returns: --> fingerprint of the bars of one `DataFrame`
+  """
+  if frame.empty:
+    return (0,)
+
+  # As bytes, so a NaN matches itself
+  last = np.array([frame[field].iat[-1] for field in fields if field in frame], dtype=float)
+
+  return len(frame), frame.index[0], frame.index[-1], last.tobytes()
+
+def panel_fingerprints(panel):
+  """
+    Returns: --> fingerprint of each symbol's bars in a `Panel`, in
+                 `panel.symbols` order, from the rows it has a bar on
+                 (the same as `fingerprint` of its frame)
+  """
+  present = panel.present
+
+  if not present.size:
+    return [(0,)] * len(panel.symbols)
+
+  counts = present.sum(axis=0)
+  first = present.argmax(axis=0)
+  last = len(panel.index) - 1 - present[::-1].argmax(axis=0)
+
+  rows = np.arange(len(panel.symbols))
+  values = panel.array[rows, last].astype(float)
+
+  if panel.compact:
+    values = np.column_stack([values, panel.volume[rows, last]])
+
+  return [
+    (int(counts[i]), panel.index[first[i]], panel.index[last[i]], values[i].tobytes()) if counts[i] else (0,)
+    for i in rows
+  ]
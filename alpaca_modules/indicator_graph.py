@@ -0,0 +1,396 @@
+from .panel import Panel, column_names
+from .indicator_cache import fingerprint, panel_fingerprints
+from . import alpaca_indicators as batch
+from contextlib import nullcontext
+
+import numpy as np
+import inspect
+
+"""
+
+  `indicator(func, ...)` declarations as a dependency graph over the
+  data store. Identical declarations (the same function and arguments,
+  however they are passed) share one node, and the inputs of the
+  built-in indicators are declared when missing, so `is_above(10, 50)`
+  brings its two `sma`s. Nothing is computed until a column is read: a
+  `Panel` computes only the nodes behind the column asked for, a
+  `{symbol: DataFrame}` store computes a symbol's columns when that
+  symbol is read. Custom functions are called once with every frame,
+  as a plain call on the store would be, after the nodes declared
+  before them have run for every symbol.
+
+  With a `window`, the store is first cut to the trailing bars that
+  many rows of every column need (the longest lookback in the graph),
+  instead of computing over the whole history. Indicators with
+  unbounded memory (the EWMs of `MACD` and `ATR`) or an unknown one
+  (custom functions) keep the whole history.
+
+  With an `IndicatorCache`, the built-in indicators reuse the columns
+  of symbols whose bars are unchanged since they were last computed.
+  Custom functions are always run: they may read more than the bars,
+  and so are the built-in indicators reading their columns.
+
+"""
+
+
+BASE = {'open', 'high', 'low', 'close', 'volume'}
+
+
+def spec(inputs, outputs, lookback, requires=None):
+  """
+    inputs  : columns read
+    outputs : columns written
+    lookback: bars of input behind one row of output, None if unbounded
+    requires: {input: (func, args)} declaring a missing input
+  """
+  return dict(inputs=inputs, outputs=outputs, lookback=lookback, requires=requires or {})
+
+
+SPECS = {
+  batch.MACD: lambda fast=12, slow=26, ema=9: spec(['close'], ['macd', 'signal'], None),
+  batch.stochastic: lambda lookback=14, k=3, d=3: spec(
+    ['high', 'low', 'close'], ['HH', 'LL', '%K', '%D'], lookback + k + d - 2
+  ),
+  batch.ATR: lambda periods=14: spec(['high', 'low', 'close'], ['ATR'], None),
+  batch.sma: lambda col, periods=14: spec([col], ['{}_{}'.format(periods, col.lower())], periods),
+  batch.is_above: lambda sma1, sma2: spec(
+    [f'{sma1}_close', f'{sma2}_close'], ['is_above'], 1, {
+      f'{sma1}_close': (batch.sma, ('close', sma1)),
+      f'{sma2}_close': (batch.sma, ('close', sma2)),
+    }
+  ),
+  batch.high_low: lambda: spec(['high', 'low'], ['high_low'], 1),
+  batch.bollinger_bands: lambda period=20: spec(['close'], ['BB_width'], period),
+}
+
+
+class Node(object):
+
+  def __init__(self, key, func, args, kwargs, spec=None, transient=False):
+    self.key = key
+    self.func = func
+    self.args = args
+    self.kwargs = kwargs
+    self.spec = spec  # None for custom functions: found out on the first run
+    self.transient = transient
+
+    self.outputs = set(spec['outputs']) if spec else set()
+    self.done = set()  # Symbols computed, None for a whole panel
+
+
+class IndicatorGraph(object):
+
+  def __init__(self, timer=None, cache=None):
+    """
+      timer: context manager factory timing each computation by
+             indicator name, e.g. `Profiler.indicator`
+      cache: `IndicatorCache` reused across `bind`s
+    """
+    self.timer = timer or (lambda name: nullcontext())
+    self.cache = cache
+    self.bind(None)
+
+  def bind(self, data, window=None):
+    """
+      Starts an empty graph over `data`.
+        Args:
+          data  : `Panel` or `{symbol: DataFrame}`
+          window: rows of every column to compute, all if None
+        Returns: --> the store to read from (the panel itself, or a
+                     `LazyFrames` over the frames)
+    """
+    self.nodes = []
+    self.keys = {}
+    self.producers = {}
+    self.window = window
+    self.trimmed = False
+
+    if isinstance(data, Panel):
+      data.resolve = self.resolve
+      self.data = data
+    else:
+      self.data = LazyFrames(self, data or {})
+
+    return self.data
+
+  def declare(self, func, *args, transient=False, **kwargs):
+    key = self.key(func, args, kwargs)
+    node = self.keys.get(key)
+
+    if node is not None:
+      # Transient only if every declaration says so
+      node.transient = node.transient and transient
+      return node
+
+    node_spec = SPECS[func](*args, **kwargs) if func in SPECS else None
+
+    for name, (required, required_args) in (node_spec['requires'] if node_spec else {}).items():
+      if name not in self.producers:
+        self.declare(required, *required_args, transient=transient)
+
+    node = Node(key, func, args, kwargs, node_spec, transient)
+    self.nodes.append(node)
+    self.keys[key] = node
+
+    for name in node.outputs:
+      self.producers[name] = node
+
+    return node
+
+  def key(self, func, args, kwargs):
+    bound = inspect.signature(func).bind(None, *args, **kwargs)
+    bound.apply_defaults()
+
+    return func, repr(list(bound.arguments.items())[1:])
+
+  # Computing
+
+  def resolve(self, name=None):
+    """
+      Computes what reading column `name` of a `Panel` needs, every
+      declared column if None.
+    """
+    producer = self.producers.get(name)
+
+    for node in (self.chain(producer) if producer else list(self.nodes)):
+      if None in node.done:
+        continue
+
+      if self.cached(node) and self.data.symbols:
+        self.run_cached(node)
+      else:
+        self.run(node, self.data, None)
+
+  def compute(self, symbol):
+    """
+      Computes every declared column of one symbol's frame.
+    """
+    pending = [node for node in self.nodes if symbol not in node.done]
+
+    for node in pending:
+      if node.spec is None:
+        self.run_custom(node)
+        return self.compute(symbol)
+
+    self.compute_frame(symbol, pending)
+
+  def run_custom(self, node):
+    """
+      Runs a custom function over the whole `{symbol: DataFrame}` store.
+    """
+    before = self.nodes[:self.nodes.index(node)]
+
+    # The nodes before the first custom function are all built-in
+    for symbol in dict.keys(self.data):
+      self.compute_frame(symbol, [other for other in before if symbol not in other.done])
+
+    frames = self.run(node, dict(dict.items(self.data)), None)
+    node.done.update(dict.keys(self.data))
+    dict.update(self.data, frames)
+
+  def compute_frame(self, symbol, pending):
+    """
+      Computes the `pending` built-in nodes of one symbol's frame.
+    """
+    if not pending:
+      return
+
+    self.trim()
+    frames = {symbol: dict.__getitem__(self.data, symbol)}
+    bars = fingerprint(frames[symbol]) if self.cache else None
+    reused = {}
+
+    for node in pending:
+      columns = self.cache.get((symbol, node.key, bars)) if self.cached(node) else None
+
+      if columns is not None:
+        node.done.add(symbol)
+        reused.update(columns)
+        continue
+
+      # Reused columns go in before anything that may read them
+      if reused:
+        frames[symbol] = frames[symbol].assign(**reused)
+        reused = {}
+
+      frames = self.run(node, frames, symbol)
+
+      if self.cached(node):
+        self.cache.put((symbol, node.key, bars), {
+          name: frames[symbol][name].to_numpy(copy=True) for name in node.outputs
+        })
+
+    if reused:
+      frames[symbol] = frames[symbol].assign(**reused)
+
+    dict.__setitem__(self.data, symbol, frames[symbol])
+
+  def run_cached(self, node):
+    """
+      Runs `node` over a `Panel` of just the symbols it has no cached
+      columns for, then fills in every symbol's columns.
+    """
+    self.trim()
+    node.done.add(None)
+
+    keys = [(symbol, node.key, bars) for symbol, bars in zip(self.data.symbols, panel_fingerprints(self.data))]
+    found = [self.cache.get(key) for key in keys]
+    missing = [i for i, columns in enumerate(found) if columns is None]
+    present = self.data.present
+
+    # Kept over each symbol's own rows, see `panel_fingerprints`
+    if missing:
+      stale = self.data.select(missing)
+      self.run(node, stale, None)
+
+      for j, i in enumerate(missing):
+        found[i] = {name: stale.columns[name][present[:, i], j] for name in node.outputs}
+        self.cache.put(keys[i], found[i])
+
+    for name in node.outputs:
+      if len(missing) == len(keys):
+        self.data.set_field(name, stale.columns[name])
+        continue
+
+      values = np.full(present.shape, np.nan, dtype=found[0][name].dtype)
+      for i, columns in enumerate(found):
+        values[present[:, i], i] = columns[name]
+
+      self.data.set_field(name, values)
+
+  def cached(self, node):
+    """
+      True when `node`'s columns depend on the bars alone: a built-in
+      indicator reading base fields or the columns of other such nodes.
+      A column from a custom function (or set by hand) can change while
+      the bars do not.
+    """
+    if self.cache is None or node.spec is None:
+      return False
+
+    return all(
+      name in BASE or name in self.producers and self.cached(self.producers[name])
+      for name in node.spec['inputs']
+    )
+
+  def run(self, node, data, symbol):
+    self.trim()
+    node.done.add(symbol)
+    before = column_names(data) if node.spec is None else None
+
+    with self.timer(node.func.__name__):
+      data = node.func(data, *node.args, **node.kwargs)
+
+    if before is not None:
+      node.outputs |= column_names(data) - before
+
+      for name in node.outputs:
+        self.producers.setdefault(name, node)
+
+    return data
+
+  def chain(self, node):
+    """
+      Returns: --> the nodes `node` depends on, then itself
+    """
+    needed = []
+
+    for name in (node.spec['inputs'] if node.spec else ['']):
+      if name in BASE:
+        continue
+
+      if name not in self.producers or self.producers[name].spec is None:
+        # Custom functions may read anything declared before them
+        return self.nodes[:self.nodes.index(node) + 1]
+
+      needed += self.chain(self.producers[name])
+
+    return needed + [node]
+
+  # Window
+
+  def lookback(self, node):
+    """
+      Returns: --> bars behind one row of `node`'s output, None if unbounded
+    """
+    if node.spec is None or node.spec['lookback'] is None:
+      return None
+
+    inputs = []
+
+    for name in node.spec['inputs']:
+      if name in BASE:
+        continue
+
+      if name not in self.producers:
+        return None
+
+      inputs.append(self.lookback(self.producers[name]))
+
+    if None in inputs:
+      return None
+
+    return node.spec['lookback'] + max(inputs, default=1) - 1
+
+  def rows(self):
+    """
+      Returns: --> trailing bars needed for `window` rows of every
+                   column, None for the whole history
+    """
+    if not self.window:
+      return None
+
+    lookbacks = [self.lookback(node) for node in self.nodes]
+
+    if None in lookbacks:
+      return None
+
+    return self.window + max(lookbacks, default=1) - 1
+
+  def trim(self):
+    """
+      Cuts the store to `rows()` before the first computation.
+    """
+    if self.trimmed:
+      return
+
+    self.trimmed = True
+    rows = self.rows()
+
+    if rows is None:
+      return
+
+    if isinstance(self.data, Panel):
+      self.data.trim(rows)
+      return
+
+    for symbol, frame in dict.items(self.data):
+      if len(frame) > rows:
+        dict.__setitem__(self.data, symbol, frame.iloc[-rows:].copy())
+
+  def transient_columns(self):
+    return set().union(*[node.outputs for node in self.nodes if node.transient]) - BASE
+
+
+class LazyFrames(dict):
+  """
+    `{symbol: DataFrame}` whose frames get their declared indicator
+    columns when read.
+  """
+
+  def __init__(self, graph, data):
+    super().__init__(data)
+    self.graph = graph
+
+  def __getitem__(self, symbol):
+    self.graph.compute(symbol)
+    return dict.__getitem__(self, symbol)
+
+  def get(self, symbol, default=None):
+    return self[symbol] if symbol in self else default
+
+  def values(self):
+    return (self[symbol] for symbol in self)
+
+  def items(self):
+    return ((symbol, self[symbol]) for symbol in self)
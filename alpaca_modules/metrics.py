@@ -0,0 +1,182 @@
+from collections import deque
+
+import threading
+import json
+import time
+
+"""
+
+  Per-endpoint instrumentation of the REST client: call counts,
+  latency histograms and percentiles, bytes, status codes, retries
+  and time spent waiting on the rate limiter. Read it in process with
+  `snapshot()`, or export it as Prometheus text or JSON lines.
+
+"""
+
+
+# Histogram bucket upper bounds, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Path segments kept as is; anything else (symbols, ids, timeframes) is a label value
+STATIC = {'v1', 'v2', 'bars', 'last', 'stocks', 'orders', 'positions', 'account', 'clock', 'assets', 'calendar'}
+
+
+def endpoint_name(endpoint):
+  """
+    '/last/stocks/AAPL' --> '/last/stocks/{}', so endpoints group by route.
+  """
+  parts = endpoint.split('?')[0].strip('/').split('/')
+  return '/' + '/'.join(part if part in STATIC else '{}' for part in parts)
+
+def percentile(values, q):
+  if not values:
+    return None
+
+  values = sorted(values)
+  return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class EndpointStats(object):
+
+  def __init__(self, samples):
+    self.calls = 0
+    self.errors = 0
+    self.retries = 0
+    self.bytes_sent = 0
+    self.bytes_received = 0
+    self.latency_sum = 0.0
+    self.waited = 0.0
+    self.statuses = {}
+    self.buckets = [0] * len(BUCKETS)
+    self.recent = deque(maxlen=samples)
+
+  def add(self, status, latency, bytes_sent, bytes_received, retries, waited):
+    self.calls += 1
+    self.errors += 1 if status == 'error' or status >= 400 else 0
+    self.retries += retries
+    self.bytes_sent += bytes_sent
+    self.bytes_received += bytes_received
+    self.latency_sum += latency
+    self.waited += waited
+    self.statuses[status] = self.statuses.get(status, 0) + 1
+    self.recent.append(latency)
+
+    for i, bound in enumerate(BUCKETS):
+      if latency <= bound:
+        self.buckets[i] += 1
+        break
+
+  def summary(self):
+    recent = list(self.recent)
+
+    return {
+      'calls': self.calls,
+      'errors': self.errors,
+      'retries': self.retries,
+      'bytes_sent': self.bytes_sent,
+      'bytes_received': self.bytes_received,
+      'latency_mean': self.latency_sum / self.calls if self.calls else None,
+      'latency_p50': percentile(recent, 0.50),
+      'latency_p95': percentile(recent, 0.95),
+      'latency_p99': percentile(recent, 0.99),
+      'rate_limit_wait': self.waited,
+      'statuses': {str(status): count for status, count in self.statuses.items()},
+    }
+
+
+class Metrics(object):
+
+  def __init__(self, samples=2048):
+    """
+      Args: samples: latencies kept per endpoint for the percentiles
+    """
+    self.samples = samples
+    self.endpoints = {}
+    self.lock = threading.Lock()
+    self.started = time.time()
+
+  def record(self, method, endpoint, status, latency, bytes_sent=0,
+             bytes_received=0, retries=0, waited=0.0):
+    """
+      Args:
+        status:   final HTTP status, or 'error' when no response came back;
+                  'error' and 4xx/5xx count as errors
+        latency:  seconds on the wire, summed over attempts
+        waited:   seconds held by the rate limiter
+    """
+    key = (method.upper(), endpoint_name(endpoint))
+
+    with self.lock:
+      if key not in self.endpoints:
+        self.endpoints[key] = EndpointStats(self.samples)
+
+      self.endpoints[key].add(status, latency, bytes_sent, bytes_received, retries, waited)
+
+  def snapshot(self):
+    """
+      Returns: --> dict of 'METHOD /route' and value (summary dict)
+    """
+    with self.lock:
+      return {'{} {}'.format(*key): stats.summary() for key, stats in self.endpoints.items()}
+
+  def reset(self):
+    with self.lock:
+      self.endpoints = {}
+      self.started = time.time()
+
+  def json_lines(self):
+    now = time.time()
+
+    return '\n'.join(
+      json.dumps(dict(summary, endpoint=name, timestamp=now))
+      for name, summary in self.snapshot().items()
+    )
+
+  def prometheus(self, prefix='steamboat_http'):
+    lines = []
+
+    def metric(name, typ, doc):
+      lines.append(f'# HELP {prefix}_{name} {doc}')
+      lines.append(f'# TYPE {prefix}_{name} {typ}')
+
+    with self.lock:
+      endpoints = [(key, stats, 'method="{}",endpoint="{}"'.format(*key)) for key, stats in self.endpoints.items()]
+
+      metric('requests_total', 'counter', 'Requests by final status.')
+      for key, stats, labels in endpoints:
+        for status, count in stats.statuses.items():
+          lines.append(f'{prefix}_requests_total{{{labels},status="{status}"}} {count}')
+
+      for name, attr, doc in [
+        ('retries_total', 'retries', 'Requests re-sent after a 429 or 5xx.'),
+        ('sent_bytes_total', 'bytes_sent', 'Request body bytes.'),
+        ('received_bytes_total', 'bytes_received', 'Response body bytes.'),
+        ('rate_limit_wait_seconds_total', 'waited', 'Seconds held by the client rate limiter.'),
+      ]:
+        metric(name, 'counter', doc)
+        for key, stats, labels in endpoints:
+          lines.append(f'{prefix}_{name}{{{labels}}} {getattr(stats, attr)}')
+
+      metric('request_duration_seconds', 'histogram', 'Time on the wire per call.')
+      for key, stats, labels in endpoints:
+        total = 0
+        for bound, count in zip(BUCKETS, stats.buckets):
+          total += count
+          lines.append(f'{prefix}_request_duration_seconds_bucket{{{labels},le="{bound}"}} {total}')
+
+        lines.append(f'{prefix}_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.calls}')
+        lines.append(f'{prefix}_request_duration_seconds_sum{{{labels}}} {stats.latency_sum}')
+        lines.append(f'{prefix}_request_duration_seconds_count{{{labels}}} {stats.calls}')
+
+    return '\n'.join(lines) + '\n'
+
+  def export(self, path, fmt='prometheus'):
+    """
+      Writes `prometheus()` or (fmt='json') appends `json_lines()` to `path`.
+    """
+    if fmt == 'json':
+      with open(path, 'a') as file:
+        file.write(self.json_lines() + '\n')
+    else:
+      with open(path, 'w') as file:
+        file.write(self.prometheus())
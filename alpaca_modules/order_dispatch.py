@@ -0,0 +1,186 @@
+from concurrent.futures import ThreadPoolExecutor
+from .rate_limit import backoff
+
+import threading
+import asyncio
+import uuid
+import time
+
+"""
+
+  Sends a batch of orders at once instead of one after another, so the
+  last order of a batch goes out with the first. Every order gets a
+  client order id before it is sent, which makes resending safe: when
+  an answer is lost (dropped connection, timeout, 5xx) the id is looked
+  up first and the order is only sent again if Alpaca never saw it, and
+  a resend Alpaca rejects as a duplicate id resolves to the original.
+  Answers are recorded (and handed to `on_ack`) as they arrive.
+
+"""
+
+
+def client_order_id(prefix='sb'):
+  return '{}-{}'.format(prefix, uuid.uuid4().hex)
+
+def accepted(response):
+  return isinstance(response, dict) and 'id' in response and 'code' not in response
+
+def unknown(response):
+  """
+    True when an order may or may not have reached Alpaca: no answer,
+    or a server error.
+  """
+  return response is None or (isinstance(response, dict) and str(response.get('code', '')).startswith('5'))
+
+def duplicate(response):
+  return isinstance(response, dict) and 'client_order_id' in str(response.get('message', ''))
+
+
+class OrderDispatcher(object):
+
+  def __init__(self, send, workers=8, retries=2, backoff_factor=0.1, on_ack=None, prefix='sb'):
+    """
+      Args:
+        send:           send(apc, order) sends one order through `apc`
+                        with `order['client_order_id']`, returning the
+                        response (or an awaitable of it)
+        workers:        orders in flight at once over the client's pool
+        retries:        resends of an order whose outcome is unknown
+        backoff_factor: seconds multiplier between resends
+        on_ack:         called as on_ack(order, response) as each final
+                        answer arrives, on the thread that got it
+        prefix:         start of generated client order ids
+    """
+    self.send = send
+    self.workers = workers
+    self.retries = retries
+    self.backoff_factor = backoff_factor
+    self.on_ack = on_ack
+    self.prefix = prefix
+
+    self.pool = None
+    self.lock = threading.Lock()
+
+    self.acks = []  # (order, response, seconds) of the last batch
+    self.counts = {'sent': 0, 'accepted': 0, 'rejected': 0, 'lost': 0, 'resent': 0, 'recovered': 0}
+
+  def prepare(self, orders):
+    """
+      Returns: --> copies of `orders`, each with a client order id; the
+                   caller's dicts are left as they are
+    """
+    orders = [dict(order) for order in orders]
+
+    for order in orders:
+      order.setdefault('client_order_id', client_order_id(self.prefix))
+
+    self.acks = []
+    return orders
+
+  # Threads
+
+  def submit(self, apc, orders):
+    """
+      Sends every order at once.
+        Returns: --> one future per order, of its final response
+    """
+    if self.pool is None:
+      self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='orders')
+
+    return [self.pool.submit(self.place, apc, order) for order in self.prepare(orders)]
+
+  def dispatch(self, apc, orders, timeout=None):
+    """
+      Returns: --> each order's final response, once all are in
+    """
+    return [future.result(timeout) for future in self.submit(apc, orders)]
+
+  def place(self, apc, order):
+    start = time.perf_counter()
+    response = self.attempt(apc, order)
+
+    for attempt in range(self.retries):
+      if not unknown(response):
+        break
+
+      time.sleep(backoff(self.backoff_factor, attempt))
+      found = apc.get_order_by_client_id(order['client_order_id'])
+
+      if accepted(found):
+        self.count('recovered')
+        response = found
+        break
+
+      self.count('resent')
+      response = self.attempt(apc, order)
+
+    if duplicate(response):
+      response = apc.get_order_by_client_id(order['client_order_id'])
+
+    return self.ack(order, response, time.perf_counter() - start)
+
+  def attempt(self, apc, order):
+    self.count('sent')
+    return self.send(apc, order)
+
+  # Asyncio
+
+  async def dispatch_async(self, apc, orders):
+    return await asyncio.gather(*[self.place_async(apc, order) for order in self.prepare(orders)])
+
+  async def place_async(self, apc, order):
+    start = time.perf_counter()
+    response = await self.attempt_async(apc, order)
+
+    for attempt in range(self.retries):
+      if not unknown(response):
+        break
+
+      await asyncio.sleep(backoff(self.backoff_factor, attempt))
+      found = await apc.get_order_by_client_id(order['client_order_id'])
+
+      if accepted(found):
+        self.count('recovered')
+        response = found
+        break
+
+      self.count('resent')
+      response = await self.attempt_async(apc, order)
+
+    if duplicate(response):
+      response = await apc.get_order_by_client_id(order['client_order_id'])
+
+    return self.ack(order, response, time.perf_counter() - start)
+
+  async def attempt_async(self, apc, order):
+    self.count('sent')
+    return await self.send(apc, order)
+
+  # Acknowledgements
+
+  def ack(self, order, response, seconds):
+    outcome = 'accepted' if accepted(response) else 'lost' if unknown(response) else 'rejected'
+
+    with self.lock:
+      self.counts[outcome] += 1
+      self.acks.append((order, response, seconds))
+
+    if self.on_ack:
+      self.on_ack(order, response)
+
+    return response
+
+  def count(self, name):
+    with self.lock:
+      self.counts[name] += 1
+
+  def stats(self):
+    with self.lock:
+      seconds = [ack[2] for ack in self.acks]
+
+      return dict(self.counts, batch=len(seconds), batch_seconds=max(seconds) if seconds else None)
+
+  def close(self):
+    if self.pool is not None:
+      self.pool.shutdown()
+      self.pool = None
@@ -0,0 +1,326 @@
+from .bar_cache import time_index
+
+import pandas as pd
+import numpy as np
+
+"""
+
+  `Panel` holds OHLCV for a whole universe as one contiguous
+  (symbol × time × field) array on a shared, aligned time index.
+  It also behaves like the `{symbol: DataFrame}` dict returned by
+  `historical_data`, so `data[symbol]['close']` keeps working.
+
+  The shared index is the union of every symbol's timestamps, so a
+  symbol with fewer bars (halted, illiquid, newly listed) has NaN rows
+  where it has no bar, and the panel is as long as the longest
+  combined history. Indicators run through `per_bar`, which computes
+  each symbol over its own bars only and skips those rows, so the
+  columns match the same indicator on the symbol's own frame.
+
+  A compact panel keeps prices and derived columns as float32 and the
+  volumes apart as uint32 (0 where there is no bar), about half the
+  memory of the default float64 layout.
+
+"""
+
+
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+PRICES = FIELDS[:4]
+VOLUME = np.uint32
+
+
+class Panel(object):
+
+  def __init__(self, symbols, index, array, fields=FIELDS, volume=None):
+    """
+      symbols : list of symbols, one per row of `array`
+      index   : DatetimeIndex shared by every symbol
+      array   : float array of shape (symbols, time, fields), NaN where
+                a symbol has no bar
+      volume  : (symbols, time) uint32 volumes of a compact panel, whose
+                `array` then only holds the price fields
+    """
+    self.symbols = list(symbols)
+    self.rows = {symbol: i for i, symbol in enumerate(self.symbols)}
+    self.index = index
+    self.array = array
+    self.fields = list(fields)
+    self.volume = volume
+
+    self.columns = {}  # Derived (time × symbol) columns, e.g. from indicators
+    self.frames = {}   # Compatibility frames, built on first access
+
+    # Called with the name of a missing column (None: every column)
+    # before it is read, see `IndicatorGraph`
+    self.resolve = None
+
+  @property
+  def compact(self):
+    return self.volume is not None
+
+  @classmethod
+  def from_frames(cls, data, fields=FIELDS, compact=False):
+    """
+      Args: python object of key (symbol) and value (DataFrame of data)
+    """
+    symbols = list(data)
+    times = [data[symbol].index.values for symbol in symbols]
+    index = pd.DatetimeIndex(np.unique(np.concatenate(times)) if times else [], name='time')
+
+    if compact:
+      array = np.full((len(symbols), len(index), len(PRICES)), np.nan, dtype=np.float32)
+      volume = np.zeros((len(symbols), len(index)), dtype=VOLUME)
+
+      for i, symbol in enumerate(symbols):
+        rows = index.searchsorted(data[symbol].index)
+        array[i, rows] = data[symbol][PRICES].to_numpy(dtype=np.float32)
+        volume[i, rows] = to_volume(data[symbol]['volume'].to_numpy())
+
+      return cls(symbols, index, array, PRICES, volume)
+
+    array = np.full((len(symbols), len(index), len(fields)), np.nan)
+
+    for i, symbol in enumerate(symbols):
+      rows = index.searchsorted(data[symbol].index)
+      array[i, rows] = data[symbol][fields].to_numpy(dtype=float)
+
+    return cls(symbols, index, array, fields)
+
+  @classmethod
+  def from_records(cls, symbols, owner, bars, tz=None, compact=False):
+    """
+      Args:
+        symbols : list of symbols
+        owner   : index into `symbols` of each bar
+        bars    : bar record array (see `bar_cache.BAR_DTYPE`)
+        tz      : timezone of the index, naive UTC if None
+        compact : float32 prices and uint32 volumes
+    """
+    present = np.bincount(owner, minlength=len(symbols)) > 0
+    rows = np.cumsum(present)[owner] - 1
+    times = np.unique(bars['t'])
+    cols = np.searchsorted(times, bars['t'])
+    shape = (int(present.sum()), len(times))
+
+    symbols = [symbol for symbol, kept in zip(symbols, present) if kept]
+    keys = 'ohlc' if compact else 'ohlcv'
+
+    array = np.full(shape + (len(keys),), np.nan, dtype=np.float32 if compact else float)
+    array[rows, cols] = np.stack([bars[key] for key in keys], axis=1)
+
+    if not compact:
+      return cls(symbols, time_index(times, tz), array)
+
+    volume = np.zeros(shape, dtype=VOLUME)
+    volume[rows, cols] = to_volume(bars['v'])
+
+    return cls(symbols, time_index(times, tz), array, PRICES, volume)
+
+  def select(self, rows):
+    """
+      Returns: --> a panel of the symbols at `rows`, with their derived
+                   columns, on the same index
+    """
+    panel = Panel(
+      [self.symbols[i] for i in rows], self.index, self.array[rows], self.fields,
+      self.volume[rows] if self.compact else None
+    )
+    panel.columns = {name: values[:, rows] for name, values in self.columns.items()}
+
+    return panel
+
+  # Bulk access
+
+  def field(self, name):
+    """
+      Returns: --> (time × symbol) array of a field or derived column
+    """
+    if name in self.columns:
+      return self.columns[name]
+
+    if name == 'volume' and self.compact:
+      return self.volume.T
+
+    if name not in self.fields and self.resolve:
+      self.resolve(name)
+
+      if name in self.columns:
+        return self.columns[name]
+
+    return self.array[:, :, self.fields.index(name)].T
+
+  def set_field(self, name, values):
+    """
+      Stores a (time × symbol) derived column and mirrors it into any
+      compatibility frame that has already been built.
+    """
+    if self.compact and values.dtype == np.float64:
+      values = values.astype(np.float32)
+
+    self.columns[name] = values
+
+    for symbol, frame in self.frames.items():
+      frame[name] = pd.Series(values[:, self.rows[symbol]], index=self.index)
+
+  def drop_field(self, name):
+    self.columns.pop(name, None)
+
+    for frame in self.frames.values():
+      frame.drop(name, axis=1, inplace=True, errors='ignore')
+
+  def per_bar(self, kernel, names, *args):
+    """
+      Runs a kernel over each symbol's own bars. The rows a symbol has
+      no bar on are moved out of its column first, so rolling windows,
+      shifts and averages span its previous bars rather than the gaps.
+        Args:
+          kernel: f(*columns, *args) of (time × symbol) arrays, returning
+                  one array or a tuple of them
+          names : fields or derived columns passed to `kernel`
+        Returns: --> the kernel's output on the shared index, NaN where
+                     a symbol has no bar
+    """
+    inputs = [self.field(name) for name in names]
+    present = self.present
+
+    if present.all():
+      return kernel(*inputs, *args)
+
+    # Each column's bars first, in time order, then its gaps
+    order = np.argsort(~present, axis=0, kind='stable')[:present.sum(axis=0).max()]
+    outputs = kernel(*[np.take_along_axis(values, order, axis=0) for values in inputs], *args)
+
+    def unpack(packed):
+      values = np.full(present.shape, np.nan, dtype=packed.dtype)
+      np.put_along_axis(values, order, packed, axis=0)
+      values[~present] = np.nan
+      return values
+
+    return tuple(map(unpack, outputs)) if isinstance(outputs, tuple) else unpack(outputs)
+
+  @property
+  def present(self):
+    """
+      Returns: --> (time × symbol) mask of the bars each symbol has
+    """
+    return ~np.isnan(self.field('close'))
+
+  @property
+  def nbytes(self):
+    """
+      Returns: --> bytes held: arrays, derived columns, index and any
+                   compatibility frames
+    """
+    frames = sum(int(frame.memory_usage().sum()) for frame in self.frames.values())
+
+    return (
+      self.array.nbytes + (self.volume.nbytes if self.compact else 0) + self.index.nbytes +
+      sum(values.nbytes for values in self.columns.values()) + frames
+    )
+
+  def release(self):
+    """
+      Frees the compatibility frames; they are rebuilt on access.
+    """
+    self.frames = {}
+
+  def trim(self, rows):
+    """
+      Keeps the last `rows` bars of every symbol, in place: the shared
+      index is cut where the symbol with the sparsest recent bars still
+      has that many.
+    """
+    if rows >= len(self.index):
+      return
+
+    # Bars of each symbol from each row to the end
+    behind = np.cumsum(self.present[::-1], axis=0)[::-1]
+    start = int((behind >= np.minimum(rows, behind[0])).all(axis=1).sum()) - 1
+
+    self.index = self.index[start:]
+    self.array = self.array[:, start:]
+    self.columns = {name: values[start:] for name, values in self.columns.items()}
+    self.frames = {}
+
+    if self.compact:
+      self.volume = self.volume[:, start:]
+
+  # Compatibility with `{symbol: DataFrame}`
+
+  def frame(self, symbol):
+    if self.resolve:
+      self.resolve()
+
+    i = self.rows[symbol]
+    mask = ~np.isnan(self.array[i, :, self.fields.index('close')])
+
+    # One constructor call: inserting columns one by one costs more
+    # than the data
+    columns = dict(zip(self.fields, self.array[i, mask].T))
+
+    if self.compact:
+      columns['volume'] = self.volume[i, mask].astype('int64')
+    elif 'volume' in columns:
+      columns['volume'] = columns['volume'].astype('int64')
+
+    for name, values in self.columns.items():
+      columns[name] = values[mask, i]
+
+    return pd.DataFrame(columns, index=self.index[mask])
+
+  def __getitem__(self, symbol):
+    if symbol not in self.frames:
+      self.frames[symbol] = self.frame(symbol)
+
+    return self.frames[symbol]
+
+  def __setitem__(self, symbol, frame):
+    if symbol not in self.rows:
+      raise KeyError(f'{symbol} is not in the panel')
+
+    self.frames[symbol] = frame
+
+  def __contains__(self, symbol):
+    return symbol in self.rows
+
+  def __iter__(self):
+    return iter(self.symbols)
+
+  def __len__(self):
+    return len(self.symbols)
+
+  def keys(self):
+    return list(self.symbols)
+
+  def items(self):
+    return ((symbol, self[symbol]) for symbol in self.symbols)
+
+  def get(self, symbol, default=None):
+    return self[symbol] if symbol in self else default
+
+
+def column_names(data):
+  """
+    Returns: --> derived columns of a `Panel`, or the columns of a
+                 `{symbol: DataFrame}` store
+  """
+  if isinstance(data, Panel):
+    return set(data.columns)
+
+  return set(next(iter(data.values())).columns) if data else set()
+
+def drop_columns(data, names):
+  if isinstance(data, Panel):
+    for name in names:
+      data.drop_field(name)
+    return
+
+  # The raw frames: reading a `LazyFrames` would compute what is dropped
+  for frame in dict.values(data):
+    frame.drop(list(names), axis=1, inplace=True, errors='ignore')
+
+def to_volume(values):
+  """
+    Volumes as uint32, saturating instead of wrapping past its range.
+  """
+  return np.clip(values, 0, np.iinfo(VOLUME).max).astype(VOLUME)
@@ -0,0 +1,287 @@
+from collections import deque, Counter
+from contextlib import contextmanager
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+import threading
+import cProfile
+import pstats
+import json
+import time
+import sys
+import io
+import os
+
+"""
+
+  Stage timers for the iterate/run pipelines. Each iteration produces
+  one record: seconds per stage (universe, data, indicators, ...) and
+  per indicator, the total and whether it overran its budget. With
+  `profile='cprofile'` or `profile='sample'` the record also carries
+  the top functions of that iteration. With `memory=True` it also has
+  the process RSS after each stage, how much the stage added, and the
+  size of the strategy's data store (`measure`).
+
+"""
+
+
+class Profiler(object):
+
+  def __init__(self, profile=None, keep=100, top=15, interval=0.005,
+               profile_dir=None, log=False, memory=False, measure=None):
+    """
+      Args:
+        profile:      None (timers only), 'cprofile' or 'sample'
+        keep:         records kept in `records`
+        top:          functions listed per profiled iteration
+        interval:     seconds between stack samples in 'sample' mode
+        profile_dir:  also dump each cProfile run there as `.prof`
+        log:          print a one-line summary of every record
+        memory:       record memory per stage
+        measure:      callable returning the bytes of the data store
+    """
+    if profile not in (None, 'cprofile', 'sample'):
+      raise ValueError(f"profile must be None, 'cprofile' or 'sample', not {profile}")
+
+    self.profile = profile
+    self.top = top
+    self.interval = interval
+    self.profile_dir = profile_dir
+    self.log = log
+    self.memory = memory
+    self.measure = measure
+    self.records = deque(maxlen=keep)
+    self.current = None
+    self.count = 0
+
+  @contextmanager
+  def iteration(self, name, budget=None, **extra):
+    """
+      Times everything inside as one record. Nested calls (an iterate
+      inside a run) only time their stages into the outer record.
+    """
+    if self.current is not None:
+      yield self.current
+      return
+
+    self.count += 1
+    record = {'name': name, 'iteration': self.count, 'started': time.time(),
+              'stages': {}, 'indicators': {}, **extra}
+
+    if self.memory:
+      record['memory'] = {}
+    profiler = cProfile.Profile() if self.profile == 'cprofile' else None
+    sampler = Sampler(self.interval) if self.profile == 'sample' else None
+
+    self.current = record
+    start = time.perf_counter()
+
+    try:
+      if profiler:
+        profiler.enable()
+      if sampler:
+        sampler.start()
+
+      yield record
+    finally:
+      if profiler:
+        profiler.disable()
+      if sampler:
+        sampler.stop()
+
+      record['total'] = time.perf_counter() - start
+      record['budget'] = budget
+      record['over_budget'] = budget is not None and record['total'] > budget
+      record['unstaged'] = record['total'] - sum(record['stages'].values())
+
+      if self.memory:
+        record['rss'] = rss()
+        record['peak_rss'] = peak_rss()
+
+      if profiler:
+        record['profile'] = self.top_functions(profiler, name)
+      if sampler:
+        record['profile'] = sampler.top(self.top)
+
+      self.current = None
+      self.records.append(record)
+
+      if self.log or record['over_budget']:
+        print(self.describe(record))
+
+  @contextmanager
+  def stage(self, name):
+    start = time.perf_counter()
+    before = rss() if self.memory else None
+
+    try:
+      yield
+    finally:
+      self.add('stages', name, time.perf_counter() - start)
+
+      if self.memory and self.current is not None:
+        self.add_memory(name, before)
+
+  def add_memory(self, name, before):
+    after = rss()
+    usage = self.current['memory'].setdefault(name, {'delta': 0})
+    usage['rss'] = after
+    usage['delta'] += after - before
+
+    if self.measure:
+      usage['data'] = self.measure()
+
+  @contextmanager
+  def indicator(self, name):
+    start = time.perf_counter()
+
+    try:
+      yield
+    finally:
+      self.add('indicators', name, time.perf_counter() - start)
+
+  def add(self, kind, name, seconds):
+    if self.current is not None:
+      timings = self.current[kind]
+      timings[name] = timings.get(name, 0) + seconds
+
+  def top_functions(self, profiler, name):
+    if self.profile_dir:
+      os.makedirs(self.profile_dir, exist_ok=True)
+      profiler.dump_stats(os.path.join(self.profile_dir, f'{name}-{self.count}.prof'))
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+
+    return [
+      {'function': '{}:{}({})'.format(*func), 'calls': calls, 'own': own, 'cumulative': cumulative}
+      for func, (_, calls, own, cumulative, _) in sorted(
+        stats.stats.items(), key=lambda item: item[1][3], reverse=True
+      )[:self.top]
+    ]
+
+  def describe(self, record):
+    stages = ', '.join('{} {:.3f}s'.format(*item) for item in record['stages'].items())
+    over = ' OVER BUDGET ({}s)'.format(record['budget']) if record['over_budget'] else ''
+    memory = ' rss {:.0f}MB'.format(record['rss'] / 2**20) if 'rss' in record else ''
+
+    return '   [{} #{}] {:.3f}s{}{}: {}'.format(record['name'], record['iteration'], record['total'], over, memory, stages)
+
+  @property
+  def last(self):
+    return self.records[-1] if self.records else None
+
+  def summary(self):
+    """
+      Returns: --> mean seconds per stage and indicator across `records`
+    """
+    totals = {'stages': Counter(), 'indicators': Counter()}
+
+    for record in self.records:
+      for kind in totals:
+        totals[kind].update(record[kind])
+
+    count = max(1, len(self.records))
+
+    return {
+      'iterations': len(self.records),
+      'over_budget': sum(record['over_budget'] for record in self.records),
+      'total': sum(record['total'] for record in self.records) / count,
+      **{kind: {name: seconds / count for name, seconds in timings.items()} for kind, timings in totals.items()},
+      **({'peak_rss': max(record['peak_rss'] for record in self.records)} if self.memory and self.records else {}),
+    }
+
+  def export(self, path):
+    """
+      Appends every kept record to `path` as JSON lines.
+    """
+    with open(path, 'a') as file:
+      for record in self.records:
+        file.write(json.dumps(record, default=str) + '\n')
+
+
+def rss():
+  """
+    Returns: --> resident bytes of the process (the peak where the
+                 current value is not available)
+  """
+  try:
+    with open('/proc/self/statm') as file:
+      return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except (OSError, ValueError, IndexError):
+    return peak_rss()
+
+def peak_rss():
+  if resource is None:
+    return 0
+
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+def data_size(data):
+  """
+    Returns: --> bytes held by a `Panel` or a `{symbol: DataFrame}` store
+  """
+  if data is None:
+    return 0
+
+  if hasattr(data, 'nbytes'):
+    return data.nbytes
+
+  # The raw frames: reading a `LazyFrames` would compute its indicators
+  return sum(int(frame.memory_usage().sum()) for frame in dict.values(data))
+
+
+class Sampler(object):
+  """
+    Samples the calling thread's stack every `interval` seconds from a
+    background thread: cheaper than cProfile on long iterations.
+  """
+
+  def __init__(self, interval=0.005):
+    self.interval = interval
+    self.target = threading.get_ident()
+    self.counts = Counter()
+    self.own = Counter()
+    self.samples = 0
+    self.done = threading.Event()
+    self.thread = threading.Thread(target=self.sample, daemon=True)
+
+  def sample(self):
+    while not self.done.wait(self.interval):
+      frame = sys._current_frames().get(self.target)
+      seen = set()
+      leaf = True
+
+      while frame is not None:
+        code = frame.f_code
+        func = '{}:{}({})'.format(code.co_filename, code.co_firstlineno, code.co_name)
+
+        # Recursion counts a function once per sample
+        if func not in seen:
+          self.counts[func] += 1
+          seen.add(func)
+
+        if leaf:
+          self.own[func] += 1
+          leaf = False
+
+        frame = frame.f_back
+
+      self.samples += 1
+
+  def start(self):
+    self.thread.start()
+
+  def stop(self):
+    self.done.set()
+    self.thread.join()
+
+  def top(self, n):
+    return [
+      {'function': func, 'samples': count, 'own': self.own[func],
+       'share': count / max(1, self.samples)}
+      for func, count in self.counts.most_common(n)
+    ]
@@ -0,0 +1,216 @@
+from email.utils import parsedate_to_datetime
+
+import threading
+import asyncio
+import random
+import time
+
+"""
+
+  Client-side pacing for the alpaca request budget. The budget (200
+  requests per minute) is per account, across market data and trading
+  endpoints, so one token bucket is shared by every call and every
+  client of the same api key: threads and the asyncio client draw from
+  it alike. Priority calls (orders) may use a small reserve of tokens
+  carved out of it that data pulls leave alone, and jump any waiting
+  data pulls.
+
+"""
+
+
+# Requests per minute of the whole account, burst size, and the tokens
+# of it kept for orders
+DEFAULT_LIMITS = {'per_minute': 190, 'burst': 20, 'reserve': 3}
+
+# api key --> RateLimiter
+limiters = {}
+limiters_lock = threading.Lock()
+
+
+class TokenBucket(object):
+
+  def __init__(self, per_minute, burst, reserve=0):
+    """
+      Args:
+        per_minute: sustained requests per minute
+        burst:      tokens that can be spent at once
+        reserve:    tokens only priority calls may spend
+    """
+    self.rate = per_minute / 60
+    self.burst = burst
+    self.reserve = reserve
+    self.tokens = burst
+    self.stamp = time.monotonic()
+    self.paused_until = 0
+    self.urgent = 0
+    self.lock = threading.Lock()
+
+    self.acquired = 0
+    self.waited = 0.0
+    self.throttled = 0
+
+  def refill(self, now):
+    self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+    self.stamp = now
+
+  def try_acquire(self, priority=False):
+    """
+      Returns: --> 0 when a token was taken, otherwise seconds to wait
+                   before trying again
+    """
+    with self.lock:
+      now = time.monotonic()
+      self.refill(now)
+
+      if now < self.paused_until:
+        return self.paused_until - now
+
+      # Data pulls leave the reserve, and a token per waiting order
+      need = 1 if priority else 1 + self.reserve + self.urgent
+
+      if self.tokens >= need:
+        self.tokens -= 1
+        self.acquired += 1
+        return 0
+
+      return (need - self.tokens) / self.rate
+
+  def acquire(self, priority=False):
+    self.mark(priority, 1)
+
+    try:
+      while True:
+        wait = self.try_acquire(priority)
+
+        if not wait:
+          return
+
+        self.waited += wait
+        time.sleep(wait)
+    finally:
+      self.mark(priority, -1)
+
+  async def acquire_async(self, priority=False):
+    self.mark(priority, 1)
+
+    try:
+      while True:
+        wait = self.try_acquire(priority)
+
+        if not wait:
+          return
+
+        self.waited += wait
+        await asyncio.sleep(wait)
+    finally:
+      self.mark(priority, -1)
+
+  def mark(self, priority, change):
+    if priority:
+      with self.lock:
+        self.urgent += change
+
+  def pause(self, seconds):
+    """
+      Holds every caller for `seconds` (a 429 or an exhausted budget).
+    """
+    with self.lock:
+      self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+      self.tokens = min(self.tokens, 0)
+
+  def observe(self, status, headers):
+    """
+      Follows the server's view of the budget: `X-RateLimit-Remaining`
+      caps the local tokens and a spent budget waits for
+      `X-RateLimit-Reset`. A 429 waits for `Retry-After`.
+      Returns: --> seconds the server asked to wait (None if it did not)
+    """
+    remaining = to_float(headers.get('X-RateLimit-Remaining'))
+    reset = to_float(headers.get('X-RateLimit-Reset'))
+    wait = None
+
+    if remaining is not None:
+      with self.lock:
+        self.tokens = min(self.tokens, remaining)
+
+      if remaining <= 0 and reset is not None:
+        wait = max(0, reset - time.time())
+
+    if status == 429:
+      self.throttled += 1
+      wait = retry_after(headers) if retry_after(headers) is not None else wait
+
+    if wait:
+      self.pause(wait)
+
+    return wait
+
+  def stats(self):
+    return {
+      'acquired': self.acquired,
+      'waited_s': self.waited,
+      'throttled': self.throttled,
+      'tokens': self.tokens,
+    }
+
+
+class RateLimiter(object):
+
+  def __init__(self, limits=None):
+    """
+      Args: overrides of `DEFAULT_LIMITS`
+    """
+    self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+    self.account = TokenBucket(**self.limits)
+
+  def bucket(self):
+    return self.account
+
+  def stats(self):
+    return {'account': self.account.stats()}
+
+
+def shared_limiter(api_key, limits=None):
+  """
+    Returns: --> the `RateLimiter` of the api key, created on first use.
+                 Raises ValueError when `limits` differ from those it was
+                 created with.
+  """
+  with limiters_lock:
+    if api_key not in limiters:
+      limiters[api_key] = RateLimiter(limits)
+    elif limits and {**DEFAULT_LIMITS, **limits} != limiters[api_key].limits:
+      raise ValueError(
+        f'The rate limiter of this api key already uses {limiters[api_key].limits}, not {limits}'
+      )
+
+    return limiters[api_key]
+
+def to_float(value):
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return None
+
+def retry_after(headers):
+  """
+    Returns: --> seconds from a `Retry-After` header (delay or HTTP date)
+  """
+  value = headers.get('Retry-After')
+
+  if value is None:
+    return None
+
+  if to_float(value) is not None:
+    return max(0, to_float(value))
+
+  try:
+    return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+  except (TypeError, ValueError):
+    return None
+
+def backoff(factor, attempt):
+  """
+    Exponential backoff with full jitter around the nominal delay.
+  """
+  return factor * 2 ** attempt * random.uniform(0.5, 1.5)
@@ -0,0 +1,995 @@
+from datetime import datetime
+from .alpaca_api import Alpaca
+from .bar_cache import BarCache, BAR_DTYPE, to_records
+from .bar_builder import PERIODS, NEW_YORK
+
+import numpy as np
+import pandas as pd
+import threading
+import uuid
+import json
+import time
+import os
+
+"""
+
+  An in-process broker for dry runs of the live loop. `SimAlpaca`
+  answers the same REST calls as `Alpaca` (clock, account, positions,
+  orders, bars, last trade) from cached historical bars replayed on a
+  sped-up clock, and `SimStreaming` pushes the replayed trades and
+  minute bars like `AlpacaStreaming`.
+
+  Each bar is replayed as four trades (open, low/high, high/low, close)
+  spread over its period, during regular hours only. Orders fill in
+  full against those trades: market and stop orders at the next trade
+  past the trigger with `slippage`, limit orders at the first trade at
+  or through the limit. Bracket legs are one-cancels-other and day
+  orders expire at the close.
+
+"""
+
+
+OPEN_STATUSES = ('new', 'accepted', 'held')
+ORDER_TYPES = ('market', 'limit', 'stop', 'stop_limit', 'trailing_stop')
+
+
+def to_epoch(value):
+  """
+    Args: epoch seconds, ISO string or datetime (naive means UTC)
+  """
+  if value is None or isinstance(value, (int, float, np.integer, np.floating)):
+    return value
+
+  stamp = pd.Timestamp(value)
+  return (stamp if stamp.tzinfo else stamp.tz_localize('UTC')).timestamp()
+
+def to_iso(epoch):
+  return None if epoch is None else datetime.fromtimestamp(epoch, NEW_YORK).isoformat()
+
+def to_str(value):
+  return None if value is None else str(round(float(value), 4))
+
+def to_number(value):
+  return None if value in (None, '') else float(value)
+
+def cached_bars(cache_dir, tf):
+  """
+    Returns: --> python object of key (symbol) and value (record array),
+                 every series of timeframe `tf` in the bar cache
+  """
+  cache = BarCache(cache_dir)
+  folder = os.path.join(cache_dir, tf)
+  names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+  return {
+    name[:-len('.bars')]: np.array(cache.read(name[:-len('.bars')], tf))
+    for name in names if name.endswith('.bars')
+  }
+
+def error(status, code, message):
+  return status, {'code': code, 'message': message}
+
+
+class Replay(object):
+  """
+    The replayed market: bars per symbol, the sessions they cover and a
+    clock running `speed` times faster than the wall clock. The clock
+    starts on its first read; closed-market time is skipped by `sleep`.
+  """
+
+  def __init__(self, bars, tf='1Min', start=None, end=None, speed=1000):
+    if tf not in PERIODS or tf == '1D':
+      raise ValueError(f'Replays intraday bars, use one of {[p for p in PERIODS if p != "1D"]}')
+
+    self.tf = tf
+    self.period = PERIODS[tf]
+    self.speed = speed
+    self.bars = {}
+
+    for symbol, data in bars.items():
+      data = np.sort(np.asarray(data, dtype=BAR_DTYPE), order='t') if isinstance(data, np.ndarray) else to_records(data)
+
+      if len(data):
+        self.bars[symbol] = data
+
+    if not self.bars:
+      raise ValueError('Nothing to replay: no bars given')
+
+    self.opens, self.closes = self.sessions(np.concatenate([bars['t'] for bars in self.bars.values()]))
+    self.start = float(to_epoch(start) if start is not None else self.opens[-1])
+    self.end = float(to_epoch(end) if end is not None else self.closes[-1])
+
+    self.t0 = None
+    self.offset = 0.0
+    self.lock = threading.Lock()
+    self.tapes = {}
+    self.aggregates = {}
+
+  def sessions(self, times):
+    """
+      Returns: --> open and close (epoch seconds) of the regular session
+                   of every New York day with bars in it
+    """
+    times = np.unique(times)
+    days = pd.to_datetime(times, unit='s', utc=True).tz_convert(NEW_YORK).normalize().unique()
+    opens = np.array([day.timestamp() for day in days + pd.Timedelta(hours=9, minutes=30)])
+    closes = np.array([day.timestamp() for day in days + pd.Timedelta(hours=16)])
+
+    # Days with pre/post market bars only have no session
+    traded = np.searchsorted(times, opens, 'left') < np.searchsorted(times, closes, 'left')
+
+    return opens[traded], closes[traded]
+
+  # Clock
+
+  def now(self):
+    with self.lock:
+      if self.t0 is None:
+        self.t0 = time.monotonic()
+
+      return min(self.end, self.start + self.offset + (time.monotonic() - self.t0) * self.speed)
+
+  @property
+  def finished(self):
+    return self.now() >= self.end
+
+  def sleep(self, seconds):
+    """
+      Sleeps `seconds` of replayed time. Time while the market is
+      closed has nothing to replay and is skipped at once.
+    """
+    until = min(self.end, self.now() + max(0, seconds))
+
+    while True:
+      now = self.now()
+
+      if now >= until:
+        return
+
+      if self.is_open(now):
+        time.sleep((min(until, self.next_close(now)) - now) / self.speed)
+        continue
+
+      upcoming = self.next_open(now)
+      with self.lock:
+        self.offset += min(until, upcoming if upcoming is not None else self.end) - now
+
+  def session(self, now):
+    """
+      Returns: --> index of the last session opened at `now`, or -1
+    """
+    return int(np.searchsorted(self.opens, now, 'right')) - 1
+
+  def is_open(self, now):
+    i = self.session(now)
+    return bool(i >= 0 and now < self.closes[i])
+
+  def next_open(self, now):
+    i = self.session(now) + 1
+    return self.opens[i] if i < len(self.opens) else None
+
+  def next_close(self, now):
+    """
+      Returns: --> close of the session running at `now`, or of the next one
+    """
+    i = self.session(now)
+
+    if i >= 0 and now < self.closes[i]:
+      return self.closes[i]
+
+    return self.closes[i + 1] if i + 1 < len(self.closes) else None
+
+  def clock(self, now):
+    upcoming = self.next_open(now)
+    close = self.next_close(now)
+
+    return {
+      'timestamp': to_iso(now),
+      'is_open': self.is_open(now),
+      # Past the last session both point at the end of the replay
+      'next_open': to_iso(upcoming if upcoming is not None else self.end),
+      'next_close': to_iso(close if close is not None else self.end),
+    }
+
+  # Trades
+
+  def in_session(self, times):
+    i = np.searchsorted(self.opens, times, 'right') - 1
+    return (i >= 0) & (times < self.closes[np.maximum(i, 0)])
+
+  def tape(self, symbol):
+    """
+      Returns: --> times, prices and sizes of the symbol's replayed trades
+    """
+    if symbol not in self.tapes:
+      bars = self.bars[symbol]
+      up = bars['c'] >= bars['o']
+      quarter = bars['v'] // 4
+
+      times = (bars['t'][:, None] + np.arange(4) * (self.period // 4)).ravel()
+      prices = np.stack([
+        bars['o'], np.where(up, bars['l'], bars['h']), np.where(up, bars['h'], bars['l']), bars['c'],
+      ], axis=1).ravel()
+      sizes = np.stack([quarter, quarter, quarter, bars['v'] - 3 * quarter], axis=1).ravel()
+
+      keep = self.in_session(times)
+      self.tapes[symbol] = (times[keep], prices[keep], sizes[keep])
+
+    return self.tapes[symbol]
+
+  def trades(self, symbol, since, until):
+    """
+      Returns: --> slice bounds of the trades in (since, until]
+    """
+    times = self.tape(symbol)[0]
+    return int(np.searchsorted(times, since, 'right')), int(np.searchsorted(times, until, 'right'))
+
+  def price(self, symbol, now):
+    """
+      Returns: --> last replayed trade at `now`, else the last closed
+                   bar's close, else the first open
+    """
+    times, prices, _ = self.tape(symbol)
+    i = int(np.searchsorted(times, now, 'right'))
+
+    if i:
+      return float(prices[i - 1])
+
+    bars = self.bars[symbol]
+    closed = int(np.searchsorted(bars['t'], now - self.period, 'right'))
+
+    return float(bars['c'][closed - 1] if closed else bars['o'][0])
+
+  # Bars
+
+  def aggregate(self, symbol, tf):
+    """
+      Returns: --> the replayed bars folded into `tf` bars, and the index
+                   of each one's first replayed bar
+    """
+    if (symbol, tf) not in self.aggregates:
+      bars = self.bars[symbol]
+
+      if tf == '1D':
+        days = pd.to_datetime(bars['t'], unit='s', utc=True).tz_convert(NEW_YORK).normalize()
+        starts = np.array([day.timestamp() for day in days], dtype='i8')
+      else:
+        starts = bars['t'] - bars['t'] % PERIODS[tf]
+
+      first = np.flatnonzero(np.r_[True, np.diff(starts) != 0])
+      last = np.r_[first[1:] - 1, len(bars) - 1]
+
+      folded = np.empty(len(first), dtype=BAR_DTYPE)
+      folded['t'] = starts[first]
+      folded['o'] = bars['o'][first]
+      folded['h'] = np.maximum.reduceat(bars['h'], first)
+      folded['l'] = np.minimum.reduceat(bars['l'], first)
+      folded['c'] = bars['c'][last]
+      folded['v'] = np.add.reduceat(bars['v'], first)
+
+      self.aggregates[(symbol, tf)] = (folded, first)
+
+    return self.aggregates[(symbol, tf)]
+
+  def closed_bars(self, symbol, tf, now):
+    """
+      Returns: --> `tf` bars made of the bars closed at `now`; the last
+                   one is partial while its period runs
+    """
+    bars = self.bars[symbol]
+    closed = int(np.searchsorted(bars['t'], now - self.period, 'right'))
+
+    if tf == self.tf or closed == 0:
+      return bars[:closed]
+
+    if PERIODS[tf] < self.period:
+      raise ValueError(f'Cannot serve {tf} bars from a {self.tf} replay')
+
+    folded, first = self.aggregate(symbol, tf)
+    k = int(np.searchsorted(first, closed - 1, 'right')) - 1
+    part = bars[first[k]:closed]
+
+    current = np.empty(1, dtype=BAR_DTYPE)
+    current[0] = (folded['t'][k], part['o'][0], part['h'].max(), part['l'].min(), part['c'][-1], part['v'].sum())
+
+    return np.concatenate([folded[:k], current])
+
+  def bars_response(self, symbols, tf, params, now):
+    """
+      Returns: --> `/bars` response for `symbols` as seen at `now`
+    """
+    limit = int(params.get('limit') or 100)
+    bounds = {name: to_epoch(params.get(name) or None) for name in ('start', 'end', 'after', 'until')}
+    result = {}
+
+    for symbol in symbols:
+      if symbol not in self.bars:
+        continue
+
+      bars = self.closed_bars(symbol, tf, now)
+      lo, hi = 0, len(bars)
+
+      if bounds['start'] is not None:
+        lo = max(lo, int(np.searchsorted(bars['t'], bounds['start'], 'left')))
+      if bounds['after'] is not None:
+        lo = max(lo, int(np.searchsorted(bars['t'], bounds['after'], 'right')))
+      if bounds['end'] is not None:
+        hi = min(hi, int(np.searchsorted(bars['t'], bounds['end'], 'right')))
+      if bounds['until'] is not None:
+        hi = min(hi, int(np.searchsorted(bars['t'], bounds['until'], 'left')))
+
+      rows = bars[max(lo, hi - limit):hi].tolist()
+      result[symbol] = [dict(zip('tohlcv', row)) for row in rows]
+
+    return result
+
+  # Stream
+
+  def events(self, streams, since, until):
+    """
+      Returns: --> (stream, data) of every `T.` trade and `AM.` bar of
+                   `streams` in (since, until], in time order
+    """
+    events = []
+
+    for stream in streams:
+      kind, symbol = stream.split('.', 1)
+
+      if symbol not in self.bars:
+        continue
+
+      if kind == 'T':
+        times, prices, sizes = self.tape(symbol)
+        lo, hi = self.trades(symbol, since, until)
+
+        for t, p, s in zip(times[lo:hi].tolist(), prices[lo:hi].tolist(), sizes[lo:hi].tolist()):
+          events.append((t, stream, {'ev': 'T', 'T': symbol, 'p': p, 's': s, 't': int(t * 1e9)}))
+
+      elif kind == 'AM':
+        bars = self.bars[symbol]
+        lo = int(np.searchsorted(bars['t'], since - self.period, 'right'))
+        hi = int(np.searchsorted(bars['t'], until - self.period, 'right'))
+
+        for t, o, h, l, c, v in bars[lo:hi].tolist():
+          events.append((t + self.period, stream, {
+            'ev': 'AM', 'T': symbol, 'o': o, 'h': h, 'l': l, 'c': c, 'v': v,
+            's': t * 1000, 'e': (t + self.period) * 1000,
+          }))
+
+    events.sort(key=lambda event: event[0])
+
+    return [(stream, data) for _, stream, data in events]
+
+
+class SimAlpaca(Alpaca):
+
+  def __init__(self, api_key='sim', secret_key='sim', bars=None, cache_dir=None,
+               tf='1Min', start=None, end=None, speed=1000, cash=100000,
+               slippage=0.0005, log=False, metrics=None):
+
+    """
+      bars      : python object of key (symbol) and value (`/bars` dicts
+                  or bar cache records) to replay; read from `cache_dir`
+                  when None
+      cache_dir : bar cache folder whose `tf` series are replayed
+      tf        : timeframe of the replayed bars (intraday)
+      start/end : replay window, epoch or ISO; defaults to the last
+                  session in the data
+      speed     : replayed seconds per wall clock second
+      cash      : starting cash (no margin, no shorting)
+      slippage  : fraction added to market and stop fills, against us
+    """
+
+    super().__init__(api_key, secret_key, log=log, rate_limits=False, metrics=metrics)
+
+    if bars is None:
+      if not cache_dir:
+        raise ValueError('SimAlpaca replays `bars` or the bar cache in `cache_dir`')
+
+      bars = cached_bars(cache_dir, tf)
+
+    self.replay = Replay(bars, tf, start, end, speed)
+    self.cash = float(cash)
+    self.slippage = slippage
+    self.orders = {}
+    self.holdings = {}
+    self.lock = threading.RLock()
+
+  def now(self):
+    return self.replay.now()
+
+  def sleep(self, seconds):
+    self.replay.sleep(seconds)
+
+  @property
+  def finished(self):
+    return self.replay.finished
+
+  def streaming(self, interval=0.01):
+    return SimStreaming(self.replay, interval)
+
+  def req(self, typ, endpoint, url='base_url', params=None, data=None):
+    start = time.perf_counter()
+    typ, params = typ.lower(), params or {}
+    status = 'error'
+
+    try:
+      now = self.replay.now()
+
+      if url == 'data_url':
+        status, body = self.data_route(endpoint, params, now)
+      else:
+        with self.lock:
+          self.advance(now)
+          status, body = self.route(typ, endpoint, params, json.loads(data) if data else {}, now)
+
+      if self.log:
+        print('=> {} {} to {}: {}'.format(to_iso(now), typ.upper(), endpoint, str(body)[:90]))
+
+      if status != 200:
+        print('    Error code: ', status)
+        print('    Error message: ', body)
+
+      return body
+    finally:
+      self.metrics.record(
+        typ, endpoint, status, time.perf_counter() - start, bytes_sent=len(data.encode()) if data else 0
+      )
+
+  def data_route(self, endpoint, params, now):
+    parts = endpoint.strip('/').split('/')
+
+    if parts[0] == 'bars' and len(parts) == 2:
+      symbols = [symbol for symbol in params.get('symbols', '').split(',') if symbol]
+      return 200, self.replay.bars_response(symbols, parts[1], params, now)
+
+    if parts[:2] == ['last', 'stocks'] and len(parts) == 3:
+      if parts[2] not in self.replay.bars:
+        return error(404, 40410000, 'symbol not found')
+
+      return 200, {'status': 'success', 'symbol': parts[2], 'last': {
+        'price': self.replay.price(parts[2], now), 'size': 100, 'exchange': 0, 'timestamp': int(now * 1e9),
+      }}
+
+    return error(404, 40410000, 'endpoint not found')
+
+  def route(self, typ, endpoint, params, data, now):
+    parts = endpoint.strip('/').split('/')
+    resource, ident = parts[0], parts[1] if len(parts) > 1 else None
+
+    if (typ, resource) == ('get', 'clock'):
+      return 200, self.replay.clock(now)
+
+    if (typ, resource) == ('get', 'account'):
+      return 200, self.account(now)
+
+    if resource == 'positions' and typ == 'get':
+      return self.positions(now, ident)
+
+    if resource == 'positions' and typ == 'delete':
+      return self.liquidate(now, ident, params)
+
+    if (typ, resource) == ('get', 'orders:by_client_order_id'):
+      return self.find_client(params.get('client_order_id'))
+
+    if resource == 'orders' and typ == 'get':
+      return self.find(ident) if ident else (200, self.list_orders(params.get('status', 'open')))
+
+    if resource == 'orders' and typ == 'post':
+      return self.submit(data, now)
+
+    if resource == 'orders' and typ == 'delete':
+      return self.cancel(ident, now)
+
+    return error(404, 40410000, f'{typ.upper()} {endpoint} is not simulated')
+
+  # Account
+
+  def account(self, now):
+    equity = self.cash + sum(qty * self.replay.price(symbol, now) for symbol, (qty, _) in self.holdings.items())
+
+    return {
+      'id': 'sim',
+      'account_number': 'SIM',
+      'status': 'ACTIVE',
+      'currency': 'USD',
+      'cash': to_str(self.cash),
+      'buying_power': to_str(self.buying_power(now)),
+      'equity': to_str(equity),
+      'portfolio_value': to_str(equity),
+      'long_market_value': to_str(equity - self.cash),
+      'pattern_day_trader': False,
+      'trading_blocked': False,
+    }
+
+  def buying_power(self, now):
+    """
+      Cash less what the open buy orders would cost.
+    """
+    reserved = sum(
+      order['qty'] * (order['limit'] or order['stop'] or self.replay.price(order['symbol'], now))
+      for order in self.orders.values()
+      if order['side'] == 'buy' and order['status'] in OPEN_STATUSES
+    )
+
+    return self.cash - reserved
+
+  def held(self, symbol):
+    """
+      Returns: --> shares of `symbol` held for open sell orders; bracket
+                   legs hold their shares once
+    """
+    parents = set()
+    held = 0
+
+    for order in self.orders.values():
+      if order['symbol'] != symbol or order['side'] != 'sell' or order['status'] not in ('new', 'accepted'):
+        continue
+
+      if order['parent']:
+        if order['parent'] in parents:
+          continue
+        parents.add(order['parent'])
+
+      held += order['qty']
+
+    return held
+
+  def positions(self, now, symbol=None):
+    if symbol:
+      if symbol not in self.holdings:
+        return error(404, 40410000, 'position does not exist')
+
+      return 200, self.position(symbol, now)
+
+    return 200, [self.position(symbol, now) for symbol in self.holdings]
+
+  def position(self, symbol, now):
+    qty, cost = self.holdings[symbol]
+    price = self.replay.price(symbol, now)
+
+    return {
+      'asset_class': 'us_equity',
+      'symbol': symbol,
+      'exchange': 'SIM',
+      'side': 'long',
+      'qty': str(qty),
+      'avg_entry_price': to_str(cost / qty),
+      'cost_basis': to_str(cost),
+      'current_price': to_str(price),
+      'market_value': to_str(qty * price),
+      'unrealized_pl': to_str(qty * price - cost),
+      'unrealized_plpc': to_str((qty * price - cost) / cost),
+    }
+
+  def liquidate(self, now, symbol, params):
+    """
+      Market sells every position (or `qty` of `symbol`), cancelling
+      open orders first when asked to.
+    """
+    if str(params.get('cancel_orders')).lower() == 'true':
+      for order in list(self.orders.values()):
+        if order['status'] in OPEN_STATUSES and symbol in (None, order['symbol']):
+          self.close(order, now, 'canceled')
+
+    if symbol:
+      if symbol not in self.holdings:
+        return error(404, 40410000, 'position does not exist')
+
+      qty = params.get('qty') or self.holdings[symbol][0]
+      return self.submit({'symbol': symbol, 'qty': qty, 'side': 'sell', 'type': 'market', 'time_in_force': 'day'}, now)
+
+    results = []
+    for held in list(self.holdings):
+      status, body = self.submit({
+        'symbol': held, 'qty': self.holdings[held][0], 'side': 'sell', 'type': 'market', 'time_in_force': 'day',
+      }, now)
+      results.append({'symbol': held, 'status': status, 'body': body})
+
+    return 200, results
+
+  # Orders
+
+  def submit(self, data, now):
+    symbol, side = data.get('symbol'), data.get('side')
+    typ, tif = data.get('type', 'market'), data.get('time_in_force', 'day')
+
+    try:
+      qty = int(float(data.get('qty')))
+      limit, stop = to_number(data.get('limit_price')), to_number(data.get('stop_price'))
+      trail_price, trail_percent = to_number(data.get('trail_price')), to_number(data.get('trail_percent'))
+    except (TypeError, ValueError):
+      return error(422, 40010001, 'qty and prices must be numbers')
+
+    if symbol not in self.replay.bars:
+      return error(422, 40010001, f'asset {symbol} not found')
+
+    if data.get('client_order_id') and self.by_client_id(data['client_order_id']):
+      return error(422, 40010001, 'client_order_id must be unique')
+
+    if qty <= 0 or side not in ('buy', 'sell') or typ not in ORDER_TYPES:
+      return error(422, 40010001, 'invalid qty, side or type')
+
+    if (typ in ('limit', 'stop_limit') and limit is None) or (typ in ('stop', 'stop_limit') and stop is None) \
+       or (typ == 'trailing_stop' and trail_price is None and trail_percent is None):
+      return error(422, 40010001, f'missing prices for a {typ} order')
+
+    bracket = data.get('order_class') == 'bracket'
+    price = self.replay.price(symbol, now)
+
+    if bracket and (side != 'buy' or typ not in ('market', 'limit')):
+      return error(422, 40010001, 'bracket orders are simulated for market and limit buys only')
+
+    if side == 'buy' and qty * (limit or stop or price) > self.buying_power(now):
+      return error(403, 40310000, 'insufficient buying power')
+
+    if side == 'sell':
+      available = self.holdings.get(symbol, (0, 0))[0] - self.held(symbol)
+
+      if qty > available:
+        return error(403, 40310000, f'insufficient qty available for order (requested: {qty}, available: {available})')
+
+    order = self.new_order(
+      symbol, side, typ, qty, tif, now, limit=limit, stop=stop, trail_price=trail_price,
+      trail_percent=trail_percent, hwm=price, client_order_id=data.get('client_order_id'),
+    )
+
+    if bracket:
+      take_profit, stop_loss = data.get('take_profit') or {}, data.get('stop_loss') or {}
+      order['cls'] = 'bracket'
+      order['legs'] = [
+        self.new_order(symbol, 'sell', 'limit', qty, tif, now, status='held', parent=order['id'],
+                       limit=to_number(take_profit.get('limit_price'))),
+        self.new_order(symbol, 'sell', 'stop_limit' if stop_loss.get('limit_price') else 'stop', qty, tif, now,
+                       status='held', parent=order['id'], stop=to_number(stop_loss.get('stop_price')),
+                       limit=to_number(stop_loss.get('limit_price'))),
+      ]
+
+    return 200, self.render(order, nested=True)
+
+  def new_order(self, symbol, side, typ, qty, tif, now, status=None, parent=None, **prices):
+    order = dict({
+      'limit': None, 'stop': None, 'trail_price': None, 'trail_percent': None, 'hwm': None,
+      'client_order_id': None,
+    }, **prices)
+
+    order.update(
+      id=str(uuid.uuid4()), symbol=symbol, side=side, type=typ, qty=qty, tif=tif,
+      status=status or ('new' if self.replay.is_open(now) else 'accepted'),
+      submitted=now, cursor=now, closed=None, filled_price=None, filled_qty=0,
+      expires=self.replay.next_close(now) if tif == 'day' else None,
+      parent=parent, legs=[], cls='bracket' if parent else '',
+    )
+    order['client_order_id'] = order['client_order_id'] or order['id']
+    self.orders[order['id']] = order
+
+    return order
+
+  def find(self, ident):
+    if ident not in self.orders:
+      return error(404, 40410000, 'order not found')
+
+    return 200, self.render(self.orders[ident], nested=True)
+
+  def find_client(self, client_order_id):
+    order = self.by_client_id(client_order_id)
+
+    if order is None:
+      return error(404, 40410000, 'order not found')
+
+    return 200, self.render(order, nested=True)
+
+  def by_client_id(self, client_order_id):
+    return next((order for order in self.orders.values() if order['client_order_id'] == client_order_id), None)
+
+  def list_orders(self, status='open'):
+    if status == 'open':
+      statuses = OPEN_STATUSES
+    elif status == 'closed':
+      statuses = ('filled', 'canceled', 'expired', 'rejected')
+    else:
+      statuses = None
+
+    # Newest first, legs listed on their own like `nested=false`
+    return [
+      self.render(order) for order in reversed(list(self.orders.values()))
+      if statuses is None or order['status'] in statuses
+    ]
+
+  def cancel(self, ident, now):
+    if ident is None:
+      cancelled = [order for order in list(self.orders.values()) if order['status'] in OPEN_STATUSES]
+
+      for order in cancelled:
+        self.close(order, now, 'canceled')
+
+      return 200, [{'id': order['id'], 'status': 200} for order in cancelled]
+
+    if ident not in self.orders:
+      return error(404, 40410000, 'order not found')
+
+    if self.orders[ident]['status'] not in OPEN_STATUSES:
+      return error(422, 42210000, 'order is not cancelable')
+
+    self.close(self.orders[ident], now, 'canceled')
+    return 200, {}
+
+  def close(self, order, when, status):
+    order['status'] = status
+    order['closed'] = when
+
+    for leg in order['legs']:
+      if leg['status'] in OPEN_STATUSES:
+        self.close(leg, when, status)
+
+  def render(self, order, nested=False):
+    filled = order['status'] == 'filled'
+
+    return {
+      'id': order['id'],
+      'client_order_id': order['client_order_id'],
+      'created_at': to_iso(order['submitted']),
+      'submitted_at': to_iso(order['submitted']),
+      'filled_at': to_iso(order['closed']) if filled else None,
+      'canceled_at': to_iso(order['closed']) if order['status'] == 'canceled' else None,
+      'expired_at': to_iso(order['closed']) if order['status'] == 'expired' else None,
+      'asset_class': 'us_equity',
+      'symbol': order['symbol'],
+      'qty': str(order['qty']),
+      'filled_qty': str(order['filled_qty']),
+      'filled_avg_price': to_str(order['filled_price']),
+      'order_class': order['cls'],
+      'order_type': order['type'],
+      'type': order['type'],
+      'side': order['side'],
+      'time_in_force': order['tif'],
+      'limit_price': to_str(order['limit']),
+      'stop_price': to_str(order['stop']),
+      'trail_price': to_str(order['trail_price']),
+      'trail_percent': to_str(order['trail_percent']),
+      'hwm': to_str(order['hwm']) if order['type'] == 'trailing_stop' else None,
+      'status': order['status'],
+      'extended_hours': False,
+      'legs': [self.render(leg) for leg in order['legs']] if nested and order['legs'] else None,
+    }
+
+  # Matching
+
+  def advance(self, now):
+    """
+      Replays every open order against the trades up to `now`, one
+      event (fill or expiry) at a time in time order, so fills see the
+      cash and positions left by earlier ones.
+    """
+    while True:
+      first = None
+
+      for order in list(self.orders.values()):
+        if order['status'] not in ('new', 'accepted'):
+          continue
+
+        event = self.trigger(order, now)
+
+        if event and (first is None or event[0] < first[1][0]):
+          first = (order, event)
+
+      if first is None:
+        break
+
+      order, (when, price) = first
+
+      if price is None:
+        self.close(order, when, 'expired')
+      else:
+        self.fill(order, when, price)
+
+    # Nothing else triggers before `now`: carry the trailing marks over
+    for order in self.orders.values():
+      if order['status'] in ('new', 'accepted'):
+        self.settle(order, now)
+
+  def window(self, order, now):
+    times, prices, _ = self.replay.tape(order['symbol'])
+    until = min(now, order['expires']) if order['expires'] is not None else now
+    lo, hi = self.replay.trades(order['symbol'], order['cursor'], until)
+
+    return times[lo:hi], prices[lo:hi]
+
+  def trigger(self, order, now):
+    """
+      Returns: --> (time, fill price) of the first trade that fills the
+                   order, (expiry, None) if it expires first, or None
+    """
+    times, prices = self.window(order, now)
+    buy = order['side'] == 'buy'
+    slip = 1 + self.slippage if buy else 1 - self.slippage
+    typ = order['type']
+    hits, fills = None, prices
+
+    if typ == 'market':
+      hits, fills = np.ones(len(prices), dtype=bool), prices * slip
+    elif typ == 'limit':
+      hits = prices <= order['limit'] if buy else prices >= order['limit']
+    elif typ == 'stop':
+      hits, fills = (prices >= order['stop'] if buy else prices <= order['stop']), prices * slip
+    elif typ == 'stop_limit':
+      stopped = np.logical_or.accumulate(prices >= order['stop'] if buy else prices <= order['stop'])
+      hits = stopped & (prices <= order['limit'] if buy else prices >= order['limit'])
+    elif typ == 'trailing_stop':
+      marks = self.marks(order, prices)
+      trail = order['trail_price']
+      stops = (marks + trail if trail is not None else marks * (1 + order['trail_percent'] / 100)) if buy else \
+              (marks - trail if trail is not None else marks * (1 - order['trail_percent'] / 100))
+      hits, fills = (prices >= stops if buy else prices <= stops), prices * slip
+
+    if hits is not None and hits.any():
+      i = int(np.argmax(hits))
+      return float(times[i]), float(fills[i])
+
+    if order['expires'] is not None and now >= order['expires']:
+      return float(order['expires']), None
+
+    return None
+
+  def marks(self, order, prices):
+    """
+      Returns: --> the trailing order's high (sell) or low (buy) water
+                   mark at each trade
+    """
+    accumulate = np.minimum.accumulate if order['side'] == 'buy' else np.maximum.accumulate
+    return accumulate(np.r_[order['hwm'], prices])[1:]
+
+  def settle(self, order, now):
+    if order['type'] == 'trailing_stop':
+      marks = self.marks(order, self.window(order, now)[1])
+      order['hwm'] = float(marks[-1]) if len(marks) else order['hwm']
+
+    order['cursor'] = max(order['cursor'], now)
+
+    if order['status'] == 'accepted' and self.replay.is_open(now):
+      order['status'] = 'new'
+
+  def fill(self, order, when, price):
+    symbol, qty = order['symbol'], order['qty']
+    held = self.holdings.get(symbol, [0, 0.0])
+
+    if order['side'] == 'buy':
+      self.cash -= qty * price
+      self.holdings[symbol] = [held[0] + qty, held[1] + qty * price]
+    else:
+      # Sold elsewhere since it was placed (e.g. a position close)
+      qty = min(qty, held[0])
+
+      if qty == 0:
+        return self.close(order, when, 'canceled')
+
+      self.cash += qty * price
+      remaining = [held[0] - qty, held[1] * (held[0] - qty) / held[0]]
+
+      if remaining[0]:
+        self.holdings[symbol] = remaining
+      else:
+        self.holdings.pop(symbol, None)
+
+    order['status'] = 'filled'
+    order['closed'] = when
+    order['filled_qty'] = qty
+    order['filled_price'] = price
+
+    # Bracket: the legs go live after the entry, and cancel each other
+    for leg in order['legs']:
+      leg['status'] = 'new'
+      leg['cursor'] = when
+
+    if order['parent']:
+      for leg in self.orders[order['parent']]['legs']:
+        if leg is not order and leg['status'] in OPEN_STATUSES:
+          self.close(leg, when, 'canceled')
+
+  # Universe
+
+  def get_symbols(self, screener=lambda x: True, **kwargs):
+    """
+      The replayed symbols in the `get_symbols` ticker layout, priced
+      at the replay clock (change against the previous session close).
+    """
+    now = self.replay.now()
+    session = self.replay.opens[max(0, self.replay.session(now))]
+    tickers = []
+
+    for symbol, bars in self.replay.bars.items():
+      price = self.replay.price(symbol, now)
+      before = int(np.searchsorted(bars['t'], session, 'left'))
+      previous = float(bars['c'][before - 1]) if before else price
+
+      ticker = {
+        'symbol': symbol, 'name': symbol, 'exchange': 'sim', 'lastsale': price,
+        'pctchange': price / previous - 1, 'volume': int(bars['v'][before:].sum()), 'marketCap': '',
+      }
+
+      if screener(ticker):
+        tickers.append(ticker)
+
+    return tickers
+
+
+class SimStreaming(object):
+  """
+    `AlpacaStreaming` over a `Replay`: every `interval` seconds the
+    trades (`T.`) and minute bars (`AM.`) of the subscribed streams
+    replayed since the last pass are handed to `on_message`.
+  """
+
+  def __init__(self, replay, interval=0.01):
+    self.replay = replay
+    self.interval = interval
+
+    self.ws = None
+    self.streams = []
+    self.running = False
+    self.connected = threading.Event()
+    self.reconnects = 0
+    self.thread = None
+    self.lock = threading.Lock()
+
+  def subscribe(self, streams):
+    self.streams.extend([stream for stream in streams if stream not in self.streams])
+
+  def unsubscribe(self, streams):
+    self.streams = [stream for stream in self.streams if stream not in streams]
+
+  def claim(self, streams):
+    with self.lock:
+      opening = not self.running
+
+      if opening:
+        self.running = True
+        self.streams = list(streams)
+
+    if not opening:
+      self.subscribe(streams)
+
+    return opening
+
+  def connect(self, streams, on_message=None):
+    """
+      Blocks until `close` is called or the replay ends. If it is
+      running already, subscribes `streams` and returns.
+    """
+    if self.claim(streams):
+      self.thread = threading.current_thread()
+      self.run(on_message)
+
+  def run(self, on_message=None):
+    on_message = on_message or self.on_message
+    self.connected.set()
+    since = self.replay.now()
+
+    while self.running and since < self.replay.end:
+      time.sleep(self.interval)
+      until = self.replay.now()
+
+      for stream, data in self.replay.events(list(self.streams), since, until):
+        if not self.running:
+          break
+
+        if stream in self.streams:
+          on_message(self, json.dumps({'stream': stream, 'data': data}))
+
+      since = until
+
+    self.connected.clear()
+    self.running = False
+
+  def start(self, streams, on_message=None):
+    if self.claim(streams):
+      self.thread = threading.Thread(target=self.run, args=(on_message,), daemon=True)
+      self.thread.start()
+
+    return self.thread
+
+  def close(self):
+    self.running = False
+
+  def on_message(self, ws, message):
+    pass
@@ -0,0 +1,165 @@
+from collections import deque
+
+import threading
+import traceback
+
+"""
+
+  A per-symbol "latest price wins" buffer between the websocket
+  thread and the strategy. `put` never blocks the receiver: a tick for
+  a symbol that is already waiting replaces the older price, so a burst
+  of trades collapses into one evaluation. Worker threads drain the
+  buffer and a symbol is never handled by two workers at once.
+
+"""
+
+
+class TickBuffer(object):
+
+  def __init__(self, handle, workers=2, max_symbols=1000):
+    """
+      Args:
+        handle:       called as handle(symbol, price) on a worker thread
+        workers:      number of draining threads
+        max_symbols:  symbols allowed to wait at once; new ones past it are dropped
+    """
+    self.handle = handle
+    self.workers = workers
+    self.max_symbols = max_symbols
+
+    self.latest = {}
+    self.ready = deque()
+    self.busy = set()
+    self.changed = threading.Condition()
+    self.threads = []
+    self.running = False
+
+    self.received = 0
+    self.processed = 0
+    self.coalesced = 0
+    self.dropped = 0
+    self.errors = 0
+    self.max_depth = 0
+
+  def put(self, symbol, price):
+    with self.changed:
+      self.received += 1
+
+      if symbol in self.latest:
+        self.coalesced += 1
+      elif len(self.latest) >= self.max_symbols:
+        self.dropped += 1
+        return False
+      elif symbol not in self.busy:
+        self.ready.append(symbol)
+        self.changed.notify()
+
+      self.latest[symbol] = price
+      self.max_depth = max(self.max_depth, len(self.latest))
+
+      return True
+
+  def take(self):
+    with self.changed:
+      self.changed.wait_for(lambda: self.ready or not self.running)
+
+      if not self.ready:
+        return None, None
+
+      symbol = self.ready.popleft()
+      self.busy.add(symbol)
+
+      return symbol, self.latest.pop(symbol)
+
+  def done(self, symbol):
+    with self.changed:
+      self.busy.discard(symbol)
+      self.processed += 1
+
+      # A newer tick arrived while this one was being handled
+      if symbol in self.latest:
+        self.ready.append(symbol)
+        self.changed.notify()
+
+      self.changed.notify_all()
+
+  def discard(self, symbol):
+    """
+      Drops the symbol's waiting tick, if any, e.g. once it is sold.
+    """
+    with self.changed:
+      if symbol in self.latest:
+        del self.latest[symbol]
+
+        # Waiting symbols are queued unless a worker is handling them
+        if symbol not in self.busy:
+          self.ready.remove(symbol)
+
+      self.changed.notify_all()
+
+  def work(self):
+    while True:
+      symbol, price = self.take()
+
+      if symbol is None:
+        return
+
+      try:
+        self.handle(symbol, price)
+      except Exception:
+        self.errors += 1
+        traceback.print_exc()
+      finally:
+        self.done(symbol)
+
+  def start(self):
+    if self.running:
+      return self
+
+    self.running = True
+    self.threads = [
+      threading.Thread(target=self.work, daemon=True) for _ in range(self.workers)
+    ]
+
+    for thread in self.threads:
+      thread.start()
+
+    return self
+
+  def drain(self, timeout=None):
+    """
+      Waits until every buffered tick has been handled.
+    """
+    with self.changed:
+      return self.changed.wait_for(lambda: not self.latest and not self.busy, timeout)
+
+  def stop(self, drain=False, timeout=None):
+    if drain:
+      self.drain(timeout)
+
+    with self.changed:
+      self.running = False
+      self.latest.clear()
+      self.ready.clear()
+      self.changed.notify_all()
+
+    for thread in self.threads:
+      thread.join(timeout)
+
+    self.threads = []
+
+  @property
+  def depth(self):
+    return len(self.latest)
+
+  def stats(self):
+    with self.changed:
+      return {
+        'received': self.received,
+        'processed': self.processed,
+        'coalesced': self.coalesced,
+        'dropped': self.dropped,
+        'errors': self.errors,
+        'depth': len(self.latest),
+        'max_depth': self.max_depth,
+      }
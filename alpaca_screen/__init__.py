@@ -1,5 +1,9 @@
 from ..alpaca_modules.alpaca_indicators import *
 from ..alpaca_modules.alpaca_api import Alpaca, get_symbols
+from ..alpaca_modules.panel import drop_columns
+from ..alpaca_modules.indicator_graph import IndicatorGraph
+from ..alpaca_modules.indicator_cache import IndicatorCache
+from ..alpaca_modules.profiling import Profiler, data_size
 
 
 # Main class: AlpacaScreen
@@ -8,37 +12,93 @@ class AlpacaScreen:
 
   def __init__(self, api_key, secret_key, periods='1D',
                paper=False, data_limit=200,
-               needed_periods=14, exchanges=['nyse', 'nasdaq', 'amex']):
+               needed_periods=14, exchanges=['nyse', 'nasdaq', 'amex'],
+               cache_dir=None, panel=False, symbols_ttl=60*60, profile=None,
+               compact=False, window=None, indicator_cache=False):
 
     """
       periods    : '1D', '15Min', '5Min', '1Min'
       data_limit :  200 - 1000
+      cache_dir  :  folder for the on-disk bar cache
+      panel      :  hold data in a `Panel` for whole-universe indicators
+      symbols_ttl:  seconds to reuse the fetched symbol universe
+      profile    :  None (stage timers only), 'cprofile' or 'sample'
+      compact    :  hold data in a compact `Panel` (float32 prices, uint32
+                    volumes), free transient indicators and its frames
+                    after `analyze`, and record memory per stage
+      window     :  rows of indicator history `analyze` reads (at least
+                    `needed_periods`), computed from just the trailing
+                    bars they need
+      indicator_cache: True to reuse the indicator columns of symbols
+                    whose bars are unchanged since the last `run` (a
+                    256MB `IndicatorCache`), or a cache to share
     """
 
-    self.apc = Alpaca(api_key, secret_key, paper=paper)
+    self.apc = Alpaca(api_key, secret_key, paper=paper, cache_dir=cache_dir)
     self.periods = periods
     self.data_limit = data_limit
     self.needed_periods = needed_periods
     self.exchanges = exchanges
+    self.panel = panel or compact
+    self.compact = compact
+    self.window = window
+    self.cache_dir = cache_dir
+    self.symbols_ttl = symbols_ttl
+    self.profiler = Profiler(profile=profile, memory=compact, measure=lambda: data_size(self.data))
+
+    if indicator_cache is True:
+      indicator_cache = IndicatorCache()
+
+    self.indicator_cache = indicator_cache or None
+    self.graph = IndicatorGraph(timer=self.profiler.indicator, cache=self.indicator_cache)
 
     self.data = None
     self.symbols = []
 
   def run(self):
-    self.symbols = [tick['symbol'] for tick in get_symbols(
-      exchanges=self.exchanges, screener=self.stock_screen
-    )]
-    self.data = self.apc.historical_data(self.symbols, tf=self.periods, limit=self.data_limit)
-    self.indicators()
+    with self.profiler.iteration('screen'):
+      with self.profiler.stage('universe'):
+        self.symbols = [tick['symbol'] for tick in get_symbols(
+          exchanges=self.exchanges, screener=self.stock_screen,
+          ttl=self.symbols_ttl, cache_dir=self.cache_dir
+        )]
+
+      with self.profiler.stage('data'):
+        self.data = self.apc.historical_data(
+          self.symbols, tf=self.periods, limit=self.data_limit, as_panel=self.panel,
+          compact=self.compact,
+        )
+
+      with self.profiler.stage('indicators'):
+        window = max(self.window, self.needed_periods) if self.window else None
+        self.data = self.graph.bind(self.data, window)
+        self.indicators()
+
+      with self.profiler.stage('analyze'):
+        for symbol in self.symbols:
+          if not self.check_data(symbol):
+            continue
+
+          self.analyze(symbol, self.data[symbol]['close'].iloc[-1])
+
+        self.release()
+
+  def indicator(self, func, *args, transient=False, **kwargs):
+    """
+    Declares `func(data, *args, **kwargs)`, computed when its columns
+    are first read.
+      transient: drop the columns `func` adds once `analyze` has run
+    """
+    self.graph.declare(func, *args, transient=transient, **kwargs)
 
-    for symbol in self.symbols:
-      if not self.check_data(symbol):
-        continue
+  def release(self):
+    if not self.data:
+      return
 
-      self.analyze(symbol, self.data[symbol]['close'].iloc[-1])
+    drop_columns(self.data, self.graph.transient_columns())
 
-  def indicator(self, func, *args, **kwargs):
-    self.data = func(self.data, *args, **kwargs)
+    if self.compact:
+      self.data.release()
 
   def check_data(self, symbol):
     if symbol not in self.data:
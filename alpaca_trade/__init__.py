@@ -1,11 +1,23 @@
 from ..alpaca_modules.alpaca_indicators import *
 from ..alpaca_modules.alpaca_api import Alpaca, AlpacaStreaming, get_symbols
+from ..alpaca_modules.alpaca_incremental import IndicatorSet
+from ..alpaca_modules.alpaca_async import AsyncAlpaca, AsyncAlpacaStreaming
+from ..alpaca_modules.tick_buffer import TickBuffer
+from ..alpaca_modules.bar_builder import BarBuilder
+from ..alpaca_modules.panel import Panel, drop_columns
+from ..alpaca_modules.indicator_graph import IndicatorGraph
+from ..alpaca_modules.indicator_cache import IndicatorCache
+from ..alpaca_modules.order_dispatch import OrderDispatcher
+from ..alpaca_modules.metrics import Metrics
+from ..alpaca_modules.profiling import Profiler, data_size
+from ..alpaca_modules.simulator import SimAlpaca
 from .utils import key, get_time_till, StoppableThread
 from datetime import datetime
 from dotenv import load_dotenv
 
 import numpy as np
 import pandas as pd
+import asyncio
 import time
 import json
 import threading
@@ -26,17 +38,64 @@ class AlpacaTrade:
   def __init__(self, api_key, api_secret, allow_daytrading=False,
                needed_periods=8, max_positions=4, log=False,
                bar_period='1D', paper=False, stop_loss=None,
-               take_profit=None, data_limit=200, simulate=False):
+               take_profit=None, data_limit=200, simulate=False,
+               cache_dir=None, panel=False, incremental=False,
+               prices_from_bars=False, tick_workers=2, live_bars=False,
+               bar_stream='T', symbols_ttl=60*60, profile=None, compact=False,
+               window=None, indicator_cache=False, order_workers=8):
 
     """
       bar_period:   ['1D', '15Min', '5Min', '1Min'],
       stop_loss:    float between 1 - 0
       take_profit:  float between 1 - inf
       data_limit:   1000 - 200
+      cache_dir:    folder for the on-disk bar cache
+      panel:        hold data in a `Panel` for whole-universe indicators
+      incremental:  load history once, then update indicators bar by bar
+      prices_from_bars: use the last fetched close instead of a price snapshot
+      tick_workers: threads evaluating streamed prices for `monitoring`
+      live_bars:    after the first history load, build new bars from the
+                    data stream instead of fetching them over REST
+      bar_stream:   'T' (trades) or 'AM' (minute bars) to build live bars from
+      symbols_ttl:  seconds to reuse the fetched symbol universe
+      profile:      None (stage timers only), 'cprofile' or 'sample';
+                    records are kept in `self.profiler`
+      simulate:     True to trade against a `SimAlpaca` replaying the 1Min
+                    bars in `cache_dir` at 1000x, or a `SimAlpaca` to use;
+                    runs through `run` only (`run_async` raises ValueError)
+      compact:      hold data in a compact `Panel` (float32 prices, uint32
+                    volumes, one shared index), free transient indicators
+                    and its frames after `analyze`, and record memory per
+                    stage in `self.profiler`
+      window:       rows of indicator history `analyzer` reads (at least
+                    `needed_periods`); indicators then run on the trailing
+                    bars those rows need instead of the whole history
+      indicator_cache: True to reuse the indicator columns of symbols
+                    whose bars are unchanged since the last iteration
+                    (a 256MB `IndicatorCache`), or a cache to share,
+                    e.g. with an `AlpacaScreen`
+      order_workers: orders `trade` sends at once, each with a client
+                    order id so lost answers are resent safely
     """
     self.allow_daytrading = allow_daytrading
-    self.apc = Alpaca(api_key, api_secret, paper=paper, log=log)
-    self.apc_stream = AlpacaStreaming(api_key, api_secret)
+    # One set of REST metrics for the sync and asyncio clients
+    self.metrics = Metrics()
+
+    if simulate:
+      # The same code paths, against the replayed market and its clock
+      self.apc = simulate if isinstance(simulate, SimAlpaca) else \
+        SimAlpaca(api_key, api_secret, cache_dir=cache_dir, log=log, metrics=self.metrics)
+      self.apc_stream = self.apc.streaming()
+      simulate = self.apc
+    else:
+      self.apc = Alpaca(api_key, api_secret, paper=paper, log=log, cache_dir=cache_dir, metrics=self.metrics)
+      self.apc_stream = AlpacaStreaming(api_key, api_secret)
+
+    self.apc_async = None
+    self.credentials = dict(
+      api_key=api_key, secret_key=api_secret, paper=paper, log=log, cache_dir=cache_dir,
+      metrics=self.metrics
+    )
     self.needed_periods = needed_periods
     self.max_positions = max_positions
     self.bar_period = bar_period
@@ -44,6 +103,14 @@ class AlpacaTrade:
     self.stop_loss = stop_loss
     self.take_profit = take_profit
     self.simulate = simulate
+    self.panel = panel or compact
+    self.compact = compact
+    self.window = window
+    self.incremental = incremental
+    self.prices_from_bars = prices_from_bars
+    self.cache_dir = cache_dir
+    self.symbols_ttl = symbols_ttl
+    self.live = IndicatorSet()
 
     self.data = None
     self.symbols = []
@@ -55,6 +122,37 @@ class AlpacaTrade:
     self.stream = None
     self.streams = []
 
+    # Streamed trades are coalesced per symbol and handled off the socket thread
+    self.ticks = TickBuffer(self.tick, workers=tick_workers)
+
+    # Live bars: raw OHLCV history per symbol, extended from the stream
+    self.live_bars = BarBuilder(bar_period) if live_bars else None
+    self.bar_stream = bar_stream
+    self.bar_streams = []
+    self.history = {}
+
+    # Timing record per iteration; `run` sets the budget
+    self.profiler = Profiler(profile=profile, memory=compact, measure=lambda: data_size(self.data))
+    self.iterate_every = None
+
+    # `indicator` declarations, computed as their columns are read
+    if indicator_cache is True:
+      indicator_cache = IndicatorCache()
+
+    self.indicator_cache = indicator_cache or None
+    self.graph = IndicatorGraph(timer=self.profiler.indicator, cache=self.indicator_cache)
+
+    # Orders from `selector` go out together; answers in `self.dispatcher.acks`
+    self.dispatcher = OrderDispatcher(self.place_order, workers=order_workers, on_ack=self.order_ack)
+
+    # Set while `run_async` is running
+    self.loop = None
+
+    # Symbols with a sell on the way (their task under `run_async`);
+    # `positions` is swapped from the tick workers under the lock
+    self.selling = {}
+    self.positions_lock = threading.Lock()
+
   def iterate(self):
     """
     This contains most of the pipline logic. Everything from fetching
@@ -62,37 +160,116 @@ class AlpacaTrade:
     and selecting.
     """
 
-    try:
-      self.get_account_info()
-    except:
-      print('   Account credentials are invalied.')
-      return
+    with self.profiler.iteration('iterate', budget=self.iterate_every):
+      with self.profiler.stage('account'):
+        try:
+          self.get_account_info()
+        except:
+          print('   Account credentials are invalied.')
+          return
+
+      if self.at_capacity():
+        return
+
+      print('::::: Start analyzing stocks at {}'.format(self.timestamp()))
+
+      with self.profiler.stage('universe'):
+        self.symbols = [tick['symbol'] for tick in self.screened_symbols()]
+
+      with self.profiler.stage('data'):
+        if self.live_bars:
+          self.stream_bars()
+
+        if self.incremental:
+          self.update_data()
+        elif self.live_bars:
+          self.update_history()
+        else:
+          self.data = self.apc.historical_data(
+            self.symbols, tf=self.bar_period, limit=self.data_limit, as_panel=self.panel,
+            compact=self.compact,
+          )
+
+      # Incremental and live modes run their indicators within `data`
+      if not self.incremental and not self.live_bars:
+        with self.profiler.stage('indicators'):
+          self.declare_indicators()
+
+      with self.profiler.stage('check'):
+        symbols = self.checked_symbols()
+
+      # One batched snapshot instead of a request per symbol
+      with self.profiler.stage('prices'):
+        if self.live_bars:
+          prices = {symbol: self.stream_price(symbol) for symbol in symbols}
+        elif self.prices_from_bars:
+          prices = {symbol: self.data[symbol]['close'].iloc[-1] for symbol in symbols}
+        else:
+          prices = self.apc.last_prices(symbols)
+
+      with self.profiler.stage('analyze'):
+        self.analyze(symbols, prices)
+        self.release()
+
+      with self.profiler.stage('trade'):
+        self.trade()
+
+      print('::::: Complete analyzing stocks at {}'.format(self.timestamp()))
+
+  def screened_symbols(self):
+    if self.simulate:
+      return self.simulate.get_symbols(screener=self.screener)
+
+    return get_symbols(screener=self.screener, ttl=self.symbols_ttl, cache_dir=self.cache_dir)
+
+  def now(self):
+    """
+      Returns: --> epoch seconds, on the replay clock when simulating
+    """
+    return self.simulate.now() if self.simulate else time.time()
+
+  def sleep(self, seconds):
+    if self.simulate:
+      return self.simulate.sleep(seconds)
+
+    time.sleep(seconds)
 
+  def timestamp(self, fmt="%Y-%m-%d %H:%M:%S"):
+    return time.strftime(fmt, time.localtime(self.now()))
+
+  def at_capacity(self):
     if len(self.positions) == self.max_positions:
       # TODO: display that we are skipping and then
       # try to sleep until we have exited a position.
-      return
+      return True
 
     buy_orders = []
     for order in self.orders:
       if order['side'] == 'buy':
         buy_orders.append(order)
 
-    if len(self.orders) == self.max_positions and len(buy_orders) == self.max_positions:
-      return
+    return len(self.orders) == self.max_positions and len(buy_orders) == self.max_positions
 
-    print('::::: Start analyzing stocks at {}'.format(time.strftime("%Y-%m-%d %H:%M:%S")))
-
-    self.symbols = [tick['symbol'] for tick in get_symbols(screener=self.screener)]
-    self.data = self.apc.historical_data(self.symbols, tf=self.bar_period, limit=self.data_limit)
-    self.indicators()
+  def checked_symbols(self):
+    symbols = []
 
     for symbol in self.symbols:
       if not self.check_data(symbol):
         print(f'   {symbol} has no data - consider manually filtering out in screener.')
         continue
 
-      price = self.apc.get_last_trade(symbol)['last']['price']
+      symbols.append(symbol)
+
+    return symbols
+
+  def analyze(self, symbols, prices):
+    self.pending_orders = []
+
+    for symbol in symbols:
+      if symbol not in prices:
+        continue
+
+      price = prices[symbol]
 
       if self.analyzer(symbol, price):
         if self.check_status('positions', symbol) or self.check_status('orders', symbol):
@@ -105,9 +282,6 @@ class AlpacaTrade:
 
         self.pending_orders.append({'symbol': symbol, 'qty': qty, 'price': price})
 
-    self.trade()
-    print('::::: Complete analyzing stocks at {}'.format(time.strftime("%Y-%m-%d %H:%M:%S")))
-
 
   def run(self, iterate_every=60*1, run_during_market=True,
           minutes_after_open=20, minutes_till_close=1, account=None):
@@ -120,66 +294,502 @@ class AlpacaTrade:
     if account:
       print(f"\n [*_*] Running algorithm for {account} [*_*]")
 
-    while True:
-      live_monitoring_thread = StoppableThread(target=self.live_monitoring, daemon=True)
-      market = self.apc.get_clock()
+    self.iterate_every = iterate_every
 
-      if market['is_open'] or not run_during_market:
+    try:
+      while True:
+        if self.simulate and self.simulate.finished:
+          print('\n::::: Replay finished. ')
+          return
 
-        print('\n::::: Markets are OPEN. Running algorithm. ')
-        print('      Current time is {}'.format(datetime.fromtimestamp(
-          datetime.now().timestamp()
-        ).strftime("%A, %B %d, %Y %I:%M:%S")))
+        live_monitoring_thread = StoppableThread(target=self.live_monitoring, daemon=True)
+        market = self.apc.get_clock()
 
-        iteration_start_time = time.time()
-        iteration = 0
+        if market['is_open'] or not run_during_market:
 
-        if not self.allow_daytrading:
-          live_monitoring_thread.start()
-        else:
+          print('\n::::: Markets are OPEN. Running algorithm. ')
+          print('      Current time is {}'.format(self.timestamp("%A, %B %d, %Y %I:%M:%S")))
+
+          iteration_start_time = self.now()
+          iteration = 0
+
+          if not self.allow_daytrading:
+            live_monitoring_thread.start()
+          else:
+            live_monitoring_thread.stop()
+
+          while True:
+            iteration += 1
+            market = self.apc.get_clock()
+            seconds = get_time_till(market, till='next_close', log=False, now=self.now())
+
+            if not market['is_open'] and run_during_market:
+              break
+
+            if seconds < 60*minutes_till_close and market['is_open'] and run_during_market:
+              break
+
+            self.iterate()
+
+            if len(self.positions) == self.max_positions and \
+               len(self.streams) == 0 and run_during_market and \
+               not self.allow_daytrading:
+              break
+
+            self.sleep(iterate_every - ((self.now() - iteration_start_time) % iterate_every))
+
+        print('\n::::: Stopping algorithm. ')
+
+        if not live_monitoring_thread.stopped():
           live_monitoring_thread.stop()
+          print('      ~~Monitoring stopped.')
 
-        while True:
-          iteration += 1
-          market = self.apc.get_clock()
-          seconds = get_time_till(market, till='next_close', log=False)
+        self.apc_stream.close()
+        self.ticks.stop()
 
-          if not market['is_open'] and run_during_market:
-            break
+        market = self.apc.get_clock()
+        seconds = get_time_till(market, till='next_open', now=self.now())
+        seconds += 60*minutes_after_open
 
-          if seconds < 60*minutes_till_close and market['is_open'] and run_during_market:
-            break
+        print(f'\n::::: Sleeping till {minutes_after_open} minutes after next market open. ')
+        self.sleep(seconds)
+    finally:
+      # The order threads end with the run
+      self.dispatcher.close()
 
-          self.iterate()
 
-          if len(self.positions) == self.max_positions and \
-             len(self.streams) == 0 and run_during_market and \
-             not self.allow_daytrading:
-            break
+  # Asyncio
 
-          time.sleep(iterate_every - ((time.time() - iteration_start_time) % iterate_every))
 
-      print('\n::::: Stopping algorithm. ')
+  async def run_async(self, iterate_every=60*1, run_during_market=True,
+                      minutes_after_open=20, minutes_till_close=1,
+                      account=None, refresh_every=15):
+    """
+    Same schedule as `run`, on one event loop: the clock watch, account
+    refresh, iterations (data fetch, analysis, concurrent order
+    submission) and position streaming run as concurrent tasks, and
+    are all cancelled together when the session ends or one fails.
+    Simulations (`simulate`) are not supported: the asyncio client only
+    talks to Alpaca, so it raises ValueError; replay them with `run`.
+
+      asyncio.run(strategy.run_async())
+    """
+
+    if self.simulate:
+      raise ValueError('run_async does not support simulate: the asyncio client only talks to Alpaca, use run')
+
+    if account:
+      print(f"\n [*_*] Running algorithm for {account} [*_*]")
+
+    self.loop = asyncio.get_running_loop()
+    self.iterate_every = iterate_every
+    self.apc_async = self.apc_async or AsyncAlpaca(**self.credentials)
+
+    try:
+      while True:
+        market = await self.apc_async.get_clock()
+
+        if market['is_open'] or not run_during_market:
+          print('\n::::: Markets are OPEN. Running algorithm. ')
+          print('      Current time is {}'.format(datetime.fromtimestamp(
+            datetime.now().timestamp()
+          ).strftime("%A, %B %d, %Y %I:%M:%S")))
+
+          await self.session_async(iterate_every, run_during_market, minutes_till_close, refresh_every)
+
+        print('\n::::: Stopping algorithm. ')
+
+        market = await self.apc_async.get_clock()
+        seconds = get_time_till(market, till='next_open')
+        seconds += 60*minutes_after_open
+
+        print(f'\n::::: Sleeping till {minutes_after_open} minutes after next market open. ')
+        await asyncio.sleep(seconds)
+    finally:
+      self.loop = None
+      self.dispatcher.close()
+      await self.apc_async.close()
 
-      if not live_monitoring_thread.stopped():
-        live_monitoring_thread.stop()
+  async def session_async(self, iterate_every, run_during_market,
+                          minutes_till_close, refresh_every):
+    """
+    One market session. Returns as soon as any task finishes (market
+    closing, or nothing left to do) and cancels the others.
+    """
+    # One socket per session, at the endpoint of the sync stream
+    self.stream = AsyncAlpacaStreaming(self.apc_async, url=self.apc_stream.url)
+    self.bar_streams = []
+
+    tasks = [
+      asyncio.create_task(self.watch_clock(run_during_market, minutes_till_close)),
+      asyncio.create_task(self.refresh_account(refresh_every)),
+      asyncio.create_task(self.iterate_loop(iterate_every, run_during_market)),
+    ]
+
+    if not self.allow_daytrading or self.live_bars:
+      tasks.append(asyncio.create_task(self.live_monitoring_async()))
+
+    try:
+      done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+      for task in done:
+        task.result()
+    finally:
+      for task in tasks:
+        task.cancel()
+
+      await asyncio.gather(*tasks, return_exceptions=True)
+
+      if not self.allow_daytrading:
         print('      ~~Monitoring stopped.')
 
-      market = self.apc.get_clock()
-      seconds = get_time_till(market, till='next_open')
-      seconds += 60*minutes_after_open
+  async def watch_clock(self, run_during_market, minutes_till_close, check_every=30):
+    while True:
+      market = await self.apc_async.get_clock()
+      seconds = get_time_till(market, till='next_close', log=False)
+
+      if not market['is_open'] and run_during_market:
+        return
+
+      if seconds < 60*minutes_till_close and market['is_open'] and run_during_market:
+        return
+
+      await asyncio.sleep(check_every)
+
+  async def refresh_account(self, refresh_every):
+    while True:
+      await self.get_account_info_async()
+      await asyncio.sleep(refresh_every)
+
+  async def iterate_loop(self, iterate_every, run_during_market):
+    start = time.time()
+
+    while True:
+      await self.iterate_async()
+
+      if len(self.positions) == self.max_positions and \
+         len(self.streams) == 0 and run_during_market and \
+         not self.allow_daytrading:
+        return
+
+      await asyncio.sleep(iterate_every - ((time.time() - start) % iterate_every))
+
+  async def iterate_async(self):
+    """
+    `iterate` with the network waits awaited, and the blocking parts
+    (symbol screen, indicators) run off the event loop.
+    """
+    with self.profiler.iteration('iterate_async', budget=self.iterate_every):
+      # Not a bare except: cancellation must get through
+      with self.profiler.stage('account'):
+        try:
+          await self.get_account_info_async()
+        except Exception:
+          print('   Account credentials are invalied.')
+          return
+
+      if self.at_capacity():
+        return
+
+      print('::::: Start analyzing stocks at {}'.format(time.strftime("%Y-%m-%d %H:%M:%S")))
+
+      with self.profiler.stage('universe'):
+        ticks = await asyncio.to_thread(
+          get_symbols, screener=self.screener, ttl=self.symbols_ttl, cache_dir=self.cache_dir
+        )
+        self.symbols = [tick['symbol'] for tick in ticks]
+
+      with self.profiler.stage('data'):
+        if self.live_bars:
+          await self.stream_bars_async()
+
+        if self.incremental:
+          await asyncio.to_thread(self.update_data)
+        elif self.live_bars:
+          await asyncio.to_thread(self.update_history)
+        else:
+          self.data = await self.apc_async.historical_data(
+            self.symbols, tf=self.bar_period, limit=self.data_limit, as_panel=self.panel,
+            compact=self.compact,
+          )
+
+      if not self.incremental and not self.live_bars:
+        with self.profiler.stage('indicators'):
+          self.declare_indicators()
+
+      # Reading the data computes the indicators: keep it off the loop
+      with self.profiler.stage('check'):
+        symbols = await asyncio.to_thread(self.checked_symbols)
+
+      with self.profiler.stage('prices'):
+        if self.live_bars:
+          prices = {symbol: self.stream_price(symbol) for symbol in symbols}
+        elif self.prices_from_bars:
+          prices = {symbol: self.data[symbol]['close'].iloc[-1] for symbol in symbols}
+        else:
+          prices = await self.apc_async.last_prices(symbols)
+
+      with self.profiler.stage('analyze'):
+        self.analyze(symbols, prices)
+        self.release()
+
+      with self.profiler.stage('trade'):
+        await self.trade_async()
+
+      print('::::: Complete analyzing stocks at {}'.format(time.strftime("%Y-%m-%d %H:%M:%S")))
+
+  async def get_account_info_async(self):
+    positions, self.orders, account = await asyncio.gather(
+      self.apc_async.get_positions(),
+      self.apc_async.get_orders(status='open'),
+      self.apc_async.get_account(),
+    )
+    self.set_positions(positions)
+    self.buying_power = float(account['buying_power'])
+
+  async def trade_async(self):
+    if not self.sends_orders():
+      return []
+
+    return await self.dispatcher.dispatch_async(self.apc_async, self.selector())
+
+  async def live_monitoring_async(self):
+    """
+    Reads the session's socket: trades of the positions (monitored
+    unless day trading) and, with `live_bars`, the bar streams
+    subscribed by `stream_bars_async`.
+    """
+    if not self.allow_daytrading:
+      self.set_positions(await self.apc_async.get_positions())
+      self.streams = ['T.{}'.format(p['symbol']) for p in self.positions]
+
+      print('      ~~Monitoring started...')
+      print('      ~~Streams to monitor today: ', self.streams)
 
-      print(f'\n::::: Sleeping till {minutes_after_open} minutes after next market open. ')
-      time.sleep(seconds)
+    async for message in self.stream.listen(self.streams):
+      message = json.loads(message)
+
+      if self.live_bars and 'data' in message:
+        self.live_bars.add_message(message['data'])
+
+      unwrapped = self.unwrap_message(message)
+
+      if unwrapped:
+        self.tick(*unwrapped)
+
+  async def stream_bars_async(self):
+    """
+    `stream_bars` on the session's socket.
+    """
+    streams = [f'{self.bar_stream}.{symbol}' for symbol in self.symbols]
+    stale = [stream for stream in self.bar_streams if stream not in streams]
+
+    await self.stream.subscribe(streams)
+
+    # Keep position streams open for monitoring
+    await self.stream.unsubscribe([stream for stream in stale if stream not in self.streams])
+
+    for stream in stale:
+      self.live_bars.forget(stream.split('.', 1)[1])
+
+    self.bar_streams = streams
+
+  async def sell_async(self, symbol):
+    try:
+      for position in self.positions:
+        if position['symbol'] == symbol:
+          await self.apc_async.sell(symbol, position['qty'])
+          print('   Placing a sell order for {} {}'.format(position['qty'], symbol))
+
+          # Drop the stream on the open socket, no reconnect
+          if f'T.{symbol}' in self.streams:
+            self.streams.remove(f'T.{symbol}')
+
+            if f'T.{symbol}' not in self.bar_streams:
+              await self.stream.unsubscribe([f'T.{symbol}'])
+
+          self.set_positions(await self.apc_async.get_positions())
+    finally:
+      self.selling.pop(symbol, None)
 
 
   def get_account_info(self):
-    self.positions = self.apc.get_positions()
+    self.set_positions(self.apc.get_positions())
     self.orders = self.apc.get_orders(status='open')
     self.buying_power = float(self.apc.get_account()['buying_power'])
 
-  def indicator(self, func, *args, **kwargs):
-    self.data = func(self.data, *args, **kwargs)
+  def set_positions(self, positions):
+    with self.positions_lock:
+      self.positions = positions
+
+  def indicator(self, func, *args, transient=False, **kwargs):
+    """
+    Declares `func(data, *args, **kwargs)`; its columns are computed
+    when first read (see `IndicatorGraph`).
+      transient: drop the columns `func` adds once `analyzer` has run,
+                 so `selector` cannot read them (ignored in incremental
+                 mode, whose state keeps every column)
+    """
+    if self.incremental:
+      self.live.declare(func, *args, **kwargs)
+      return
+
+    self.graph.declare(func, *args, transient=transient, **kwargs)
+
+  def declare_indicators(self):
+    """
+    Declares `indicators()` on a new graph over `self.data`.
+    """
+    window = max(self.window, self.needed_periods) if self.window else None
+    self.data = self.graph.bind(self.data, window)
+    self.indicators()
+
+  def release(self):
+    """
+    Frees what only `analyzer` needed: transient indicator columns and,
+    in compact mode, the panel's per-symbol frames.
+    """
+    if self.data is None:
+      return
+
+    drop_columns(self.data, self.graph.transient_columns())
+
+    if self.compact and isinstance(self.data, Panel):
+      self.data.release()
+
+  def update_data(self, catch_up=5):
+    """
+    Incremental mode: symbols seen for the first time get their full
+    history, run once through the streaming indicators. Every other
+    symbol only fetches its last `catch_up` bars and updates its
+    indicators with the new ones, so the cost is per symbol, not per bar.
+    A last bar delivered again with new values (still forming) replaces
+    the last row and is re-applied to the indicators.
+    """
+    self.data = self.data if self.data is not None else {}
+    self.indicators()
+
+    fresh = [symbol for symbol in self.symbols if symbol not in self.live]
+    known = [symbol for symbol in self.symbols if symbol in self.live]
+
+    if fresh:
+      history = self.apc.historical_data(fresh, tf=self.bar_period, limit=self.data_limit)
+
+      for symbol, frame in history.items():
+        columns = self.live.seed(symbol, frame)
+
+        if self.live_bars:
+          self.live_bars.seed(symbol, frame)
+        self.data[symbol] = frame.assign(**{
+          col: values for col, values in columns.items() if col not in frame
+        })
+
+    if known:
+      latest = self.new_bars(known, catch_up)
+
+      for symbol, bars in latest.items():
+        frame = self.data[symbol]
+        last = bars[bars.index == frame.index[-1]] if len(frame) else bars.iloc[:0]
+        bars = bars[bars.index > frame.index[-1]] if len(frame) else bars
+
+        # More new bars than we asked for: re-seed from history next time
+        if len(bars) == catch_up and not self.live_bars:
+          self.live.forget(symbol)
+          continue
+
+        rows = []
+
+        # The last bar again, with new values while it is still forming
+        if len(last) and not np.array_equal(
+          last.to_numpy(dtype=float), frame[last.columns].iloc[-1:].to_numpy(dtype=float), equal_nan=True
+        ):
+          rows.append(self.live.revise(symbol, dict(zip(last.columns, last.iloc[0]))))
+          frame = frame.iloc[:-1]
+          bars = pd.concat([last, bars])
+
+        if bars.empty:
+          continue
+
+        rows += [
+          self.live.update(symbol, dict(zip(bars.columns, values)))
+          for values in bars.iloc[len(rows):].itertuples(index=False)
+        ]
+
+        self.data[symbol] = pd.concat([
+          frame, pd.DataFrame(rows, index=bars.index, columns=frame.columns)
+        ]).iloc[-self.data_limit:]
+
+  def new_bars(self, symbols, catch_up):
+    """
+      Returns: --> bars closed since the last call and the one still
+                   forming, from the live bar builder, or the last
+                   `catch_up` bars over REST
+    """
+    if not self.live_bars:
+      return self.apc.historical_data(symbols, tf=self.bar_period, limit=catch_up)
+
+    self.live_bars.flush(self.now())
+    latest = {symbol: self.live_bars.pop(symbol) for symbol in symbols}
+
+    return {symbol: bars for symbol, bars in latest.items() if bars is not None}
+
+  def update_history(self):
+    """
+    Live bars without incremental indicators: keep the raw bars per
+    symbol, append the streamed ones and recompute `indicators()` on
+    the result. The last bar, partial when fetched, is replaced as the
+    streamed trades are merged into it. Only symbols new to the
+    universe hit REST.
+    """
+    fresh = [symbol for symbol in self.symbols if symbol not in self.history]
+
+    if fresh:
+      history = self.apc.historical_data(fresh, tf=self.bar_period, limit=self.data_limit)
+      self.history.update(history)
+
+      for symbol, frame in history.items():
+        self.live_bars.seed(symbol, frame)
+
+    known = [symbol for symbol in self.symbols if symbol in self.history]
+
+    for symbol, bars in self.new_bars(known, None).items():
+      frame = self.history[symbol]
+
+      if len(frame):
+        # From the current bar on: it replaces the row fetched before
+        bars = bars[bars.index >= frame.index[-1]]
+        frame = frame[frame.index < bars.index[0]] if len(bars) else frame
+
+      self.history[symbol] = pd.concat([frame, bars]).iloc[-self.data_limit:]
+
+    frames = {symbol: self.history[symbol] for symbol in known}
+    self.data = Panel.from_frames(frames, compact=self.compact) if self.panel else {
+      symbol: frame.copy() for symbol, frame in frames.items()
+    }
+    self.declare_indicators()
+
+  def stream_bars(self):
+    """
+    Subscribes the bar stream of every symbol in the universe on the
+    shared connection, opening it if monitoring has not already.
+    """
+    streams = [f'{self.bar_stream}.{symbol}' for symbol in self.symbols]
+    stale = [stream for stream in self.bar_streams if stream not in streams]
+
+    self.ticks.start()
+    self.apc_stream.start(streams + self.streams, on_message=self.monitor_positions)
+
+    # Keep position streams open for monitoring
+    self.apc_stream.unsubscribe([stream for stream in stale if stream not in self.streams])
+
+    for stream in stale:
+      self.live_bars.forget(stream.split('.', 1)[1])
+
+    self.bar_streams = streams
+
+  def stream_price(self, symbol):
+    price = self.live_bars.price(symbol)
+    return price if price is not None else self.data[symbol]['close'].iloc[-1]
 
   def check_data(self, symbol):
     if symbol not in self.data:
@@ -211,59 +821,117 @@ class AlpacaTrade:
     return max(1, int(allocation / (price * 1.05)))
 
   def trade(self):
-    for order in self.selector():
-      if not self.allow_daytrading:
-        print('   Placing a buy order for {} {}'.format(order['qty'], order['symbol']))
-        self.apc.buy(order['symbol'], order['qty'])
-        continue
+    """
+    Sends the orders from `selector` at once, see `OrderDispatcher`,
+    and returns their responses when all are in.
+    """
+    if not self.sends_orders():
+      return []
 
-      if self.allow_daytrading and self.stop_loss and self.take_profit:
-        print('   Placing a bracket order for {} {}'.format(order['qty'], order['symbol']))
-        self.apc.bracket_order(
-          order['symbol'], order['qty'], order['price'] * self.take_profit,
-          order['price'] * self.stop_loss, tif='gtc'
-        )
+    return self.dispatcher.dispatch(self.apc, self.selector())
+
+  def sends_orders(self):
+    # Daytrading places bracket orders, which need both exits
+    return not self.allow_daytrading or bool(self.stop_loss and self.take_profit)
+
+  def place_order(self, apc, order):
+    """
+      Sends one order from `selector` through `apc` (sync or async
+      client) and returns its response (or awaitable).
+    """
+    if not self.allow_daytrading:
+      print('   Placing a buy order for {} {}'.format(order['qty'], order['symbol']))
+      return apc.buy(order['symbol'], order['qty'], client_order_id=order.get('client_order_id'))
+
+    if self.allow_daytrading and self.stop_loss and self.take_profit:
+      print('   Placing a bracket order for {} {}'.format(order['qty'], order['symbol']))
+      return apc.bracket_order(
+        order['symbol'], order['qty'], order['price'] * self.take_profit,
+        order['price'] * self.stop_loss, tif='gtc', client_order_id=order.get('client_order_id')
+      )
 
 
   # Monitoring
 
 
   def sell(self, symbol):
-    for position in self.positions:
-      if position['symbol'] == symbol:
-        self.apc.sell(symbol, position['qty'])
+    # Under `run_async`, sell without blocking the stream
+    if self.loop is not None:
+      if symbol not in self.selling:
+        self.selling[symbol] = self.loop.create_task(self.sell_async(symbol))
+
+      return self.selling.get(symbol)
+
+    # One sell per position, whichever worker gets there first
+    with self.positions_lock:
+      position = next((p for p in self.positions if p['symbol'] == symbol), None)
+
+      if position is None or symbol in self.selling:
+        return
+
+      self.selling[symbol] = None
+
+    try:
+      self.apc.sell(symbol, position['qty'])
+      self.ticks.discard(symbol)
+
+      if f'T.{symbol}' in self.streams:
         self.streams.remove(f'T.{symbol}')
 
-        print('   Placing a sell order for {} {}'.format(position['qty'], symbol))
+      print('   Placing a sell order for {} {}'.format(position['qty'], symbol))
+
+      # Stop watching the symbol on the open connection
+      if f'T.{symbol}' not in self.bar_streams:
+        self.apc_stream.unsubscribe([f'T.{symbol}'])
 
-        # Restart monitoring
-        self.stream.close()
-        self.stream = self.apc_stream.connect(self.streams, on_message=self.monitor_positions)
-        self.positions = self.apc.get_positions()
+      self.set_positions(self.apc.get_positions())
+    finally:
+      self.selling.pop(symbol, None)
 
   def live_monitoring(self):
-    self.positions = self.apc.get_positions()
+    self.set_positions(self.apc.get_positions())
     self.streams = ['T.{}'.format(p['symbol']) for p in self.positions]
 
     print('      ~~Monitoring started...')
     print('      ~~Streams to monitor today: ', self.streams)
-    self.stream = self.apc_stream.connect(self.streams, on_message=self.monitor_positions)
+    self.stream = self.apc_stream
+    self.ticks.start()
+
+    # Only subscribes when live bars opened the connection already
+    self.apc_stream.connect(self.streams + self.bar_streams, on_message=self.monitor_positions)
 
   def unwrap_message(self, message):
-    message = json.loads(message)
+    message = json.loads(message) if isinstance(message, (str, bytes)) else message
 
     if 'data' not in message:
       return
 
     data = message['data']
 
-    if 'T' not in data:
+    if 'T' not in data or 'p' not in data:
       return
 
     return (data['T'], data['p'])
 
   def monitor_positions(self, ws, message):
-    symbol, price = self.unwrap_message(message)
+    message = json.loads(message)
+
+    if self.live_bars and 'data' in message:
+      self.live_bars.add_message(message['data'])
+
+    unwrapped = self.unwrap_message(message)
+
+    # Only parse and enqueue here; `monitoring` runs on the tick workers
+    if unwrapped and f'T.{unwrapped[0]}' in self.streams:
+      self.ticks.put(*unwrapped)
+
+  def tick(self, symbol, price):
+    """
+      Handles a streamed price on a tick worker, unless the symbol was
+      sold (or is being sold) since the tick was queued.
+    """
+    if f'T.{symbol}' not in self.streams or symbol in self.selling:
+      return
 
     self.monitoring(symbol, price)
 
@@ -290,4 +958,11 @@ class AlpacaTrade:
     return True
 
   def selector(self):
-    return []
\ No newline at end of file
+    return []
+
+  def order_ack(self, order, response):
+    """
+    Called with each order's final response as it arrives, on the
+    thread (or task) that got it.
+    """
+    pass
\ No newline at end of file
@@ -14,9 +14,13 @@ def is_dst(zonename):
 
   return now.astimezone(tz).dst() != timedelta(0)
 
-def get_time_till(market, till='next_open', log=True):
+def get_time_till(market, till='next_open', log=True, now=None):
+  """
+    Args: now: epoch seconds to count from (a simulated clock), defaults to now
+  """
+  now = now if now is not None else time.time()
   nyc_then = datetime.fromisoformat(market[till])
-  nyc_now = datetime.now(tz=pytz.timezone('US/Eastern'))
+  nyc_now = datetime.fromtimestamp(now, tz=pytz.timezone('US/Eastern'))
 
   local_offset = (
     (-int(time.timezone / 3600.0) + 1)
@@ -31,7 +35,7 @@ def get_time_till(market, till='next_open', log=True):
   ).strftime("%A, %B %d, %Y %I:%M:%S")
 
   local_date = datetime.fromtimestamp(
-          seconds + datetime.now().timestamp()
+          seconds + now
   ).strftime("%A, %B %d, %Y %I:%M:%S")
 
   open_close = till.split('_')[-1]
@@ -0,0 +1,91 @@
+from ..alpaca_modules.alpaca_indicators import *
+from ..alpaca_backtest import AlpacaBacktest
+from .bench_indicators import frames
+from .synthetic import universe
+
+import numpy as np
+import time
+import json
+import os
+
+"""
+
+  `AlpacaBacktest` loop engine against the vector engine, and against
+  the loop engine sharded over worker processes, on synthetic 5Min
+  bars, checking all of them produce the same trade logs and returns.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_backtest [symbols] [bars] [workers]
+
+"""
+
+
+class Crossover(AlpacaBacktest):
+  short_sma = 10
+  long_sma = 50
+
+  def indicators(self):
+    self.indicator(sma, 'close', periods=self.short_sma)
+    self.indicator(sma, 'close', periods=self.long_sma)
+    self.indicator(is_above, self.short_sma, self.long_sma)
+
+  def analyzer(self, symbol, price):
+    frame = self.data[symbol]
+    return frame['is_above'].iloc[self.idx] and price < frame['close'].iloc[self.idx-1]
+
+  def signals(self, symbol):
+    frame = self.data[symbol]
+    opens = frame['open'].to_numpy()
+    prev_close = np.roll(frame['close'].to_numpy(), 1)
+
+    return frame['is_above'].to_numpy() & (opens < prev_close)
+
+
+def backtest(engine, data, symbols, workers=1):
+  bt = Crossover('key', 'secret', engine=engine, workers=workers)
+  bt.symbols = list(symbols)
+  bt.data = {symbol: frame.copy() for symbol, frame in data.items()}
+  bt.indicators()
+
+  start = time.perf_counter()
+  bt.backtest()
+
+  return bt, time.perf_counter() - start
+
+
+def same_results(a, b):
+  assert a.symbols == b.symbols
+  assert a.trade_data == b.trade_data
+  assert a.trade_count == b.trade_count
+  assert a.trade_periods == b.trade_periods
+  for symbol in a.trade_return:
+    assert np.array_equal(a.trade_return[symbol], b.trade_return[symbol])
+
+
+def run(symbols=200, bars=1000, workers=os.cpu_count()):
+  data = frames(universe(symbols, bars, tf='5Min'))
+
+  loop, loop_seconds = backtest('loop', data, data)
+  vector, vector_seconds = backtest('vector', data, data)
+  parallel, parallel_seconds = backtest('loop', data, data, workers=workers)
+
+  same_results(loop, vector)
+  same_results(loop, parallel)
+
+  return {
+    'symbols': symbols,
+    'bars': bars,
+    'workers': workers,
+    'trades': sum(loop.trade_count.values()),
+    'loop_seconds': round(loop_seconds, 3),
+    'vector_seconds': round(vector_seconds, 3),
+    'parallel_loop_seconds': round(parallel_seconds, 3),
+    'vector_speedup': round(loop_seconds / vector_seconds, 1),
+    'parallel_speedup': round(loop_seconds / parallel_seconds, 1),
+  }
+
+
+
+if __name__ == '__main__':
+  import sys
+  print(json.dumps(run(*map(int, sys.argv[1:])), indent=2))
@@ -0,0 +1,89 @@
+from ..alpaca_modules.alpaca_api import Alpaca
+from .stub_server import serve, StubHandler
+from .synthetic import symbol_names, START, TIMEFRAMES
+
+import tempfile
+import time
+import json
+
+"""
+
+  Bytes and time per `historical_data` call with and without the
+  on-disk bar cache: a cold fill, a warm rerun, and a rerun after one
+  new bar per symbol. The last bar is first served still forming
+  (different close and volume): the cache must pick up its final
+  values.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_cache
+
+"""
+
+
+class CountingHandler(StubHandler):
+  bars_end = START + TIMEFRAMES['5Min'] * 1000
+  forming = False  # Serve the last bar as it looked half way through
+
+  def bars(self, path, query):
+    bars = super().bars(path, query)
+
+    for records in bars.values():
+      if self.forming and records and records[-1]['t'] == self.bars_end:
+        records[-1] = dict(records[-1], c=records[-1]['o'], v=records[-1]['v'] // 2)
+
+    return bars
+
+
+def measure(apc, symbols, limit):
+  CountingHandler.bytes_sent = 0
+  start = time.perf_counter()
+  data = apc.historical_data(symbols, tf='5Min', limit=limit)
+
+  return data, {
+    'seconds': round(time.perf_counter() - start, 3),
+    'bytes': CountingHandler.bytes_sent,
+  }
+
+
+def same(data, expected, symbols):
+  """
+    The cache must serve exactly what a full download would.
+  """
+  for symbol in symbols:
+    assert (data[symbol].values == expected[symbol].values).all(), symbol
+    assert (data[symbol].index == expected[symbol].index).all(), symbol
+
+
+def run(symbols=1000, limit=400):
+  server, url = serve(CountingHandler)
+  universe = symbol_names(symbols)
+  result = {'symbols': symbols, 'limit': limit}
+
+  with tempfile.TemporaryDirectory() as folder:
+    plain = Alpaca('key', 'secret')
+    cached = Alpaca('key', 'secret', cache_dir=folder)
+    plain.data_url = cached.data_url = url + '/v1'
+
+    expected, result['no_cache'] = measure(plain, universe, limit)
+
+    CountingHandler.forming = True
+    _, result['cold'] = measure(cached, universe, limit)
+    CountingHandler.forming = False
+
+    data, result['warm'] = measure(cached, universe, limit)
+    same(data, expected, universe)
+
+    CountingHandler.bars_end += TIMEFRAMES['5Min']
+    expected, _ = measure(plain, universe, limit)
+    data, result['one_new_bar'] = measure(cached, universe, limit)
+
+    same(data, expected, universe)
+
+  server.shutdown()
+
+  return result
+
+
+
+if __name__ == '__main__':
+  print(json.dumps(run(), indent=2))
@@ -0,0 +1,53 @@
+from ..alpaca_modules.alpaca_api import Alpaca
+from .stub_server import serve
+
+import requests
+import time
+import json
+
+"""
+
+  Requests/sec of `Alpaca.req` against a local stub server, comparing
+  a fresh connection per call (the old `getattr(requests, typ)`) with
+  the pooled keep-alive session.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_client
+
+"""
+
+
+def per_call(apc, calls):
+  for _ in range(calls):
+    requests.get(apc.base_url + '/clock', headers=apc.headers).json()
+
+def pooled(apc, calls):
+  for _ in range(calls):
+    apc.get_clock()
+
+def measure(func, apc, calls):
+  start = time.perf_counter()
+  func(apc, calls)
+  return calls / (time.perf_counter() - start)
+
+
+def run(calls=2000):
+  server, url = serve()
+  apc = Alpaca('key', 'secret')
+  apc.base_url = url + '/v2'
+
+  result = {
+    'calls': calls,
+    'per_call_req_per_sec': round(measure(per_call, apc, calls), 1),
+    'pooled_req_per_sec': round(measure(pooled, apc, calls), 1),
+  }
+
+  apc.close()
+  server.shutdown()
+
+  return result
+
+
+
+if __name__ == '__main__':
+  print(json.dumps(run(), indent=2))
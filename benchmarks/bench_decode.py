@@ -0,0 +1,105 @@
+from ..alpaca_modules.alpaca_api import Alpaca
+from ..alpaca_modules.bar_cache import decode_bars
+from ..alpaca_modules.panel import Panel
+from .synthetic import bar_records, symbol_names
+
+import pandas as pd
+import time
+import json
+
+"""
+
+  Decode time of one 200-symbol `/bars` chunk, the unit `historical_data`
+  handles per response: the previous per-symbol DataFrame path against
+  the one-pass NumPy decoding, to frames and to a `Panel`, and with the
+  regular-hours filter and New York index. Every result is checked
+  against the previous path.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_decode
+
+"""
+
+
+def legacy_parse(raw):
+  """
+    `parse_bars` as it was: a DataFrame per symbol from its list of dicts.
+  """
+  result = {}
+
+  for symbol, data in (raw or {}).items():
+    if not data:
+      continue
+
+    frame = pd.DataFrame(data).rename({
+      't': 'time', 'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume',
+    }, axis=1)
+    frame['time'] = pd.to_datetime(frame['time'], unit='s')
+    result[symbol] = frame.set_index('time')
+
+  return result
+
+
+def best(func, repeats):
+  seconds = []
+
+  for _ in range(repeats):
+    start = time.perf_counter()
+    func()
+    seconds.append(time.perf_counter() - start)
+
+  return min(seconds)
+
+
+def check(apc, raw, tf):
+  expected = legacy_parse(raw)
+  frames = apc.parse_bars(raw)
+
+  assert list(frames) == list(expected)
+  for symbol, frame in expected.items():
+    pd.testing.assert_frame_equal(frames[symbol], frame)
+
+  panel = apc.bars_result(decode_bars(raw), tf, as_panel=True)
+  reference = Panel.from_frames(expected)
+  assert panel.symbols == reference.symbols and panel.index.equals(reference.index)
+  pd.testing.assert_frame_equal(panel[panel.symbols[-1]], reference[panel.symbols[-1]])
+
+  # The session filter and timezone the old code computed and dropped
+  session = apc.parse_bars(raw, tf, regular_hours=True, tz='America/New_York')
+  for symbol, frame in list(expected.items())[:5]:
+    local = frame.tz_localize('UTC').tz_convert('America/New_York').between_time('09:30', '16:00', inclusive='left')
+    pd.testing.assert_frame_equal(session[symbol], local)
+
+
+def run(symbols=200, bars=(100, 1000), tf='1Min', repeats=5):
+  apc = Alpaca('key', 'secret', rate_limits=False)
+  result = []
+
+  for count in bars:
+    raw = {symbol: bar_records(symbol, count, tf) for symbol in symbol_names(symbols)}
+    check(apc, raw, tf)
+
+    timings = {
+      'legacy_frames': best(lambda: legacy_parse(raw), repeats),
+      'legacy_panel': best(lambda: Panel.from_frames(legacy_parse(raw)), repeats),
+      'decode_only': best(lambda: decode_bars(raw), repeats),
+      'frames': best(lambda: apc.parse_bars(raw), repeats),
+      'panel': best(lambda: apc.bars_result(decode_bars(raw), tf, as_panel=True), repeats),
+      'frames_regular_hours_ny': best(lambda: apc.parse_bars(raw, tf, regular_hours=True, tz='America/New_York'), repeats),
+    }
+
+    result.append({
+      'symbols': symbols,
+      'bars_per_symbol': count,
+      'seconds_per_chunk': timings,
+      'speedup_frames': timings['legacy_frames'] / timings['frames'],
+      'speedup_panel': timings['legacy_panel'] / timings['panel'],
+    })
+
+  print(json.dumps(result, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  run()
@@ -0,0 +1,97 @@
+from ..alpaca_modules.alpaca_indicators import *
+from ..alpaca_modules.indicator_graph import IndicatorGraph
+from ..alpaca_modules.panel import Panel
+from .bench_indicators import frames
+from .synthetic import universe
+
+import numpy as np
+import time
+import json
+import sys
+
+"""
+
+  Indicators declared on an `IndicatorGraph` against calling them one
+  after another, on `{symbol: DataFrame}` and on a `Panel`: the whole
+  history, and the trailing rows a screen reads (`window`). The strategy
+  declares `sma('close', 20)` twice and `is_above(20, 50)`, which shares
+  it; the graph runs it once. Checks the last rows against the eager
+  results.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_graph [symbols] [bars]
+
+"""
+
+
+DECLARED = [
+  (sma, ('close',), {'periods': 20}),
+  (sma, ('close', 20), {}),
+  (is_above, (20, 50), {}),
+  (bollinger_bands, (), {}),
+  (stochastic, (), {}),
+  (high_low, (), {}),
+]
+
+COLUMNS = ['20_close', '50_close', 'is_above', 'BB_width', '%D', 'high_low']
+
+
+def eager(data):
+  data = sma(data, 'close', periods=50)
+
+  for func, args, kwargs in DECLARED:
+    data = func(data, *args, **kwargs)
+
+  return data
+
+def lazy(data, window=None):
+  graph = IndicatorGraph()
+  data = graph.bind(data, window)
+
+  for func, args, kwargs in DECLARED:
+    graph.declare(func, *args, **kwargs)
+
+  return data
+
+def last_rows(data, symbols, rows):
+  """
+    Returns: --> (symbol, row, column) array of the trailing rows, read
+                 the way a strategy does (and so computing them)
+  """
+  return np.array([data[symbol][COLUMNS].to_numpy(dtype=float)[-rows:] for symbol in symbols])
+
+def timed(func, data):
+  start = time.perf_counter()
+  result = func(data)
+  return result, round(time.perf_counter() - start, 4)
+
+
+def run(symbols=500, bars=5000, window=5):
+  columns = universe(symbols, bars, '1Min')
+  names = list(columns)
+  result = {}
+
+  for store in ('frames', 'panel'):
+    make = (lambda: frames(columns)) if store == 'frames' else (lambda: Panel.from_frames(frames(columns)))
+
+    expected, eager_s = timed(lambda data: last_rows(eager(data), names, window), make())
+    full, full_s = timed(lambda data: last_rows(lazy(data), names, window), make())
+    trailing, window_s = timed(lambda data: last_rows(lazy(data, window), names, window), make())
+
+    # Rolling sums over a shorter span round differently (pandas keeps
+    # running sums across the whole history for `std`)
+    np.testing.assert_allclose(full, expected, rtol=1e-6, equal_nan=True)
+    np.testing.assert_allclose(trailing, expected, rtol=1e-6, equal_nan=True)
+
+    result[store] = {
+      'eager_s': eager_s, 'graph_s': full_s, 'graph_window_s': window_s,
+      'speedup_window': eager_s / window_s,
+    }
+
+  print(json.dumps({'symbols': symbols, 'bars': bars, 'window': window, **result}, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  run(*[int(arg) for arg in sys.argv[1:]])
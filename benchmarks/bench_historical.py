@@ -0,0 +1,51 @@
+from ..alpaca_modules.alpaca_api import Alpaca
+from .stub_server import serve, StubHandler
+from .synthetic import symbol_names
+
+import time
+import json
+
+"""
+
+  Wall-clock time of `Alpaca.historical_data` for a large universe
+  against a stub `/bars` endpoint with simulated latency, for a range
+  of worker counts.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_historical
+
+"""
+
+
+class SlowHandler(StubHandler):
+  bars_latency = 0.5
+
+
+def run(symbols=2000, limit=20, workers=(1, 4, 8, 16)):
+  server, url = serve(SlowHandler)
+  universe = symbol_names(symbols)
+  result = {'symbols': symbols, 'chunks': -(-symbols // 200), 'seconds': {}}
+  reference = None
+
+  for count in workers:
+    apc = Alpaca('key', 'secret', pool_size=count, workers=count)
+    apc.data_url = url + '/v1'
+
+    start = time.perf_counter()
+    data = apc.historical_data(universe, limit=limit)
+    result['seconds'][count] = round(time.perf_counter() - start, 3)
+
+    # Same symbols in the same order regardless of worker count
+    reference = reference or list(data)
+    assert list(data) == reference
+
+    apc.close()
+
+  server.shutdown()
+
+  return result
+
+
+
+if __name__ == '__main__':
+  print(json.dumps(run(), indent=2))
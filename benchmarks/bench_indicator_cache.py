@@ -0,0 +1,74 @@
+from ..alpaca_modules.indicator_cache import IndicatorCache
+from ..alpaca_modules.indicator_graph import IndicatorGraph
+from ..alpaca_modules.panel import Panel
+from .bench_graph import DECLARED, last_rows
+from .bench_indicators import frames
+from .synthetic import universe
+
+import numpy as np
+import time
+import json
+import sys
+
+"""
+
+  Two iterations over the same universe, the second after the last bar
+  of a tenth of the symbols moved (bars still forming on the liquid
+  names, the rest unchanged), with and without an `IndicatorCache`, on
+  `{symbol: DataFrame}` and on a `Panel`. Every column read is checked
+  against the uncached result.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_indicator_cache [symbols] [bars]
+
+"""
+
+
+def iterate(graph, data, names):
+  data = graph.bind(data)
+
+  for func, args, kwargs in DECLARED:
+    graph.declare(func, *args, **kwargs)
+
+  start = time.perf_counter()
+  rows = last_rows(data, names, len(next(iter(dict.values(data)))) if isinstance(data, dict) else len(data.index))
+
+  return rows, time.perf_counter() - start
+
+
+def run(symbols=500, bars=1000, changed=0.1):
+  first = universe(symbols, bars, '1Min')
+  names = list(first)
+
+  # The second fetch: the last close (and high) of some symbols moved
+  second = {symbol: {key: values.copy() for key, values in columns.items()} for symbol, columns in first.items()}
+  for symbol in names[:int(symbols * changed)]:
+    second[symbol]['c'][-1] *= 1.001
+    second[symbol]['h'][-1] = max(second[symbol]['h'][-1], second[symbol]['c'][-1])
+
+  result = {'symbols': symbols, 'bars': bars, 'changed': changed}
+
+  for store in ('frames', 'panel'):
+    make = (lambda bars: frames(bars)) if store == 'frames' else (lambda bars: Panel.from_frames(frames(bars)))
+    plain, cached = IndicatorGraph(), IndicatorGraph(cache=IndicatorCache())
+
+    iterate(plain, make(first), names)
+    _, cold = iterate(cached, make(first), names)
+
+    expected, uncached_s = iterate(plain, make(second), names)
+    rows, cached_s = iterate(cached, make(second), names)
+
+    np.testing.assert_array_equal(rows, expected)
+
+    result[store] = {
+      'first_s': cold, 'uncached_s': uncached_s, 'cached_s': cached_s,
+      'speedup': uncached_s / cached_s, 'cache': cached.cache.stats(),
+    }
+
+  print(json.dumps(result, indent=2, default=str))
+
+  return result
+
+
+if __name__ == '__main__':
+  run(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,86 @@
+from ..alpaca_modules.alpaca_indicators import *
+from ..alpaca_modules.panel import Panel
+from .synthetic import universe
+
+import pandas as pd
+import numpy as np
+import time
+import json
+
+"""
+
+  Per-symbol pandas indicators on `{symbol: DataFrame}` against the
+  whole-universe kernels on a `Panel`, on synthetic data. Also checks
+  that both produce the same columns.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_indicators [symbols] [bars]
+
+"""
+
+
+INDICATORS = [
+  ('MACD', MACD, (), {}),
+  ('stochastic', stochastic, (), {}),
+  ('ATR', ATR, (), {}),
+  ('sma', sma, ('close',), {'periods': 20}),
+  ('sma_long', sma, ('close',), {'periods': 200}),
+  ('is_above', is_above, (20, 200), {}),
+  ('high_low', high_low, (), {}),
+  ('bollinger_bands', bollinger_bands, (), {}),
+]
+
+COLUMNS = ['macd', 'signal', 'HH', 'LL', '%K', '%D', 'ATR', '20_close',
+           '200_close', 'is_above', 'high_low', 'BB_width']
+
+
+def frames(columns):
+  return {
+    symbol: pd.DataFrame({
+      'open': bars['o'], 'high': bars['h'], 'low': bars['l'],
+      'close': bars['c'], 'volume': bars['v'],
+    }, index=pd.Index(pd.to_datetime(bars['t'], unit='s'), name='time'))
+    for symbol, bars in columns.items()
+  }
+
+def timed(data):
+  seconds = {}
+
+  for name, func, args, kwargs in INDICATORS:
+    start = time.perf_counter()
+    data = func(data, *args, **kwargs)
+    seconds[name] = round(time.perf_counter() - start, 4)
+
+  return data, seconds
+
+
+def run(symbols=5000, bars=1000):
+  columns = universe(symbols, bars)
+  frame_data = frames(columns)
+  panel = Panel.from_frames(frame_data)
+
+  frame_data, looped = timed(frame_data)
+  panel, vectorized = timed(panel)
+
+  # Spot check a sample of symbols against the pandas results
+  for symbol in list(frame_data)[::max(1, symbols // 50)]:
+    for column in COLUMNS:
+      expected = frame_data[symbol][column].to_numpy(dtype=float)
+      actual = panel.field(column)[:, panel.rows[symbol]].astype(float)
+      assert np.allclose(expected, actual, equal_nan=True, rtol=1e-7, atol=1e-9), (symbol, column)
+
+  return {
+    'symbols': symbols,
+    'bars': bars,
+    'per_symbol_seconds': looped,
+    'vectorized_seconds': vectorized,
+    'speedup': {
+      name: round(looped[name] / max(vectorized[name], 1e-9), 1) for name in looped
+    },
+  }
+
+
+
+if __name__ == '__main__':
+  import sys
+  print(json.dumps(run(*map(int, sys.argv[1:])), indent=2))
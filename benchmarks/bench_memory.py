@@ -0,0 +1,111 @@
+from ..alpaca_modules.alpaca_indicators import *
+from ..alpaca_modules import alpaca_api
+from ..alpaca_screen import AlpacaScreen
+from .stub_server import StubHandler, serve
+from contextlib import redirect_stdout
+
+import subprocess
+import argparse
+import json
+import sys
+import io
+
+"""
+
+  Memory of one `AlpacaScreen.run` over a large universe served by the
+  local stub, for the `{symbol: DataFrame}` dict, the float64 `Panel`
+  and compact mode with its scratch indicators marked transient. Each
+  mode runs in its own process so resident memory is comparable; the
+  data store size and the per stage memory come from the profiler.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_memory
+    python -m steamboat.benchmarks.bench_memory --symbols 1000 --bars 1000
+
+"""
+
+
+MODES = {
+  'dict': {},
+  'panel': {'panel': True},
+  'compact': {'compact': True},
+}
+
+
+class Screen(AlpacaScreen):
+
+  def indicators(self):
+    self.indicator(sma, 'close', periods=10, transient=True)
+    self.indicator(sma, 'close', periods=50, transient=True)
+    self.indicator(is_above, 10, 50)
+    self.indicator(high_low, transient=True)
+
+  def stock_screen(self, ticker):
+    return True
+
+  def analyze(self, symbol, price):
+    return self.data[symbol]['is_above'].iloc[-1]
+
+
+def measure(mode, symbols, bars, tf):
+  """
+    Returns: --> memory of one screen in `mode`, in this process
+  """
+  StubHandler.screener_count = symbols
+  server, url = serve()
+  alpaca_api.SCREENER_ENDPOINT = url + '/api/screener/stocks'
+
+  # The profiler only records memory in compact mode; turn it on for all
+  screen = Screen('bench', 'bench', periods=tf, data_limit=bars, **MODES[mode])
+  screen.apc.base_url, screen.apc.data_url = url + '/v2', url + '/v1'
+  screen.apc.limiter = None
+  screen.profiler.memory = True
+
+  with redirect_stdout(io.StringIO()):
+    screen.run()
+
+  server.shutdown()
+  record = screen.profiler.last
+
+  return {
+    'symbols': len(screen.symbols),
+    'seconds': record['total'],
+    'data_mb': {stage: usage['data'] / 2**20 for stage, usage in record['memory'].items()},
+    'rss_delta_mb': {stage: usage['delta'] / 2**20 for stage, usage in record['memory'].items()},
+    'peak_rss_mb': record['peak_rss'] / 2**20,
+  }
+
+
+def run(symbols=500, bars=1000, tf='1Min'):
+  """
+    `symbols` per exchange, three exchanges.
+  """
+  result = {}
+
+  for mode in MODES:
+    out = subprocess.run([
+      sys.executable, '-m', __spec__.name, '--mode', mode,
+      '--symbols', str(symbols), '--bars', str(bars), '--tf', tf,
+    ], check=True, capture_output=True, text=True).stdout
+    result[mode] = json.loads(out)
+
+  for mode in ('panel', 'compact'):
+    result[mode]['data_vs_dict'] = result[mode]['data_mb']['analyze'] / result['dict']['data_mb']['analyze']
+
+  print(json.dumps(result, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--mode', choices=list(MODES))
+  parser.add_argument('--symbols', type=int, default=500)
+  parser.add_argument('--bars', type=int, default=1000)
+  parser.add_argument('--tf', default='1Min')
+  args = parser.parse_args()
+
+  if args.mode:
+    print(json.dumps(measure(args.mode, args.symbols, args.bars, args.tf)))
+  else:
+    run(args.symbols, args.bars, args.tf)
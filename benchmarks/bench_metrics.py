@@ -0,0 +1,59 @@
+from ..alpaca_modules.alpaca_api import Alpaca
+from ..alpaca_modules.metrics import Metrics
+from .stub_server import StubHandler, serve
+from .synthetic import symbol_names
+
+import time
+import json
+
+"""
+
+  One simulated iteration against the stub (clock, account, bars for
+  a universe, a few orders and a cancel), then the per-endpoint
+  metrics it left: the JSON lines and Prometheus exports, plus the cost
+  of recording one call. The cancel answers 204, which is no error.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_metrics
+
+"""
+
+
+def run(symbols=1000, latency=0.02, records=100000):
+  StubHandler.bars_latency = latency
+  server, url = serve()
+
+  apc = Alpaca('key', 'secret', rate_limits=False)
+  apc.base_url, apc.data_url = url + '/v2', url + '/v1'
+
+  apc.get_clock()
+  apc.get_account()
+  apc.historical_data(symbol_names(symbols), tf='1D', limit=100)
+  for symbol in symbol_names(5):
+    apc.buy(symbol, 1)
+  apc.get_last_trade('AAPL')
+  apc.cancel_orders('order-1')
+
+  cancel = apc.metrics.snapshot()['DELETE /orders/{}']
+  assert cancel['statuses'] == {'204': 1} and cancel['errors'] == 0, cancel
+
+  print(apc.metrics.json_lines())
+  print(apc.metrics.prometheus())
+
+  metrics = Metrics()
+  start = time.perf_counter()
+  for i in range(records):
+    metrics.record('get', '/bars/1D', 200, 0.01, bytes_received=1000)
+  overhead = (time.perf_counter() - start) / records
+
+  result = {
+    'endpoints': sorted(apc.metrics.snapshot()),
+    'record_overhead_us': overhead * 1e6,
+  }
+  print(json.dumps(result, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  run()
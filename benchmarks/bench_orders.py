@@ -0,0 +1,85 @@
+from ..alpaca_modules.alpaca_api import Alpaca
+from ..alpaca_modules.alpaca_async import AsyncAlpaca, aiohttp
+from ..alpaca_modules.order_dispatch import OrderDispatcher
+from .stub_server import StubHandler, serve
+from contextlib import redirect_stdout
+
+import asyncio
+import time
+import json
+import sys
+import io
+
+"""
+
+  Entry latency of a batch of orders against the local stub, which
+  takes `latency` seconds to answer each one: the orders sent one
+  after another, against `OrderDispatcher` on the thread pool and on
+  the asyncio client. A second batch has some answers lost (recorded
+  by the stub, answered with a 503) and checks that every order is
+  acknowledged and none is placed twice.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_orders [orders] [latency_ms]
+
+"""
+
+
+def send(apc, order):
+  return apc.buy(order['symbol'], order['qty'], client_order_id=order.get('client_order_id'))
+
+def batch(count):
+  return [{'symbol': 'S{:05d}'.format(i), 'qty': 1} for i in range(count)]
+
+def connect(apc, url):
+  apc.base_url, apc.data_url = url + '/v2', url + '/v1'
+  apc.limiter = None
+  return apc
+
+def timed(func):
+  start = time.perf_counter()
+  result = func()
+  return result, time.perf_counter() - start
+
+
+async def dispatch_async(url, dispatcher, orders):
+  async with connect(AsyncAlpaca('bench', 'bench'), url) as apc:
+    return await dispatcher.dispatch_async(apc, orders)
+
+
+def run(orders=10, latency_ms=50, lost=3):
+  StubHandler.orders_latency = latency_ms / 1000
+  server, url = serve()
+  apc = connect(Alpaca('bench', 'bench', pool_size=orders), url)
+  dispatcher = OrderDispatcher(send, workers=orders)
+  result = {'orders': orders, 'latency_ms': latency_ms}
+
+  with redirect_stdout(io.StringIO()):
+    _, result['sequential_s'] = timed(lambda: [send(apc, order) for order in batch(orders)])
+    _, result['dispatcher_s'] = timed(lambda: dispatcher.dispatch(apc, batch(orders)))
+
+    if aiohttp is not None:
+      _, result['dispatcher_async_s'] = timed(lambda: asyncio.run(dispatch_async(url, dispatcher, batch(orders))))
+
+    # Lost answers: the orders went through, the client never heard
+    StubHandler.submitted.clear()
+    StubHandler.lose_orders = lost
+    sent = batch(orders)
+    responses = dispatcher.dispatch(apc, sent)
+
+  assert sent == batch(orders), 'the caller\'s orders were changed'
+  assert all(response.get('status') == 'accepted' for response in responses)
+  assert len(StubHandler.submitted) == orders, 'an order was placed twice'
+  assert sorted(order['symbol'] for order in StubHandler.submitted.values()) == [order['symbol'] for order in batch(orders)]
+
+  result['speedup'] = result['sequential_s'] / result['dispatcher_s']
+  result['with_lost_answers'] = dispatcher.stats()
+  server.shutdown()
+
+  print(json.dumps(result, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  run(*[int(arg) for arg in sys.argv[1:]])
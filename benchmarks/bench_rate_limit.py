@@ -0,0 +1,84 @@
+from ..alpaca_modules.alpaca_api import Alpaca
+from ..alpaca_modules import rate_limit
+from .stub_server import StubHandler, serve
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import json
+
+"""
+
+  A burst of data pulls and account polls from several threads, with
+  orders placed in the middle, against a stub that enforces a budget
+  (429 + Retry-After past it). Compares the client without pacing
+  (`rate_limits=False`) and with the shared token bucket: 429s
+  returned by the server, requests that ended in an error, wall time
+  and order latency.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_rate_limit
+
+"""
+
+
+def burst(apc, threads, calls, orders):
+  failed = []
+  latency = []
+
+  def pull(i):
+    for _ in range(calls):
+      res = (apc.get_bar_data('1Min', {'symbols': 'AAA', 'limit': 5}) if i % 2 else apc.get_positions())
+
+      if not isinstance(res, (dict, list)) or (isinstance(res, dict) and 'code' in res):
+        failed.append(res)
+
+  def place():
+    time.sleep(0.2)
+
+    for _ in range(orders):
+      start = time.perf_counter()
+      res = apc.buy('AAA', 1)
+      latency.append(time.perf_counter() - start)
+
+      if not res or 'id' not in res:
+        failed.append(res)
+
+      time.sleep(0.05)
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(threads + 1) as pool:
+    jobs = [pool.submit(pull, i) for i in range(threads)] + [pool.submit(place)]
+    [job.result() for job in jobs]
+
+  return {
+    'wall_s': time.perf_counter() - start,
+    'failed': len(failed),
+    'order_latency_mean_s': sum(latency) / len(latency),
+    'order_latency_max_s': max(latency),
+  }
+
+
+def run(per_second=40, burst_size=10, threads=8, calls=20, orders=10):
+  StubHandler.rate_limit = per_second
+  server, url = serve()
+  result = {'server_rate': per_second, 'requests': threads * calls + orders}
+  limits = dict(rate_limit.DEFAULT_LIMITS, per_minute=per_second * 60 * 0.95, burst=burst_size)
+
+  for name, limits in [('unpaced', False), ('paced', limits)]:
+    StubHandler.throttled = 0
+    StubHandler.budget = {}
+    rate_limit.limiters.clear()
+
+    apc = Alpaca('key', 'secret', rate_limits=limits, backoff_factor=0.05)
+    apc.base_url, apc.data_url = url + '/v2', url + '/v1'
+
+    result[name] = dict(burst(apc, threads, calls, orders), server_429s=StubHandler.throttled)
+    apc.close()
+
+  print(json.dumps(result, indent=2))
+  return result
+
+
+if __name__ == '__main__':
+  run()
@@ -0,0 +1,92 @@
+from ..alpaca_modules import alpaca_api
+from ..alpaca_modules.alpaca_api import get_symbols, SCREENER_HEADERS
+from .stub_server import StubHandler, serve
+
+import tempfile
+import requests
+import time
+import json
+
+"""
+
+  `get_symbols` against a stub of the nasdaq screener: the old
+  sequential fetch with per-row parsing, then a cold cached call
+  (concurrent fetch, bulk parse), a warm in-memory call and a warm
+  call from the on-disk snapshot (fresh process).
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_symbols
+
+"""
+
+
+EXCHANGES = ['nyse', 'nasdaq', 'amex']
+
+
+def screener(ticker):
+  return 5 < ticker['lastsale'] < 50 and ticker['pctchange'] > 0
+
+
+def legacy(url, exchanges, limit=10000, marketcap='small'):
+  result = []
+
+  for exchange in exchanges:
+    param = {'tableonly': False, 'limit': limit, 'exchange': exchange, 'marketcap': marketcap}
+    res = requests.get(url, headers=SCREENER_HEADERS, params=param).json()
+
+    for ticker in res['data']['table']['rows']:
+      if ticker['pctchange'][-1] != '%':
+        ticker['pctchange'] = '0.0%'
+
+      ticker['symbol'] = ticker['symbol'].split(' ')[0]
+      ticker['exchange'] = param['exchange']
+      ticker['lastsale'] = float(ticker['lastsale'][1:].replace(',', ''))
+      ticker['pctchange'] = float(ticker['pctchange'][:-2])/100
+
+      if screener(ticker):
+        result.append(ticker)
+
+  return result
+
+
+def timed(func, *args, **kwargs):
+  start = time.perf_counter()
+  result = func(*args, **kwargs)
+  return time.perf_counter() - start, result
+
+
+def run(latency=0.25, rows=3000):
+  StubHandler.screener_latency = latency
+  StubHandler.screener_count = rows
+  server, url = serve()
+  alpaca_api.SCREENER_ENDPOINT = url + '/api/screener/stocks'
+  cache_dir = tempfile.mkdtemp()
+
+  legacy_s, expected = timed(legacy, alpaca_api.SCREENER_ENDPOINT, EXCHANGES)
+  cold_s, cold = timed(get_symbols, exchanges=EXCHANGES, screener=screener, cache_dir=cache_dir)
+  warm_s, warm = timed(get_symbols, exchanges=EXCHANGES, screener=screener, cache_dir=cache_dir)
+
+  alpaca_api.symbols_cache.clear()
+  disk_s, disk = timed(get_symbols, exchanges=EXCHANGES, screener=screener, cache_dir=cache_dir)
+
+  assert cold == warm == disk
+  assert [t['symbol'] for t in cold] == [t['symbol'] for t in expected]
+  assert all(abs(a['pctchange'] - b['pctchange']) < 1e-12 for a, b in zip(cold, expected))
+
+  result = {
+    'exchanges': len(EXCHANGES),
+    'rows_per_exchange': rows,
+    'latency_s': latency,
+    'passed': len(cold),
+    'legacy_s': legacy_s,
+    'cold_s': cold_s,
+    'warm_memory_s': warm_s,
+    'warm_disk_s': disk_s,
+  }
+  print(json.dumps(result, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  run()
@@ -0,0 +1,75 @@
+from ..alpaca_modules.tick_buffer import TickBuffer
+
+import random
+import time
+import json
+
+"""
+
+  A burst of trades fed to a slow `monitoring` handler, either inline
+  on the receiving thread (the old `on_message` path) or through the
+  coalescing `TickBuffer`. Reports how long the receiver was blocked,
+  how many evaluations ran and how stale the evaluated prices were
+  (ticks behind the newest one for that symbol).
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.bench_ticks
+
+"""
+
+
+def burst(symbols, ticks, seed=0):
+  rng = random.Random(seed)
+  return [(rng.choice(symbols), i) for i in range(ticks)]
+
+
+def run(symbols=20, ticks=5000, handle_ms=2, workers=4):
+  names = ['S{}'.format(i) for i in range(symbols)]
+  trades = burst(names, ticks)
+  rank, count = {}, {}
+
+  for symbol, seq in trades:
+    rank[seq] = count.get(symbol, 0)
+    count[symbol] = rank[seq] + 1
+
+  def handler(stale):
+    def handle(symbol, seq):
+      time.sleep(handle_ms / 1000)
+      stale.append(count[symbol] - 1 - rank[seq])
+    return handle
+
+  result = {'symbols': symbols, 'ticks': ticks, 'handle_ms': handle_ms}
+
+  stale = []
+  handle = handler(stale)
+  start = time.perf_counter()
+  for symbol, seq in trades:
+    handle(symbol, seq)
+  result['inline'] = {
+    'receiver_s': time.perf_counter() - start,
+    'evaluations': len(stale),
+    'mean_stale_ticks': sum(stale) / len(stale),
+  }
+
+  stale = []
+  buffer = TickBuffer(handler(stale), workers=workers).start()
+  start = time.perf_counter()
+  for symbol, seq in trades:
+    buffer.put(symbol, seq)
+  received = time.perf_counter() - start
+  buffer.drain()
+  result['buffered'] = {
+    'receiver_s': received,
+    'drained_s': time.perf_counter() - start,
+    'evaluations': len(stale),
+    'mean_stale_ticks': sum(stale) / len(stale),
+    **buffer.stats(),
+  }
+  buffer.stop()
+
+  print(json.dumps(result, indent=2))
+  return result
+
+
+if __name__ == '__main__':
+  run()
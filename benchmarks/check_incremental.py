@@ -0,0 +1,97 @@
+from ..alpaca_modules.alpaca_indicators import *
+from ..alpaca_modules.alpaca_incremental import IndicatorSet, STREAMING
+from .bench_indicators import frames
+from .synthetic import universe
+
+import numpy as np
+import json
+import sys
+
+"""
+
+  `IndicatorSet` against the batch indicators, for every entry of
+  `STREAMING`. Each symbol is seeded from its history but for the last
+  `live` bars, which then arrive one at a time the way a forming bar
+  does: first partial values, then revised, then final. The seeded last
+  bar is revised too. Every column must equal the batch result over the
+  final bars.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.check_incremental [symbols] [bars]
+
+"""
+
+
+DECLARED = [
+  (MACD, (), {}),
+  (stochastic, (), {}),
+  (ATR, (), {}),
+  (sma, ('close', 20), {}),
+  (sma, ('close', 50), {}),
+  (is_above, (20, 50), {}),
+  (high_low, (), {}),
+  (bollinger_bands, (), {}),
+]
+
+
+def forming(bar, share):
+  """
+    Returns: --> `bar` as it looked `share` of the way through
+  """
+  close = bar['open'] + (bar['close'] - bar['open']) * share
+
+  return dict(
+    bar, close=close, volume=int(bar['volume'] * share),
+    high=max(bar['open'], close), low=min(bar['open'], close),
+  )
+
+def bar_dicts(frame):
+  return [dict(zip(frame.columns, values)) for values in frame.itertuples(index=False)]
+
+
+def run(symbols=50, bars=500, live=20):
+  assert {func for func, _, _ in DECLARED} == set(STREAMING)
+
+  expected = frames(universe(symbols, bars))
+  raw = {symbol: frame.copy() for symbol, frame in expected.items()}
+
+  for func, args, kwargs in DECLARED:
+    expected = func(expected, *args, **kwargs)
+
+  indicators = IndicatorSet()
+  for func, args, kwargs in DECLARED:
+    indicators.declare(func, *args, **kwargs)
+
+  columns = [column for column in expected[next(iter(expected))].columns if column not in raw[next(iter(raw))]]
+  updates = 0
+
+  for symbol, frame in raw.items():
+    history, final = frame.iloc[:-live], bar_dicts(frame.iloc[-live:])
+    seeded = bar_dicts(history)
+
+    # Seeded while its last bar was still forming
+    partial = history.copy()
+    partial.iloc[-1] = list(forming(seeded[-1], 0.5).values())
+    indicators.seed(symbol, partial)
+    rows = [indicators.revise(symbol, seeded[-1])]
+
+    for bar in final:
+      indicators.update(symbol, forming(bar, 0.3))
+      indicators.revise(symbol, forming(bar, 0.7))
+      rows.append(indicators.revise(symbol, bar))
+      updates += 3
+
+    actual = np.array([[row[column] for column in columns] for row in rows], dtype=float)
+    np.testing.assert_allclose(
+      actual, expected[symbol][columns].iloc[-live - 1:].to_numpy(dtype=float),
+      rtol=1e-7, atol=1e-9, equal_nan=True, err_msg=symbol
+    )
+
+  result = {'symbols': symbols, 'bars': bars, 'columns': columns, 'updates': updates, 'ok': True}
+  print(json.dumps(result, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  run(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,89 @@
+from ..alpaca_modules.indicator_cache import IndicatorCache
+from ..alpaca_modules.indicator_graph import IndicatorGraph
+from ..alpaca_modules.panel import Panel
+from .bench_graph import DECLARED, last_rows
+from .bench_indicators import frames
+from .synthetic import universe, TIMEFRAMES
+
+import numpy as np
+import json
+import sys
+
+"""
+
+  `IndicatorCache` fingerprints on symbols whose bars end at different
+  times, on `{symbol: DataFrame}` and on a `Panel`. Half the symbols
+  stop one bar early. Then:
+    revised: the last bar of some of those symbols is revised, while
+             the others still have a later bar. They must be recomputed.
+    new bar: one symbol gets a new bar, past the end of every other
+             symbol. Only that one must be recomputed.
+  Every column read is checked against an uncached graph.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.check_indicator_cache [symbols] [bars]
+
+"""
+
+
+def iterate(graph, data, names, rows=100):
+  data = graph.bind(data)
+
+  for func, args, kwargs in DECLARED:
+    graph.declare(func, *args, **kwargs)
+
+  return last_rows(data, names, rows)
+
+def copy(columns):
+  return {symbol: {key: values.copy() for key, values in bars.items()} for symbol, bars in columns.items()}
+
+
+def run(symbols=100, bars=500, revised=5):
+  first = universe(symbols, bars, '1Min')
+  names = list(first)
+
+  for symbol in names[1::2]:
+    first[symbol] = {key: values[:-1] for key, values in first[symbol].items()}
+
+  steps = {'revised': copy(first), 'new bar': copy(first)}
+
+  for symbol in names[1::2][:revised]:
+    steps['revised'][symbol]['c'][-1] *= 1.001
+    steps['revised'][symbol]['h'][-1] = max(steps['revised'][symbol]['h'][-1], steps['revised'][symbol]['c'][-1])
+
+  bar = {key: values[-1:] for key, values in first[names[0]].items()}
+  bar['t'] = bar['t'] + TIMEFRAMES['1Min']
+  steps['new bar'][names[0]] = {key: np.concatenate([values, bar[key]]) for key, values in first[names[0]].items()}
+
+  changed = {'revised': revised, 'new bar': 1}
+  result = {'symbols': symbols, 'bars': bars}
+
+  for store in ('frames', 'panel'):
+    make = (lambda bars: frames(bars)) if store == 'frames' else (lambda bars: Panel.from_frames(frames(bars)))
+    result[store] = {}
+
+    for step, second in steps.items():
+      plain, cached = IndicatorGraph(), IndicatorGraph(cache=IndicatorCache())
+
+      iterate(cached, make(first), names)
+      misses = cached.cache.misses
+
+      expected = iterate(plain, make(second), names)
+      rows = iterate(cached, make(second), names)
+
+      np.testing.assert_allclose(rows, expected, rtol=1e-7, atol=1e-9, equal_nan=True, err_msg=f'{store} {step}')
+
+      # Every cached node misses once per changed symbol, and only then
+      recomputed = cached.cache.misses - misses
+      assert recomputed == misses // symbols * changed[step], (store, step, recomputed)
+
+      result[store][step] = {'recomputed': recomputed, 'cache': cached.cache.stats()}
+
+  result['ok'] = True
+  print(json.dumps(result, indent=2, default=str))
+
+  return result
+
+
+if __name__ == '__main__':
+  run(*[int(arg) for arg in sys.argv[1:]])
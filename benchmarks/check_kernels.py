@@ -0,0 +1,77 @@
+from .bench_indicators import INDICATORS, COLUMNS, frames
+from .bench_graph import eager, lazy, last_rows
+from ..alpaca_modules.panel import Panel
+from .synthetic import universe
+
+import numpy as np
+import json
+import sys
+
+"""
+
+  The panel kernels against the per-symbol pandas indicators on
+  misaligned timestamps: symbols listed late, halted before the end,
+  and missing bars scattered through their history, so the panel's
+  shared index has rows most symbols have no bar on. Every column of
+  every symbol's frame must match, and so must the trailing rows of a
+  windowed `IndicatorGraph`.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.check_kernels [symbols] [bars]
+
+"""
+
+
+def misaligned(symbols, bars, seed=0):
+  """
+    Returns: --> the `universe` columns with bars taken out of each symbol
+  """
+  rng = np.random.default_rng(seed)
+  columns = universe(symbols, bars, '1Min')
+
+  for i, (symbol, values) in enumerate(columns.items()):
+    keep = rng.random(bars) > rng.uniform(0, 0.3)
+
+    if i % 3 == 1:
+      keep[:rng.integers(bars // 2)] = False   # Listed late
+    if i % 3 == 2:
+      keep[-rng.integers(1, bars // 4):] = False  # Halted
+
+    columns[symbol] = {key: column[keep] for key, column in values.items()}
+
+  return columns
+
+
+def run(symbols=300, bars=1000, window=5):
+  columns = misaligned(symbols, bars)
+  names = list(columns)
+
+  expected, panel = frames(columns), Panel.from_frames(frames(columns))
+  gaps = 1 - panel.present.mean()
+
+  for name, func, args, kwargs in INDICATORS:
+    expected = func(expected, *args, **kwargs)
+    panel = func(panel, *args, **kwargs)
+
+  for symbol in names:
+    for column in COLUMNS:
+      np.testing.assert_allclose(
+        panel[symbol][column].to_numpy(dtype=float), expected[symbol][column].to_numpy(dtype=float),
+        rtol=1e-7, atol=1e-9, equal_nan=True, err_msg=f'{symbol} {column}'
+      )
+
+  # The window keeps every symbol's own trailing bars
+  eager_rows = last_rows(eager(frames(columns)), names, window)
+  np.testing.assert_allclose(
+    last_rows(lazy(Panel.from_frames(frames(columns)), window), names, window), eager_rows,
+    rtol=1e-6, equal_nan=True
+  )
+
+  result = {'symbols': symbols, 'bars': bars, 'gap_share': round(float(gaps), 3), 'ok': True}
+  print(json.dumps(result, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  run(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,219 @@
+from ..alpaca_trade import AlpacaTrade
+from ..alpaca_modules.alpaca_indicators import sma
+from ..alpaca_modules.alpaca_async import AsyncAlpaca, AsyncAlpacaStreaming, aiohttp
+from ..alpaca_modules.bar_builder import period_start
+from .stub_server import StubHandler, serve
+from .ws_stub import serve as serve_ws
+from .synthetic import START
+
+import pandas as pd
+import numpy as np
+import asyncio
+import random
+import time
+import json
+
+"""
+
+  Runs `AlpacaTrade(live_bars=True)` against the REST stub and the
+  websocket stand-in: one history load over REST, then trades pushed
+  on the stream become 1Min bars appended to `data`, with no further
+  `/bars` requests. Checks the built bars against a pandas resample
+  of the same trades, in both the batch and incremental modes. With
+  daily bars, trades on the day of the last REST bar (still forming
+  when fetched) are merged into it rather than left out. The same
+  through the `run_async` socket when aiohttp is installed.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.check_live_bars
+
+"""
+
+
+class CountingHandler(StubHandler):
+  bars_requests = 0
+
+  def bars(self, path, query):
+    type(self).bars_requests += 1
+    return super().bars(path, query)
+
+
+class Strategy(AlpacaTrade):
+
+  def indicators(self):
+    self.indicator(sma, 'close', 5)
+
+
+def trades(symbols, start, minutes, per_minute=20, seed=0):
+  rng = random.Random(seed)
+  rows = []
+
+  for minute in range(minutes):
+    for _ in range(per_minute):
+      for symbol in symbols:
+        t = start + 60 * minute + rng.random() * 60
+        rows.append({'T': symbol, 'p': round(100 + rng.gauss(0, 1), 2), 's': rng.randint(1, 500), 't': int(t * 1e9)})
+
+  return sorted(rows, key=lambda row: row['t'])
+
+
+def expected(rows, symbol):
+  frame = pd.DataFrame([row for row in rows if row['T'] == symbol])
+  frame.index = pd.to_datetime(frame['t'] // 10**9, unit='s')
+  bars = frame.resample('1min').agg({'p': ['first', 'max', 'min', 'last'], 's': 'sum'}).dropna()
+  bars.columns = ['open', 'high', 'low', 'close', 'volume']
+  bars.index.name = 'time'
+
+  return bars
+
+
+def check(incremental, symbols=('AAA', 'BBB'), limit=50, minutes=6):
+  server, url = serve(CountingHandler)
+  ws = serve_ws()
+  CountingHandler.bars_requests = 0
+
+  strategy = Strategy('key', 'secret', bar_period='1Min', data_limit=limit, live_bars=True,
+                      incremental=incremental)
+  strategy.apc.data_url = url + '/v1'
+  strategy.apc_stream.url = ws.url
+  strategy.symbols = list(symbols)
+
+  load = strategy.update_data if incremental else strategy.update_history
+  strategy.stream_bars()
+  load()
+  assert CountingHandler.bars_requests == 1
+  assert ws.wait(lambda: any(m.get('action') == 'listen' for m in ws.messages))
+
+  # Trades for the minutes after the last REST bar
+  rows = trades(symbols, START + 60 * (limit + 1), minutes)
+  for row in rows:
+    ws.push({'stream': 'T.' + row['T'], 'data': row})
+
+  deadline = time.time() + 10
+  while strategy.live_bars.price(rows[-1]['T']) != rows[-1]['p'] and time.time() < deadline:
+    time.sleep(0.01)
+
+  load()
+  assert CountingHandler.bars_requests == 1
+  compare(strategy, rows, symbols, limit, minutes)
+
+  strategy.apc_stream.close()
+  strategy.ticks.stop()
+  server.shutdown()
+  ws.shutdown()
+
+  return {'incremental': incremental, 'rest_bars_requests': CountingHandler.bars_requests,
+          'streamed_trades': len(rows), 'bars_built': minutes * len(symbols)}
+
+
+def compare(strategy, rows, symbols, limit, minutes):
+  for symbol in symbols:
+    frame = strategy.data[symbol]
+    built = frame[['open', 'high', 'low', 'close', 'volume']].iloc[-minutes:]
+    pd.testing.assert_frame_equal(built, expected(rows, symbol), check_dtype=False, check_freq=False)
+
+    closes = frame['close'].to_numpy()
+    assert np.allclose(frame['5_close'].iloc[-1], closes[-5:].mean())
+    assert len(frame) == limit
+
+
+async def check_async(incremental, symbols=('AAA', 'BBB'), limit=50, minutes=6):
+  """
+    `check` with the bars read by `live_monitoring_async` and
+    subscribed by `stream_bars_async`, as under `run_async`.
+  """
+  server, url = serve(CountingHandler)
+  ws = serve_ws()
+  CountingHandler.bars_requests = 0
+
+  strategy = Strategy('key', 'secret', bar_period='1Min', data_limit=limit, live_bars=True,
+                      incremental=incremental, allow_daytrading=True)
+  strategy.apc.data_url = url + '/v1'
+  strategy.symbols = list(symbols)
+
+  async with AsyncAlpaca('key', 'secret') as apc:
+    strategy.apc_async = apc
+    strategy.stream = AsyncAlpacaStreaming(apc, url=ws.url)
+    listener = asyncio.create_task(strategy.live_monitoring_async())
+
+    load = strategy.update_data if incremental else strategy.update_history
+    await strategy.stream_bars_async()
+    await asyncio.to_thread(load)
+    assert CountingHandler.bars_requests == 1
+    assert await asyncio.to_thread(ws.wait, lambda: [
+      m['data']['streams'] for m in ws.messages if m.get('action') == 'listen'
+    ] == [['T.AAA', 'T.BBB']])
+
+    rows = trades(symbols, START + 60 * (limit + 1), minutes)
+    for row in rows:
+      ws.push({'stream': 'T.' + row['T'], 'data': row})
+
+    deadline = time.time() + 10
+    while strategy.live_bars.price(rows[-1]['T']) != rows[-1]['p'] and time.time() < deadline:
+      await asyncio.sleep(0.01)
+
+    await asyncio.to_thread(load)
+    assert CountingHandler.bars_requests == 1
+    compare(strategy, rows, symbols, limit, minutes)
+
+    await strategy.stream.close()
+    await asyncio.wait_for(listener, 5)
+
+  server.shutdown()
+  ws.shutdown()
+
+  return {'incremental': incremental, 'async': True, 'rest_bars_requests': CountingHandler.bars_requests,
+          'streamed_trades': len(rows), 'bars_built': minutes * len(symbols)}
+
+
+def check_daily(incremental, limit=30):
+  """
+    The last daily bar fetched is today's, partial; trades through the
+    day must move it, and the next day's trade start a new bar.
+  """
+  today = period_start(START + 60 * 60, '1D')
+  days = pd.to_datetime([today - 86400 * i for i in range(limit - 1, -1, -1)], unit='s')
+  history = pd.DataFrame({
+    'open': 100.0, 'high': 101.0, 'low': 99.0, 'close': 100.5, 'volume': 1000,
+  }, index=pd.Index(days, name='time'))
+
+  strategy = Strategy('key', 'secret', bar_period='1D', data_limit=limit, live_bars=True,
+                      incremental=incremental)
+  strategy.apc.historical_data = lambda symbols, **kwargs: {symbol: history.copy() for symbol in symbols}
+  strategy.now = lambda: today + 60 * 60 * 6
+  strategy.symbols = ['AAA']
+
+  load = strategy.update_data if incremental else strategy.update_history
+  load()
+
+  for price, size, minutes in [(103.0, 10, 90), (98.0, 20, 120), (102.0, 30, 150)]:
+    strategy.live_bars.add_trade('AAA', price, size, today + 60 * minutes)
+    load()
+
+  last = strategy.data['AAA'].iloc[-1]
+  assert strategy.data['AAA'].index[-1] == days[-1] and len(strategy.data['AAA']) == limit
+  assert (last['open'], last['high'], last['low'], last['close'], last['volume']) == (100.0, 103.0, 98.0, 102.0, 1060)
+  assert np.isclose(last['5_close'], (100.5 * 4 + 102.0) / 5)
+
+  # The next day closes it
+  strategy.now = lambda: today + 86400 + 60 * 60 * 6
+  strategy.live_bars.add_trade('AAA', 104.0, 5, today + 86400 + 60 * 60)
+  load()
+  assert strategy.data['AAA']['close'].iloc[-2:].tolist() == [102.0, 104.0]
+
+  return {'incremental': incremental, 'daily_bar_merged': True}
+
+
+def run():
+  result = [check(False), check(True), check_daily(False), check_daily(True)]
+
+  if aiohttp is not None:
+    result += [asyncio.run(check_async(False)), asyncio.run(check_async(True))]
+
+  print(json.dumps(result))
+
+  return result
+
+
+if __name__ == '__main__':
+  run()
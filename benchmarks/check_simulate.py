@@ -0,0 +1,111 @@
+from ..alpaca_trade import AlpacaTrade
+from ..alpaca_modules.alpaca_indicators import sma, is_above
+from ..alpaca_modules.simulator import SimAlpaca
+from .synthetic import bar_records, symbol_names, START
+
+from contextlib import redirect_stdout
+
+import numpy as np
+import time
+import json
+import io
+
+"""
+
+  Soak-runs the live loop on the simulated broker: `AlpacaTrade.run`
+  with `simulate=` over two replayed sessions of synthetic minute bars,
+  so `iterate`, the overnight sleep and position monitoring (stop loss
+  and take profit sells off the replayed trade stream) all run for real.
+  Checks every fill lies within its bar's range and the account adds up.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.check_simulate
+
+"""
+
+
+DAY = 60*60*24
+
+
+class Strategy(AlpacaTrade):
+
+  def indicators(self):
+    self.indicator(sma, 'close', periods=5)
+    self.indicator(sma, 'close', periods=20)
+    self.indicator(is_above, 5, 20)
+
+  def analyzer(self, symbol, price):
+    return bool(self.data[symbol]['is_above'].iloc[-1])
+
+  def selector(self):
+    return self.pending_orders[:self.max_positions]
+
+  def monitoring(self, symbol, price):
+    for position in self.positions:
+      if position['symbol'] == symbol:
+        buy_price = float(position['avg_entry_price'])
+
+        if price >= self.take_profit * buy_price or price <= self.stop_loss * buy_price:
+          self.sell(symbol)
+
+
+def check_fills(apc):
+  """
+    Returns: --> filled orders; each fill price, less slippage, lies
+                 within the range of the bar it filled in
+  """
+  filled = [order for order in apc.orders.values() if order['status'] == 'filled']
+
+  for order in filled:
+    bars = apc.replay.bars[order['symbol']]
+    bar = bars[np.searchsorted(bars['t'], order['closed'], 'right') - 1]
+    slip = 1 + apc.slippage if order['side'] == 'buy' else 1 - apc.slippage
+    price = order['filled_price']
+
+    assert bar['l'] - 1e-6 <= price <= bar['h'] + 1e-6 or bar['l'] - 1e-6 <= price / slip <= bar['h'] + 1e-6
+
+  return filled
+
+
+def run(symbols=20, speed=2000):
+  # Three days of minute bars; the first day is history, the next two are replayed
+  bars = {symbol: bar_records(symbol, 3*24*60 - 120, '1Min') for symbol in symbol_names(symbols)}
+  apc = SimAlpaca(bars=bars, start=START + DAY, speed=speed, cash=30000)
+
+  strategy = Strategy('key', 'secret', simulate=apc, bar_period='5Min', data_limit=50,
+                      max_positions=3, stop_loss=0.99, take_profit=1.01, needed_periods=20)
+
+  wall = time.perf_counter()
+  with redirect_stdout(io.StringIO()) as out:
+    strategy.run(iterate_every=60)
+  wall = time.perf_counter() - wall
+
+  filled = check_fills(apc)
+  account = apc.account(apc.now())
+  held = sum(qty * apc.replay.price(symbol, apc.now()) for symbol, (qty, _) in apc.holdings.items())
+
+  assert apc.finished
+  assert abs(float(account['equity']) - (apc.cash + held)) < 0.01
+  assert any(order['side'] == 'sell' for order in filled), 'monitoring never sold'
+
+  result = {
+    'replayed_s': apc.replay.end - apc.replay.start,
+    'wall_s': wall,
+    'speed_up': (apc.replay.end - apc.replay.start) / wall,
+    'iterations': strategy.profiler.count,
+    'buys': sum(order['side'] == 'buy' for order in filled),
+    'sells': sum(order['side'] == 'sell' for order in filled),
+    'open_positions': len(apc.holdings),
+    'equity': float(account['equity']),
+    'cash': apc.cash,
+    'rest_calls': sum(stats['calls'] for stats in apc.metrics.snapshot().values()),
+    'ticks': strategy.ticks.stats(),
+    'log_lines': len(out.getvalue().splitlines()),
+  }
+  print(json.dumps(result, indent=2))
+
+  return result
+
+
+if __name__ == '__main__':
+  run()
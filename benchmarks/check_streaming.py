@@ -0,0 +1,113 @@
+from ..alpaca_modules.alpaca_api import AlpacaStreaming
+from ..alpaca_modules.alpaca_async import AsyncAlpaca, AsyncAlpacaStreaming, aiohttp
+from .ws_stub import serve
+
+import asyncio
+import json
+
+"""
+
+  Runs `AlpacaStreaming` against the local websocket stand-in:
+  authenticate + listen, a second `start` that only subscribes,
+  subscribe/unsubscribe on the open socket, and a dropped connection
+  that is re-opened and resubscribed. The same for
+  `AsyncAlpacaStreaming` when aiohttp is installed.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.check_streaming
+
+"""
+
+
+def actions(server, action):
+  return [m['data']['streams'] for m in server.messages if m.get('action') == action]
+
+
+def run():
+  server = serve()
+  received = []
+
+  stream = AlpacaStreaming('key', 'secret', url=server.url, backoff=0.05)
+  stream.start(['T.AAPL'], on_message=lambda ws, message: received.append(json.loads(message)))
+
+  assert server.wait(lambda: actions(server, 'listen') == [['T.AAPL']])
+  assert server.messages[0]['action'] == 'authenticate'
+
+  # A second caller only subscribes on the open connection
+  stream.start(['T.TSLA'])
+  stream.unsubscribe(['T.TSLA'])
+  assert server.wait(lambda: actions(server, 'unlisten') == [['T.TSLA']])
+  assert server.connections == 1
+
+  stream.subscribe(['T.MSFT', 'T.AAPL'])
+  stream.unsubscribe(['T.AAPL'])
+  assert server.wait(lambda: actions(server, 'unlisten') == [['T.TSLA'], ['T.AAPL']])
+  assert actions(server, 'listen') == [['T.AAPL'], ['T.TSLA'], ['T.MSFT']]
+
+  server.trade('MSFT', 250.5)
+  assert server.wait(lambda: any(m.get('stream') == 'T.MSFT' for m in received))
+
+  # Drop the socket: the client should come back with its current streams
+  server.drop()
+  assert server.wait(lambda: server.connections == 2 and len(actions(server, 'listen')) == 4)
+  assert actions(server, 'listen')[-1] == ['T.MSFT']
+  assert server.connections == 2 and stream.reconnects == 1
+
+  stream.close()
+  assert server.wait(lambda: not server.clients)
+
+  result = {'connections': server.connections, 'reconnects': stream.reconnects,
+            'messages': len(server.messages), 'received': len(received)}
+
+  if aiohttp is not None:
+    result['async'] = asyncio.run(check_async())
+
+  print(json.dumps(result))
+
+  return result
+
+
+async def wait(condition, timeout=5):
+  for _ in range(int(timeout / 0.01)):
+    if condition():
+      return True
+
+    await asyncio.sleep(0.01)
+
+  return condition()
+
+async def check_async():
+  server = serve()
+
+  async with AsyncAlpaca('key', 'secret') as apc:
+    stream = AsyncAlpacaStreaming(apc, url=server.url, backoff=0.05)
+    received = []
+
+    async def consume():
+      async for message in stream.listen(['T.AAPL']):
+        received.append(json.loads(message))
+
+    task = asyncio.create_task(consume())
+    assert await wait(lambda: actions(server, 'listen') == [['T.AAPL']])
+
+    await stream.subscribe(['T.MSFT'])
+    await stream.unsubscribe(['T.AAPL'])
+    assert await wait(lambda: actions(server, 'unlisten') == [['T.AAPL']])
+
+    server.drop()
+    assert await wait(lambda: server.connections == 2 and len(actions(server, 'listen')) == 3)
+    assert actions(server, 'listen')[-1] == ['T.MSFT'] and stream.reconnects == 1
+
+    server.trade('MSFT', 250.5)
+    assert await wait(lambda: any(m.get('stream') == 'T.MSFT' for m in received))
+
+    await stream.close()
+    await asyncio.wait_for(task, 5)
+
+  server.shutdown()
+
+  return {'connections': server.connections, 'reconnects': stream.reconnects}
+
+
+if __name__ == '__main__':
+  run()
@@ -0,0 +1,248 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from .synthetic import bar_records, screener_rows
+from datetime import datetime
+
+import threading
+import math
+import json
+import time
+
+"""
+
+  A local stand-in for the alpaca REST endpoints used by the
+  benchmarks. Responses are canned so timings measure the client.
+
+"""
+
+
+CLOCK = {
+  'timestamp': '2021-04-01T10:00:00-04:00',
+  'is_open': True,
+  'next_open': '2021-04-02T09:30:00-04:00',
+  'next_close': '2021-04-01T16:00:00-04:00',
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+  # Keep-alive, so pooled clients can reuse the connection
+  protocol_version = 'HTTP/1.1'
+  disable_nagle_algorithm = True
+
+  # Seconds added to every `/bars` response to mimic network time
+  bars_latency = 0
+
+  # Epoch of the newest bar served (None: the synthetic default)
+  bars_end = None
+
+  # Seconds added to every screener response, and its rows per exchange
+  screener_latency = 0
+  screener_count = 3000
+
+  # Seconds added to every order submission, and how many of the next
+  # submissions are recorded but answered with a 503 (a lost answer)
+  orders_latency = 0
+  lose_orders = 0
+
+  # Submitted orders by client order id, across all handler instances
+  submitted = {}
+  orders_lock = threading.Lock()
+
+  # Response body bytes written, across all handler instances
+  bytes_sent = 0
+
+  # Server-side budget in requests per second, shared by /v1 (data)
+  # and /v2 (trading) like alpaca's per-account one; None for no limit
+  rate_limit = None
+  budget = {}
+  budget_lock = threading.Lock()
+  throttled = 0
+
+  def clock(self, path, query):
+    return CLOCK
+
+  def account(self, path, query):
+    return {'buying_power': '10000'}
+
+  def positions(self, path, query):
+    return []
+
+  def orders(self, path, query):
+    if self.command != 'POST':
+      return []
+
+    time.sleep(self.orders_latency)
+    order = json.loads(self.body or '{}')
+    cls = type(self)
+
+    with cls.orders_lock:
+      if order.get('client_order_id') in cls.submitted:
+        self.status = 422
+        return {'code': 40010001, 'message': 'client_order_id must be unique'}
+
+      order = dict(order, id='stub-{}'.format(time.time_ns()), status='accepted')
+      cls.submitted[order.get('client_order_id') or order['id']] = order
+
+      if cls.lose_orders:
+        cls.lose_orders -= 1
+        self.status = 503
+        return {'code': 50010000, 'message': 'service unavailable'}
+
+    return order
+
+  def order_by_client_id(self, path, query):
+    order = self.submitted.get(query.get('client_order_id', [''])[0])
+
+    if order is None:
+      self.status = 404
+      return {'code': 40410000, 'message': 'order not found'}
+
+    return order
+
+  def bars(self, path, query):
+    time.sleep(self.bars_latency)
+
+    tf = path.split('/')[-1]
+    limit = int(query.get('limit', ['200'])[0])
+    symbols = query.get('symbols', [''])[0].split(',')
+    after = query.get('after', [''])[0]
+    after = datetime.fromisoformat(after).timestamp() if after else 0
+    start = query.get('start', [''])[0]
+    start = datetime.fromisoformat(start).timestamp() if start else 0
+
+    return {
+      symbol: [
+        bar for bar in bar_records(symbol, limit, tf, end=self.bars_end) if bar['t'] > after and bar['t'] >= start
+      ]
+      for symbol in symbols if symbol
+    }
+
+  def last(self, path, query):
+    symbol = path.split('/')[-1]
+    bar = bar_records(symbol, 1, '1Min', end=self.bars_end)[-1]
+
+    return {
+      'status': 'success',
+      'symbol': symbol,
+      'last': {'price': bar['c'], 'size': 100, 'exchange': 2, 'timestamp': bar['t'] * 10**9},
+    }
+
+  def screener(self, path, query):
+    time.sleep(self.screener_latency)
+    exchange = query.get('exchange', ['nyse'])[0]
+
+    return {'data': {'table': {'rows': screener_rows(exchange, self.screener_count)}}}
+
+  def route(self, path):
+    routes = {
+      '/v2/clock': self.clock,
+      '/v2/account': self.account,
+      '/v2/positions': self.positions,
+      '/v2/orders': self.orders,
+      '/v2/orders:by_client_order_id': self.order_by_client_id,
+      '/v1/bars/': self.bars,
+      '/v1/last/stocks/': self.last,
+      '/api/screener/stocks': self.screener,
+    }
+
+    for prefix, route in routes.items():
+      if path == prefix or (prefix.endswith('/') and path.startswith(prefix)):
+        return route
+
+  def spend(self):
+    """
+      Alpaca-style fixed windows: `rate_limit` requests per second.
+      Returns: --> (allowed, requests left, epoch of the next window)
+    """
+    cls = type(self)
+    group = 'account'
+
+    with cls.budget_lock:
+      window = int(time.time())
+      start, used = cls.budget.get(group, (window, 0))
+      used = used if start == window else 0
+      allowed = used < self.rate_limit
+      used += 1 if allowed else 0
+      cls.budget[group] = (window, used)
+      cls.throttled += 0 if allowed else 1
+
+    return allowed, self.rate_limit - used, window + 1
+
+  def throttle(self):
+    allowed, remaining, reset = self.spend()
+    headers = {
+      'X-RateLimit-Limit': str(self.rate_limit),
+      'X-RateLimit-Remaining': str(remaining),
+      'X-RateLimit-Reset': str(reset),
+    }
+
+    if allowed:
+      return headers
+
+    body = b'{"code": 42910000, "message": "rate limit exceeded"}'
+    self.send_response(429)
+    for name, value in dict(headers, **{'Retry-After': str(math.ceil(reset - time.time()))}).items():
+      self.send_header(name, value)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def respond(self):
+    headers = self.throttle() if self.rate_limit else {}
+
+    if headers is None:
+      return
+
+    url = urlparse(self.path)
+    route = self.route(url.path)
+    self.status = 200 if route else 404
+    body = json.dumps(route(url.path, parse_qs(url.query)) if route else {}).encode()
+
+    self.send_response(self.status)
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+    type(self).bytes_sent += len(body)
+
+  def do_GET(self):
+    self.body = None
+    self.respond()
+
+  def do_POST(self):
+    self.body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+    self.respond()
+
+  def do_DELETE(self):
+    # Cancelling one order answers 204, with no body
+    if not self.path.startswith('/v2/orders/'):
+      return self.do_GET()
+
+    headers = self.throttle() if self.rate_limit else {}
+
+    if headers is None:
+      return
+
+    self.status = 204
+    self.send_response(self.status)
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.end_headers()
+
+  def log_message(self, *args):
+    pass
+
+
+def serve(handler=StubHandler):
+  """
+    Starts the stub on a free port in a daemon thread.
+    Returns: --> (server, base url)
+  """
+  server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+  server.daemon_threads = True
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+
+  return server, 'http://{}:{}'.format(*server.server_address)
@@ -0,0 +1,337 @@
+import matplotlib
+matplotlib.use('Agg')
+
+from ..alpaca_modules.alpaca_indicators import *
+from ..alpaca_modules.alpaca_api import Alpaca
+from ..alpaca_modules import alpaca_api
+from ..alpaca_modules.panel import Panel
+from ..alpaca_backtest import AlpacaBacktest
+from ..alpaca_screen import AlpacaScreen
+from ..alpaca_trade import AlpacaTrade
+from .bench_indicators import INDICATORS, frames
+from .stub_server import StubHandler, serve
+from .synthetic import universe, bar_records, symbol_names
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+import statistics
+import platform
+import argparse
+import time
+import json
+import sys
+import io
+import os
+
+"""
+
+  The hot paths end to end, on deterministic synthetic data served by
+  the local stub: bar parsing, `historical_data`, every indicator (per
+  symbol frames and `Panel`), `AlpacaBacktest.run` on each engine,
+  `AlpacaScreen.run` and one `AlpacaTrade.iterate`. Results are written
+  as JSON and can be compared against a saved baseline to catch
+  regressions.
+
+  Run from the folder containing steamboat:
+    python -m steamboat.benchmarks.suite --output results.json
+    python -m steamboat.benchmarks.suite --compare baseline.json
+
+"""
+
+
+CASES = []
+
+
+def case(name):
+  def register(func):
+    CASES.append((name, func))
+    return func
+
+  return register
+
+
+class Env(object):
+  """
+    Data and stub shared by every case, built once per suite run.
+  """
+
+  def __init__(self, symbols, bars, tf, seed):
+    self.symbols = symbols
+    self.bars = bars
+    self.tf = tf
+    self.seed = seed
+
+    StubHandler.screener_count = symbols
+    self.server, self.url = serve()
+    alpaca_api.SCREENER_ENDPOINT = self.url + '/api/screener/stocks'
+
+    self.columns = universe(symbols, bars, tf, seed)
+    self.frames = frames(self.columns)
+    self.raw = {symbol: bar_records(symbol, bars, tf, seed) for symbol in symbol_names(symbols)}
+
+  def connect(self, apc):
+    # The stub has no budget: pacing would only measure the limiter
+    apc.base_url, apc.data_url = self.url + '/v2', self.url + '/v1'
+    apc.limiter = None
+    return apc
+
+
+def measure(func, repeats, setup=None):
+  """
+    Returns: --> timing summary of `func(setup())` over `repeats` runs,
+                 setup excluded, plus whatever the last run returned
+  """
+  seconds = []
+  extra = None
+
+  for _ in range(repeats):
+    arg = setup() if setup else None
+    start = time.perf_counter()
+
+    with redirect_stdout(io.StringIO()):
+      extra = func(arg) if setup else func()
+
+    seconds.append(time.perf_counter() - start)
+
+  return dict(
+    seconds=statistics.median(seconds), min=min(seconds), max=max(seconds),
+    repeats=repeats, **(extra if isinstance(extra, dict) else {}),
+  )
+
+
+# Parsing
+
+
+@case('parse.parse_bars')
+def parse_bars(env, repeats):
+  apc = Alpaca('bench', 'bench', rate_limits=False)
+  return measure(lambda: {'parsed': len(apc.parse_bars(env.raw))}, repeats)
+
+@case('parse.historical_data')
+def historical_data(env, repeats):
+  apc = env.connect(Alpaca('bench', 'bench', rate_limits=False))
+  names = symbol_names(env.symbols)
+
+  return measure(lambda: {'parsed': len(apc.historical_data(names, tf=env.tf, limit=env.bars))}, repeats)
+
+
+# Indicators
+
+
+@case('indicators')
+def indicators(env, repeats):
+  """
+    One result per indicator and layout; each one runs on data that
+    already has the columns of the indicators listed before it.
+  """
+  results = {}
+
+  for layout in ['frames', 'panel']:
+    def base():
+      data = {symbol: frame.copy() for symbol, frame in env.frames.items()}
+      return Panel.from_frames(data) if layout == 'panel' else data
+
+    for i, (name, func, args, kwargs) in enumerate(INDICATORS):
+      def setup(i=i):
+        data = base()
+        for _, before, b_args, b_kwargs in INDICATORS[:i]:
+          data = before(data, *b_args, **b_kwargs)
+        return data
+
+      def apply(data, func=func, args=args, kwargs=kwargs):
+        func(data, *args, **kwargs)
+
+      results[f'indicator.{name}.{layout}'] = measure(apply, repeats, setup)
+
+  return results
+
+
+# Pipelines
+
+
+class Crossover(object):
+  """
+    Shared strategy logic: a sma crossover over the synthetic universe.
+  """
+  universe = set()
+
+  def indicators(self):
+    self.indicator(sma, 'close', periods=10)
+    self.indicator(sma, 'close', periods=50)
+    self.indicator(is_above, 10, 50)
+
+  def screener(self, ticker):
+    return ticker['symbol'] in self.universe
+
+  stock_screen = screener
+
+
+class BenchBacktest(Crossover, AlpacaBacktest):
+
+  def analyzer(self, symbol, price):
+    frame = self.data[symbol]
+    return frame['is_above'].iloc[self.idx] and price < frame['close'].iloc[self.idx-1]
+
+
+class BenchScreen(Crossover, AlpacaScreen):
+
+  def analyze(self, symbol, price):
+    return self.data[symbol]['is_above'].iloc[-1]
+
+
+class BenchTrade(Crossover, AlpacaTrade):
+
+  def analyzer(self, symbol, price):
+    return bool(self.data[symbol]['is_above'].iloc[-1])
+
+  def selector(self):
+    return self.pending_orders[:self.max_positions]
+
+
+def screened(env):
+  rows = alpaca_api.fetch_symbols(10000, ['nyse'], 'small')
+  return {row['symbol'] for row in rows[:env.symbols]}
+
+@case('run.backtest')
+def backtest(env, repeats):
+  """
+    The vector engine (under the name earlier baselines have), the
+    loop, and the loop sharded across processes, as in bench_backtest.
+    Every engine must make the same trades.
+  """
+  Crossover.universe = screened(env)
+  results = {}
+
+  for name, engine, workers in [
+    ('run.backtest', 'vector', 1),
+    ('run.backtest.loop', 'loop', 1),
+    ('run.backtest.loop_workers', 'loop', max(2, os.cpu_count() or 1)),
+  ]:
+    def setup(engine=engine, workers=workers):
+      bt = BenchBacktest('bench', 'bench', data_limit=env.bars, periods=env.tf, engine=engine, workers=workers)
+      env.connect(bt.apc)
+      return bt
+
+    def run(bt, workers=workers):
+      bt.run()
+      return {'trades': sum(bt.trade_count.values()), 'workers': workers, 'stages': bt.profiler.last['stages']}
+
+    results[name] = measure(run, repeats, setup)
+
+  assert len({result['trades'] for result in results.values()}) == 1, results
+
+  return results
+
+@case('run.screen')
+def screen(env, repeats):
+  Crossover.universe = screened(env)
+
+  def run(screen):
+    screen.run()
+    return {'stages': screen.profiler.last['stages']}
+
+  def make():
+    screen = BenchScreen('bench', 'bench', periods=env.tf, data_limit=env.bars)
+    env.connect(screen.apc)
+    return screen
+
+  return measure(run, repeats, make)
+
+@case('run.trade_iterate')
+def trade_iterate(env, repeats):
+  Crossover.universe = screened(env)
+
+  def make():
+    trade = BenchTrade('bench', 'bench', bar_period=env.tf, data_limit=env.bars)
+    env.connect(trade.apc)
+    return trade
+
+  def run(trade):
+    trade.iterate()
+    return {'orders': len(trade.pending_orders), 'stages': trade.profiler.last['stages']}
+
+  return measure(run, repeats, make)
+
+
+# Runner
+
+
+def run(symbols=500, bars=500, tf='1D', seed=0, repeats=3, only=None):
+  env = Env(symbols, bars, tf, seed)
+  results = {}
+
+  for name, func in CASES:
+    if only and not any(part in name for part in only):
+      continue
+
+    result = func(env, repeats)
+
+    # Cases that measure several things return them keyed by name
+    if all(isinstance(value, dict) for value in result.values()):
+      results.update(result)
+    else:
+      results[name] = result
+
+  env.server.shutdown()
+
+  return {
+    'meta': {
+      'timestamp': time.time(),
+      'python': platform.python_version(),
+      'numpy': np.__version__,
+      'pandas': pd.__version__,
+      'machine': platform.machine(),
+    },
+    'config': {'symbols': symbols, 'bars': bars, 'timeframe': tf, 'seed': seed, 'repeats': repeats},
+    'results': results,
+  }
+
+def compare(report, baseline, tolerance=0.2):
+  """
+    Returns: --> names of the results more than `tolerance` slower than
+                 in the baseline (by median seconds)
+  """
+  regressions = {}
+
+  for name, result in report['results'].items():
+    before = baseline['results'].get(name)
+
+    if before and result['seconds'] > before['seconds'] * (1 + tolerance):
+      regressions[name] = {'seconds': result['seconds'], 'baseline': before['seconds']}
+
+  return regressions
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='steamboat benchmark suite')
+  parser.add_argument('--symbols', type=int, default=500)
+  parser.add_argument('--bars', type=int, default=500)
+  parser.add_argument('--timeframe', default='1D')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--repeats', type=int, default=3)
+  parser.add_argument('--only', nargs='*', help='run the cases whose name contains any of these')
+  parser.add_argument('--output', help='write the JSON report here')
+  parser.add_argument('--compare', help='baseline JSON report to check against')
+  parser.add_argument('--tolerance', type=float, default=0.2)
+  args = parser.parse_args(argv)
+
+  report = run(args.symbols, args.bars, args.timeframe, args.seed, args.repeats, args.only)
+
+  if args.compare:
+    with open(args.compare) as file:
+      report['regressions'] = compare(report, json.load(file), args.tolerance)
+
+  text = json.dumps(report, indent=2, default=float)
+
+  if args.output:
+    with open(args.output, 'w') as file:
+      file.write(text)
+
+  print(text)
+
+  return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
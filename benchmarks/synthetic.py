@@ -0,0 +1,86 @@
+import numpy as np
+
+"""
+
+  Deterministic synthetic OHLCV data for the benchmarks. The same
+  (symbol, timeframe, bars, seed) always produces the same bars.
+
+"""
+
+
+TIMEFRAMES = {'1Min': 60, '5Min': 300, '15Min': 900, '1D': 86400}
+START = 1609770600  # 2021-01-04 09:30 New York
+
+
+def symbol_names(count):
+  return ['S{:05d}'.format(i) for i in range(count)]
+
+def symbol_seed(symbol, seed=0):
+  return (sum(ord(c) * 31 ** i for i, c in enumerate(symbol)) + seed) % 2 ** 32
+
+def bars(symbol, count=200, tf='1D', seed=0, end=None):
+  """
+    Random-walk bars for one symbol, walking forward from `START`, so
+    a bar at a given time is the same whatever window is requested.
+    Returns: --> dict of numpy columns t, o, h, l, c, v
+  """
+  step = TIMEFRAMES[tf]
+  total = max(count, ((end or START + step * count) - START) // step)
+  key = symbol_seed(symbol, seed)
+
+  # One stream per column keeps every prefix stable as `total` grows
+  rng = [np.random.default_rng([key, i]) for i in range(5)]
+
+  close = rng[0].uniform(1, 50) * np.exp(np.cumsum(rng[1].normal(0, 0.02, total)))
+  open_ = np.concatenate([[close[0]], close[:-1]]) * (1 + rng[2].normal(0, 0.005, total))
+  spread = np.abs(rng[3].normal(0, 0.01, total))
+  start = total - count
+
+  return {
+    't': (START + step * np.arange(1, total + 1))[start:],
+    'o': np.round(open_, 4)[start:],
+    'h': np.round(np.maximum(open_, close) * (1 + spread), 4)[start:],
+    'l': np.round(np.minimum(open_, close) * (1 - spread), 4)[start:],
+    'c': np.round(close, 4)[start:],
+    'v': rng[4].integers(1000, 1000000, total)[start:],
+  }
+
+def bar_records(symbol, count=200, tf='1D', seed=0, end=None):
+  """
+    The same bars in the `/bars` response layout (list of dicts).
+  """
+  columns = bars(symbol, count, tf, seed, end)
+
+  return [
+    {'t': int(t), 'o': float(o), 'h': float(h), 'l': float(l), 'c': float(c), 'v': int(v)}
+    for t, o, h, l, c, v in zip(*(columns[k] for k in 'tohlcv'))
+  ]
+
+def universe(symbols=500, count=200, tf='1D', seed=0):
+  """
+    Returns: --> python object of key (symbol) and value (dict of columns)
+  """
+  return {symbol: bars(symbol, count, tf, seed) for symbol in symbol_names(symbols)}
+
+def screener_rows(exchange, count=3000, seed=0):
+  """
+    Rows in the nasdaq screener layout, strings and all.
+  """
+  rng = np.random.default_rng(symbol_seed(exchange, seed))
+  prices = np.round(rng.lognormal(3, 1, count), 2)
+  changes = np.round(rng.normal(0, 2, count), 3)
+
+  return [{
+    'symbol': '{}{:04d}'.format(exchange[:2].upper(), i) + (' ' if i % 50 == 0 else ''),
+    'name': 'Company {}'.format(i),
+    'lastsale': '${:,.2f}'.format(price),
+    'netchange': '{:.2f}'.format(price * change / 100),
+    'pctchange': 'UNCH' if i % 97 == 0 else '{:.3f}%'.format(change),
+    'volume': str(int(rng.integers(1000, 10**7))),
+    'marketCap': str(int(price * 10**6)),
+    'country': 'United States',
+    'ipoyear': '',
+    'industry': '',
+    'sector': 'Technology',
+    'url': '/market-activity/stocks/{}'.format(i),
+  } for i, (price, change) in enumerate(zip(prices, changes))]
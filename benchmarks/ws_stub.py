@@ -0,0 +1,167 @@
+from socketserver import ThreadingTCPServer, StreamRequestHandler
+
+import threading
+import socket
+import hashlib
+import base64
+import struct
+import json
+
+"""
+
+  A minimal stdlib websocket server standing in for the alpaca data
+  stream. It records every message a client sends, can push trades to
+  the connected clients and can drop them to exercise reconnects.
+
+"""
+
+
+MAGIC = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class WsHandler(StreamRequestHandler):
+
+  def setup(self):
+    super().setup()
+    self.lock = threading.Lock()
+
+  def handshake(self):
+    headers = {}
+
+    for line in iter(self.rfile.readline, b'\r\n'):
+      if not line:
+        return False
+
+      name, _, value = line.decode().partition(':')
+      headers[name.strip().lower()] = value.strip()
+
+    accept = base64.b64encode(
+      hashlib.sha1((headers['sec-websocket-key'] + MAGIC).encode()).digest()
+    ).decode()
+
+    self.wfile.write((
+      'HTTP/1.1 101 Switching Protocols\r\n'
+      'Upgrade: websocket\r\n'
+      'Connection: Upgrade\r\n'
+      f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+    ).encode())
+
+    return True
+
+  def read_frame(self):
+    head = self.rfile.read(2)
+
+    if len(head) < 2:
+      return None, None
+
+    opcode = head[0] & 0x0f
+    length = head[1] & 0x7f
+
+    if length == 126:
+      length = struct.unpack('!H', self.rfile.read(2))[0]
+    elif length == 127:
+      length = struct.unpack('!Q', self.rfile.read(8))[0]
+
+    mask = self.rfile.read(4) if head[1] & 0x80 else b'\0\0\0\0'
+    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self.rfile.read(length)))
+
+    return opcode, payload
+
+  def write_frame(self, payload, opcode=0x1):
+    length = len(payload)
+
+    if length < 126:
+      head = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+      head = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+      head = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+
+    with self.lock:
+      self.wfile.write(head + payload)
+
+  def send(self, message):
+    self.write_frame(json.dumps(message).encode())
+
+  def handle(self):
+    if not self.handshake():
+      return
+
+    self.server.connected(self)
+
+    try:
+      while True:
+        opcode, payload = self.read_frame()
+
+        if opcode is None or opcode == 0x8:
+          break
+
+        if opcode == 0x9:
+          self.write_frame(payload, opcode=0xa)
+        elif opcode == 0x1:
+          self.server.received(self, json.loads(payload))
+    except (ConnectionError, OSError):
+      pass
+    finally:
+      self.server.disconnected(self)
+
+
+class WsServer(ThreadingTCPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self):
+    super().__init__(('127.0.0.1', 0), WsHandler)
+    self.clients = []
+    self.messages = []
+    self.connections = 0
+    self.changed = threading.Condition()
+
+  def connected(self, client):
+    with self.changed:
+      self.clients.append(client)
+      self.connections += 1
+      self.changed.notify_all()
+
+  def disconnected(self, client):
+    with self.changed:
+      if client in self.clients:
+        self.clients.remove(client)
+      self.changed.notify_all()
+
+  def received(self, client, message):
+    with self.changed:
+      self.messages.append(message)
+      self.changed.notify_all()
+
+    if message.get('action') in ('listen', 'unlisten'):
+      client.send({'stream': 'listening', 'data': {'streams': message['data']['streams']}})
+
+  def wait(self, condition, timeout=5):
+    with self.changed:
+      return self.changed.wait_for(condition, timeout)
+
+  def push(self, message):
+    for client in list(self.clients):
+      client.send(message)
+
+  def trade(self, symbol, price):
+    self.push({'stream': f'T.{symbol}', 'data': {'T': symbol, 'p': price}})
+
+  def drop(self):
+    """
+      Closes every client socket without a close frame.
+    """
+    for client in list(self.clients):
+      client.connection.shutdown(socket.SHUT_RDWR)
+
+  @property
+  def url(self):
+    return 'ws://{}:{}'.format(*self.server_address)
+
+
+def serve():
+  server = WsServer()
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+
+  return server